@@ -1,4 +1,17 @@
-from .augmentation import *
-from .chain import *
+from . import augmentation, chain, dataset, store
+from .dataset import AugmentedDataset, DatasetMetrics
+from .store import ShardReader, ShardWriter
 
-__all__ = ['augmentation', 'chain']
+__all__ = ['augmentation', 'chain', 'dataset', 'store']
+
+
+def __getattr__(name):
+    # everything the augmentation and chain packages export is available from here too, imported the first time it's used
+    for package in (augmentation, chain):
+        if name in package.__all__:
+            return getattr(package, name)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(augmentation.__all__) | set(chain.__all__))
@@ -1,9 +1,43 @@
-from .augmentation_base import AugmentationBase
-from .background import BackgroundNoiseAugmentation
-from .equalizer import EqualizerAugmentation, LowPassAugmentation, HighPassAugmentation
-from .pitch_shift import PitchShiftAugmentation
-from .time_stretch import TimeStretchAugmentation
-from .windowing import WindowingAugmentation
-
-__all__ = ['AugmentationBase', 'BackgroundNoiseAugmentation', 'EqualizerAugmentation', 'PitchShiftAugmentation', 'TimeStretchAugmentation',
-           'WindowingAugmentation', 'LowPassAugmentation', 'HighPassAugmentation']
+"""
+The built-in augmentations.
+
+Each augmentation is imported from its module the first time it's used, and the libraries only some augmentations need, like librosa, SoX and
+scipy.signal, are imported by the methods that use them. Importing audaugio is therefore cheap, which matters for worker processes that only use a
+few augmentations.
+"""
+import importlib
+
+# the module each augmentation is defined in
+_MODULES = {
+    'AugmentationBase': 'augmentation_base',
+    'BackgroundNoiseAugmentation': 'background',
+    'EqualizerAugmentation': 'equalizer',
+    'PitchShiftAugmentation': 'pitch_shift',
+    'TimeStretchAugmentation': 'time_stretch',
+    'WindowingAugmentation': 'windowing',
+    'LowPassAugmentation': 'equalizer',
+    'HighPassAugmentation': 'equalizer',
+    'AugmentationCache': 'cache',
+    'CachedAugmentation': 'cache',
+    'SpectralSignal': 'spectral',
+    'PitchShiftSweepAugmentation': 'pitch_shift',
+    'TimeStretchSweepAugmentation': 'time_stretch',
+    'EqualizerSweepAugmentation': 'equalizer',
+    'Streamer': 'streaming',
+    'BackgroundRecordingAugmentation': 'background',
+    'SampledAugmentation': 'sampled',
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    value = getattr(importlib.import_module('.' + _MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,8 +1,13 @@
+import asyncio
 import os
+import subprocess
+import tempfile
+import time
 
-import librosa
-import sox
-from sox import SoxError
+import numpy as np
+
+from .dtypes import float_dtype
+from .streaming import FilterStreamer
 
 
 class AugmentationBase:
@@ -12,15 +17,106 @@ class AugmentationBase:
     :param replaces: whether the augmentation should replace the audio it augments. Usually will be false.
     """
 
+    #: whether augment() also accepts a 2-D block of signals, one per row, and augments every row independently. Chains split blocks into rows for
+    #: augmentations that don't.
+    accepts_stacked = False
+
+    #: whether augment() also accepts a signal of several channels, as a 2-D array of shape (channels, samples), and augments all of its channels in
+    #: one call, returning signals of the same channels. Augmentations that accept stacked blocks as well then take blocks of shape (signals,
+    #: channels, samples). Chains in multichannel mode apply other augmentations to one channel at a time.
+    multichannel = False
+
+    #: whether the augmentation can be swapped with any other commuting augmentation next to it without changing what a chain produces. Chains that
+    #: reorder augmentations to save work only ever move commuting ones.
+    commutes = False
+
+    #: whether augmenting the same signal always gives the same result. Only deterministic augmentations are cached.
+    deterministic = True
+
+    #: rough cost of augmenting one sample, relative to adding background noise to it. Used to plan the order of commuting augmentations.
+    cost_per_sample = 1.
+
+    #: whether the augmentation implements augment_spectral(). Chains in spectral mode keep signals as SpectralSignals between such augmentations.
+    spectral = False
+
     def __init__(self, replaces: bool, *kwargs):
         self.replaces = replaces
 
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join('{0}={1!r}'.format(name, value) for name, value in self.params().items()))
+
+    def params(self):
+        """
+        Return the parameters of the augmentation as a dict. By default, these are all public attributes set on the augmentation other than replaces.
+        """
+        return {name: value for name, value in vars(self).items() if not name.startswith('_') and name != 'replaces'}
+
+    def output_shape(self, n_samples, sr):
+        """
+        Predict how many signals augment() returns for a signal of a given length, and how long they are. Chains use this to estimate the cost of a
+        chain without running it.
+
+        :param n_samples: length of the unaugmented signal in samples
+        :param sr: sample rate, int
+        :return: (number of augmented signals, length of each augmented signal in samples)
+        """
+        return 1, n_samples
+
     def augment(self, signal, sr):
         """
-        Given a signal, apply the augmentation and return all resulting augmented audio as a list (even if it's a single signal).
+        Given a signal, apply the augmentation and return all resulting augmented audio as a list (even if it's a single signal). Augmented signals
+        should have the type float_dtype() returns for the signal's type, which for float32 and float64 signals is their own.
+
+        :param signal: unaugmented signal, ndarray
+        :param sr: sample rate, int
+        """
+        raise NotImplementedError
+
+    def augment_batch(self, signals, sr):
+        """
+        Augment many signals at once, returning for each signal the list that augment() returns. Override this when the augmentation can process a
+        whole batch faster than one signal at a time; by default, each signal is augmented on its own.
+
+        :param signals: unaugmented signals, either a list of ndarrays or a 2-D ndarray with one signal per row
+        :param sr: sample rate, int
+        """
+        return [self.augment(signal, sr) for signal in signals]
+
+    async def augment_async(self, signal, sr, executor=None, sox_limit=None):
+        """
+        Like augment(), but as a coroutine that leaves the event loop free while the signal is augmented. By default, augment() runs in an executor;
+        SoX augmentations run SoX as an asyncio subprocess instead.
 
         :param signal: unaugmented signal, ndarray
         :param sr: sample rate, int
+        :param executor: the concurrent.futures executor to run augment() in, the event loop's default one by default
+        :param sox_limit: an asyncio.Semaphore to hold while SoX runs, to cap how many SoX processes run at once. Only SoX augmentations use it.
+        """
+        return await asyncio.get_running_loop().run_in_executor(executor, self.augment, signal, sr)
+
+    def streamer(self, sr):
+        """
+        Return a Streamer that applies the augmentation to a signal arriving in consecutive blocks, carrying over whatever state it needs between
+        blocks. Augmentations that need the whole signal at once, like pitch shifting, can't be streamed and raise a ValueError.
+
+        :param sr: sample rate, int
+        """
+        raise ValueError("{0} can't be applied to a stream".format(type(self).__name__))
+
+    def for_worker(self, worker: int):
+        """
+        Return the augmentation a worker process should use. Augmentations that draw random numbers return a copy that draws from random streams
+        of its own (see RandomStreams.for_worker()), so that workers don't all draw the same numbers; others return themselves.
+
+        :param worker: number of the worker process, counting from 0
+        """
+        return self
+
+    def augment_spectral(self, signal):
+        """
+        Like augment(), but on a SpectralSignal, returning SpectralSignals. Only augmentations with spectral set implement this.
+
+        :param signal: unaugmented signal, SpectralSignal
         """
         raise NotImplementedError
 
@@ -30,36 +126,268 @@ class SoxAugmentationBase(AugmentationBase):
     Base class for an augmentation that depends on SoX. Because all SoX transformations are applied in the same way, inheritors of this class only need to
     set self.transformer in their __init__() method.
 
+    Signals are streamed to SoX as raw 32-bit integer samples, SoX's own internal format, over stdin and read back from stdout, so nothing is written to
+    disk and several augmentations can safely run at the same time. Signals of several channels are passed with their channels interleaved, so SoX
+    augments all of them in one process. Because no precision is lost on the way in or out of float64 signals, running two SoX augmentations
+    on a float64 signal one after the other gives exactly the same result as running their effects in a single SoX process. float32 signals are
+    rounded to float32 between the two, which SoX's 32-bit samples don't fit in, so they only get the same result up to float32 precision, about
+    1e-7 of full scale per augmentation. The 'sox-file' backend passes the samples
+    through uniquely named temporary files instead (on tmpfs when available), for SoX builds or environments where pipes are not an option.
+
     :param replaces: whether the augmentation should replace the audio it augments. Usually will be false.
+    :param backend: either 'sox' or 'sox-file'. How samples are passed to SoX.
     """
 
-    def __init__(self, replaces: bool, *kwargs):
+    backends = ('sox', 'sox-file')
+    cost_per_sample = 20.
+    multichannel = True
+
+    def __init__(self, replaces: bool, backend: str = 'sox', *kwargs):
         super().__init__(replaces, *kwargs)
-        self.transformer = sox.Transformer()
-        self.input_file = './temporary_augmented_audio_in.wav'
-        self.output_file = './temporary_augmented_audio_out.wav'
+        if backend not in self.backends:
+            raise ValueError("backend must be one of {0}, not {1}".format(self.backends, backend))
+        self.backend = backend
+        # filters computed natively never run SoX, so they don't import pysox either, which warns on import when SoX isn't installed
+        self.transformer = None
+        if backend in SoxAugmentationBase.backends:
+            import sox
+
+            self.transformer = sox.Transformer()
+        # running totals for profiling, see ChainBase.add_hook()
+        self._sox_seconds = 0.
+        self._io_seconds = 0.
 
     def augment(self, signal, sr):
-        librosa.output.write_wav(self.input_file, signal, sr=sr)
+        if self.backend == 'sox-file':
+            return [self._build_file(signal, sr)]
+        return [self._build_pipe(signal, sr)]
+
+    async def augment_async(self, signal, sr, executor=None, sox_limit=None):
+        async with sox_limit or asyncio.Semaphore():
+            if self.backend == 'sox-file':
+                return await super().augment_async(signal, sr, executor)
+            return [await self._build_pipe_async(signal, sr)]
+
+    def params(self):
+        params = super().params()
+        params.pop('transformer')
+        return params
+
+    def _build_pipe(self, signal, sr):
+        start = time.perf_counter()
+        samples = _to_samples(signal).tobytes()
+        sox_start = time.perf_counter()
+        output = self._sox(self._pipe_args(sr, _n_channels(signal)), samples)
+        return self._read_pipe(output, signal, start, sox_start)
+
+    async def _build_pipe_async(self, signal, sr):
+        start = time.perf_counter()
+        samples = _to_samples(signal).tobytes()
+        sox_start = time.perf_counter()
+        output = await self._sox_async(self._pipe_args(sr, _n_channels(signal)), samples)
+        return self._read_pipe(output, signal, start, sox_start)
+
+    def _pipe_args(self, sr, channels=1):
+        return self._raw_format(sr, channels) + ['-', '-t', 's32', '-'] + self.transformer.effects
+
+    def _read_pipe(self, output, signal, start, sox_start):
+        # converts what SoX wrote to stdout back to a signal, accounting the time spent since start to SoX and to passing samples around
+        sox_end = time.perf_counter()
+        augmented = _from_samples(np.frombuffer(output, dtype=np.int32), float_dtype(signal.dtype), _n_channels(signal))
+        self._sox_seconds += sox_end - sox_start
+        self._io_seconds += sox_start - start + time.perf_counter() - sox_end
+        return augmented
+
+    def _build_file(self, signal, sr):
+        start = time.perf_counter()
+        input_file = _temporary_file()
+        output_file = _temporary_file()
         try:
-            self.transformer.build(self.input_file, self.output_file)
-        except SoxError as e:
-            self.cleanup()
-            if 'sox: command not found' in e.args[0]:
-                raise OSError("You need a working installation of SoX to use this augmentation.\nIf you haven't installed it, "
-                              "go to http://sox.sourceforge.net/ for a download link. Otherwise, double check your path variables.")
-            else:
-                raise e
-        signal, sr = librosa.load(self.output_file, sr=sr)
-        self.cleanup()
-        return [signal]
-
-    def cleanup(self):
+            _to_samples(signal).tofile(input_file)
+            sox_start = time.perf_counter()
+            self._sox(self._raw_format(sr, _n_channels(signal)) + [input_file] + ['-t', 's32', output_file] + self.transformer.effects)
+            sox_end = time.perf_counter()
+            augmented = _from_samples(np.fromfile(output_file, dtype=np.int32), float_dtype(signal.dtype), _n_channels(signal))
+        finally:
+            os.remove(input_file)
+            os.remove(output_file)
+        self._sox_seconds += sox_end - sox_start
+        self._io_seconds += sox_start - start + time.perf_counter() - sox_end
+        return augmented
+
+    @staticmethod
+    def _raw_format(sr, channels=1):
+        return ['-t', 's32', '-r', str(sr), '-c', str(channels)]
+
+    @staticmethod
+    def _sox(args, samples=None):
         try:
-            os.remove(self.input_file)
+            process = subprocess.run(['sox', '-D', '-V1'] + args, input=samples, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         except FileNotFoundError:
-            pass
+            raise OSError(_SOX_MISSING)
+        if process.returncode != 0:
+            from sox import SoxError
+
+            raise SoxError(process.stderr.decode(errors='replace'))
+        return process.stdout
+
+    @staticmethod
+    async def _sox_async(args, samples):
         try:
-            os.remove(self.output_file)
+            process = await asyncio.create_subprocess_exec('sox', '-D', '-V1', *args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                           stderr=subprocess.PIPE)
         except FileNotFoundError:
-            pass
+            raise OSError(_SOX_MISSING)
+        stdout, stderr = await process.communicate(samples)
+        if process.returncode != 0:
+            from sox import SoxError
+
+            raise SoxError(stderr.decode(errors='replace'))
+        return stdout
+
+
+class FusedSoxAugmentation(SoxAugmentationBase):
+    """
+    Several SoX augmentations applied by a single SoX process, one after the other. Chains build these from adjacent SoX augmentations so that each
+    signal only pays for one SoX invocation.
+
+    :param augmentations: the SoX augmentations to fuse, in the order they are applied
+    """
+
+    def __init__(self, *augmentations: SoxAugmentationBase):
+        super().__init__(augmentations[0].replaces, augmentations[0].backend)
+        self.augmentations = augmentations
+        for augmentation in augmentations:
+            self.transformer.effects.extend(augmentation.transformer.effects)
+            self.transformer.effects_log.extend(augmentation.transformer.effects_log)
+
+
+def stack_channels(channels):
+    """
+    Stack what an augmentation returned for each channel of a signal back into signals of several channels.
+
+    :param channels: for each channel, the list of signals augment() returned
+    :return: list of signals of shape (channels, samples), or of blocks of shape (signals, channels, samples) for outputs that are blocks
+    """
+    if len({len(outputs) for outputs in channels}) > 1 or any(len({a.shape for a in outputs}) > 1 for outputs in zip(*channels)):
+        raise ValueError("the channels of a signal were augmented into signals of different shapes")
+    # outputs that are blocks of signals themselves, like stacked windows, keep the signals on their first axis
+    return [np.stack(outputs, axis=-2) for outputs in zip(*channels)]
+
+
+_SOX_MISSING = ("You need a working installation of SoX to use this augmentation.\nIf you haven't installed it, "
+                "go to http://sox.sourceforge.net/ for a download link. Otherwise, double check your path variables.")
+
+_SAMPLE_SCALE = 2. ** 31
+
+
+def _to_samples(signal):
+    # SoX takes the samples of every channel interleaved, which is the transpose of a (channels, samples) signal
+    samples = np.multiply(np.transpose(signal), _SAMPLE_SCALE, dtype=np.float64)
+    np.rint(samples, out=samples)
+    np.clip(samples, -_SAMPLE_SCALE, _SAMPLE_SCALE - 1, out=samples)
+    return samples.astype(np.int32)
+
+
+def _from_samples(samples, dtype=np.float64, channels=1):
+    signal = np.multiply(samples, 1 / _SAMPLE_SCALE, dtype=dtype)
+    if channels == 1:
+        return signal
+    return np.ascontiguousarray(signal.reshape(-1, channels).T)
+
+
+def _n_channels(signal):
+    return 1 if np.ndim(signal) < 2 else signal.shape[0]
+
+
+def _temporary_file():
+    directory = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+    handle, path = tempfile.mkstemp(suffix='.s32', prefix='audaugio_', dir=directory)
+    os.close(handle)
+    return path
+
+
+class FilterAugmentationBase(SoxAugmentationBase):
+    """
+    Base class for a biquad filter that SoX also implements. By default the filter is applied in memory with the same coefficients SoX would use, so no
+    files are written and no SoX process is spawned. Passing backend='sox' (or 'sox-file') runs the SoX binary instead, which is mostly useful as a
+    reference. Inheritors of this class implement coefficients(), and add their effect to self.transformer like any other SoX augmentation when the
+    backend is a SoX one; natively, self.transformer is None.
+
+    Natively, the filter runs along the last axis of whatever it is given, so every channel of a signal, and every row of a block of them, is
+    filtered in a single call.
+
+    :param replaces: whether the augmentation should replace the audio it augments. Usually will be false.
+    :param backend: one of 'native', 'sox' or 'sox-file'. Where the filter is computed.
+    """
+
+    backends = ('native', 'sox', 'sox-file')
+
+    def __init__(self, replaces: bool, backend: str = 'native', *kwargs):
+        super().__init__(replaces, backend, *kwargs)
+        self._coefficients = {}
+
+    @property
+    def accepts_stacked(self):
+        return self.backend == 'native'
+
+    @property
+    def commutes(self):
+        # linear time-invariant filters commute exactly, but SoX rounds and clips between effects
+        return self.backend == 'native'
+
+    @property
+    def cost_per_sample(self):
+        return 2. if self.backend == 'native' else SoxAugmentationBase.cost_per_sample
+
+    def coefficients(self, sr):
+        """
+        Return the (b, a) coefficients of the filter at a given sample rate.
+
+        :param sr: sample rate, int
+        """
+        raise NotImplementedError
+
+    def augment(self, signal, sr):
+        if self.backend != 'native':
+            return super().augment(signal, sr)
+
+        import scipy.signal
+
+        b, a = self._cached_coefficients(sr, float_dtype(signal.dtype))
+        return [scipy.signal.lfilter(b, a, signal)]
+
+    async def augment_async(self, signal, sr, executor=None, sox_limit=None):
+        if self.backend != 'native':
+            return await super().augment_async(signal, sr, executor, sox_limit)
+        return await AugmentationBase.augment_async(self, signal, sr, executor)
+
+    def augment_batch(self, signals, sr):
+        if self.backend != 'native':
+            return super().augment_batch(signals, sr)
+        import scipy.signal
+
+        if isinstance(signals, np.ndarray):
+            return [[row] for row in scipy.signal.lfilter(*self._cached_coefficients(sr, float_dtype(signals.dtype)), signals)]
+        if not signals or not all(np.ndim(signal) == 1 for signal in signals) or len({np.result_type(signal) for signal in signals}) > 1:
+            return super().augment_batch(signals, sr)
+
+        # the filter is causal, so zero-padding the shorter signals at the end doesn't change their filtered samples
+        lengths = [len(signal) for signal in signals]
+        padded = np.zeros((len(signals), max(lengths, default=0)), dtype=float_dtype(np.result_type(signals[0])))
+        for row, signal in zip(padded, signals):
+            row[:len(signal)] = signal
+        filtered = scipy.signal.lfilter(*self._cached_coefficients(sr, padded.dtype), padded)
+        return [[row[:length]] for row, length in zip(filtered, lengths)]
+
+    def streamer(self, sr):
+        if self.backend != 'native':
+            return super().streamer(sr)
+        return FilterStreamer([self._cached_coefficients(sr)])
+
+    def _cached_coefficients(self, sr, dtype=np.float64):
+        # the filter runs in the type of the signal, which takes coefficients of that type
+        key = sr, np.dtype(dtype)
+        if key not in self._coefficients:
+            self._coefficients[key] = tuple(np.asarray(c, dtype=dtype) for c in self.coefficients(sr))
+        return self._coefficients[key]
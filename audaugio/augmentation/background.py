@@ -1,20 +1,173 @@
+import copy
+
 import numpy as np
 
 from .augmentation_base import AugmentationBase
+from .dtypes import float_dtype
+from .noise import COLORS, RandomStreams, colored_noise, draw_gains, fill_segments
+from .streaming import BlockStreamer
 
 
 class BackgroundNoiseAugmentation(AugmentationBase):
     """
     Add background noise randomly sampled from a 0-centered normal distribution.
+
+    Noise is drawn from random streams of the augmentation's own (see RandomStreams), straight into the augmented signal. Pink and brown noise are
+    shaped from white noise in the frequency domain, which takes an FFT of every signal; with bank_size, noise is drawn once up front instead, and
+    every signal gets a segment of it starting at a random offset. Segments wrap around at the end of the bank, so it should be much longer than the
+    signals it's used for.
+
+    Every channel of a signal of several channels gets noise of its own, and by default an amplitude of its own as well.
     """
 
-    def __init__(self, amplitude):
+    accepts_stacked = True
+    deterministic = False
+    multichannel = True
+
+    def __init__(self, amplitude, color: str = 'white', bank_size: int = None, seed: int = None, link_channels: bool = False):
         """
-        :param amplitude: desired amplitude of the noise, equivalent to the standard deviation of the distribution
+        :param amplitude: desired amplitude of the noise, equivalent to the standard deviation of the distribution, or a (low, high) range to draw
+            the amplitude of every signal from
+        :param color: 'white', 'pink' or 'brown'
+        :param bank_size: number of samples of noise to draw up front and reuse, or None to draw new noise for every signal
+        :param seed: seed of the random streams, to draw the same noise every time
+        :param link_channels: whether to draw one amplitude per signal for all of its channels, rather than one per channel, so that the noise keeps
+            the level differences between channels that carry spatial cues. Channels are taken to be the second to last axis of what is augmented.
         """
         super().__init__(replaces=False)
+        if color not in COLORS:
+            raise ValueError("color must be one of {0}, not {1}".format(COLORS, color))
         self.amplitude = amplitude
+        self.color = color
+        self.bank_size = bank_size
+        self.seed = seed
+        self.link_channels = link_channels
+        self._streams = RandomStreams(seed)
+        self._banks = {}
+
+    def __getstate__(self):
+        # worker processes draw banks of their own rather than receiving them
+        state = self.__dict__.copy()
+        state['_banks'] = {}
+        return state
+
+    def augment(self, signal, sr):
+        signal = np.asarray(signal)
+        generator = self._streams.generator()
+        augmented = np.empty(signal.shape, dtype=float_dtype(signal.dtype))
+        gains = _draw_gains(generator, self.amplitude, signal, self.link_channels)
+        if self.bank_size:
+            bank = self._bank(augmented.dtype)
+            fill_segments(bank, generator.integers(0, len(bank), len(gains)), gains, augmented)
+        else:
+            if self.color == 'white':
+                generator.standard_normal(dtype=augmented.dtype, out=augmented)
+            else:
+                augmented[...] = colored_noise(generator, signal.shape, self.color, augmented.dtype)
+            augmented *= gains.reshape(signal.shape[:-1] + (1,)).astype(augmented.dtype)
+        augmented += signal
+        return [augmented]
+
+    def augment_batch(self, signals, sr):
+        if isinstance(signals, np.ndarray):
+            return [[row] for row in self.augment(signals, sr)[0]]
+        return super().augment_batch(signals, sr)
+
+    def streamer(self, sr):
+        return BlockStreamer(self, sr)
+
+    def for_worker(self, worker):
+        augmentation = copy.copy(self)
+        augmentation._streams = self._streams.for_worker(worker)
+        augmentation._banks = {}
+        return augmentation
+
+    def _bank(self, dtype):
+        if dtype not in self._banks:
+            self._banks[dtype] = colored_noise(self._streams.generator(), (self.bank_size,), self.color, dtype)
+        return self._banks[dtype]
+
+
+class BackgroundRecordingAugmentation(AugmentationBase):
+    """
+    Mix a recording of background sound, like traffic or a crowd, into signals. Every signal gets a segment of the recording starting at a random
+    offset, scaled straight into the augmented signal. Segments wrap around at the end of the recording. Every channel of a signal of several
+    channels gets a segment and gain of its own, unless link_channels is set.
+
+    The recording is read from a .npy file as a memory map, so only the segments that are used are ever read, and worker processes share them through
+    the operating system's page cache instead of each holding a copy. To draw from many recordings, concatenate them into one file. Recordings
+    should have the sample rate of the signals they're mixed into.
+
+    :param corpus: path to a .npy file holding the recording, a 1-D array of samples
+    :param gain: factor to scale the recording by, or a (low, high) range to draw the factor of every signal from
+    :param seed: seed of the random streams, to mix in the same segments every time
+    :param link_channels: whether to mix the same segment, scaled by the same gain, into every channel of a signal, like a single source that every
+        microphone picks up alike. Channels are taken to be the second to last axis of what is augmented.
+    """
+
+    accepts_stacked = True
+    deterministic = False
+    multichannel = True
+
+    def __init__(self, corpus: str, gain=1., seed: int = None, link_channels: bool = False):
+        super().__init__(replaces=False)
+        self.corpus = corpus
+        self.gain = gain
+        self.seed = seed
+        self.link_channels = link_channels
+        self._streams = RandomStreams(seed)
+        self._recording = None
+        if self._load().ndim != 1 or len(self._load()) == 0:
+            raise ValueError("{0} has to hold a 1-D array of samples".format(corpus))
+
+    def __getstate__(self):
+        # the memory map is opened again where it's needed
+        state = self.__dict__.copy()
+        state['_recording'] = None
+        return state
 
     def augment(self, signal, sr):
-        noise = np.random.normal(0, self.amplitude, len(signal))
-        return [np.array(signal) + noise]
+        signal = np.asarray(signal)
+        generator = self._streams.generator()
+        recording = self._load()
+        augmented = np.empty(signal.shape, dtype=float_dtype(signal.dtype))
+        gains = _draw_gains(generator, self.gain, signal, self.link_channels)
+        if self.link_channels and signal.ndim > 1:
+            offsets = np.repeat(generator.integers(0, len(recording), _n_signals(signal)), signal.shape[-2])
+        else:
+            offsets = generator.integers(0, len(recording), len(gains))
+        fill_segments(recording, offsets, gains, augmented)
+        augmented += signal
+        return [augmented]
+
+    def augment_batch(self, signals, sr):
+        if isinstance(signals, np.ndarray):
+            return [[row] for row in self.augment(signals, sr)[0]]
+        return super().augment_batch(signals, sr)
+
+    def for_worker(self, worker):
+        augmentation = copy.copy(self)
+        augmentation._streams = self._streams.for_worker(worker)
+        return augmentation
+
+    def _load(self):
+        if self._recording is None:
+            self._recording = np.load(self.corpus, mmap_mode='r')
+        return self._recording
+
+
+def _n_rows(signal):
+    # number of rows in a signal or a block of them, each of which gets noise of its own
+    return int(np.prod(signal.shape[:-1]))
+
+
+def _n_signals(signal):
+    # number of signals of several channels in a signal or a block of them
+    return int(np.prod(signal.shape[:-2]))
+
+
+def _draw_gains(generator, gain, signal, link_channels):
+    # a gain per row, or with link_channels, per signal, repeated for each of its channels
+    if link_channels and signal.ndim > 1:
+        return np.repeat(draw_gains(generator, gain, _n_signals(signal)), signal.shape[-2])
+    return draw_gains(generator, gain, _n_rows(signal))
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def _check_frequency(frequency, sr):
+    if frequency <= 0 or frequency > sr / 2:
+        raise ValueError("frequency must be between 0 and half the sample rate ({0}), not {1}".format(sr / 2, frequency))
+
+
+def _normalize(b, a):
+    # coefficients that depend on an array of parameters are arrays themselves, and the others are broadcast to match
+    b = np.array(np.broadcast_arrays(*b), dtype=np.float64)
+    a = np.array(np.broadcast_arrays(*a), dtype=np.float64)
+    return b / a[0], a / a[0]
+
+
+def equalizer(frequency: float, resonance: float, gain: float, sr: int):
+    """
+    Coefficients of a peaking equalizer, computed the same way as SoX's equalizer effect.
+
+    :param frequency: center of the filter
+    :param resonance: width of the filter as a q-factor
+    :param gain: height of the filter in dB, or an ndarray of heights to compute the coefficients of several filters at once
+    :param sr: sample rate, int
+    :return: (b, a), normalized so that a[0] == 1. For an ndarray of gains, b and a have one column per gain.
+    """
+    _check_frequency(frequency, sr)
+    w0 = 2 * np.pi * frequency / sr
+    amplitude = np.exp(gain / 40 * np.log(10.))
+    alpha = np.sin(w0) / (2 * resonance)
+
+    b = [1 + alpha * amplitude, -2 * np.cos(w0), 1 - alpha * amplitude]
+    a = [1 + alpha / amplitude, -2 * np.cos(w0), 1 - alpha / amplitude]
+    return _normalize(b, a)
+
+
+def lowpass(frequency: float, resonance: float, n_poles: int, sr: int):
+    """
+    Coefficients of a low pass filter, computed the same way as SoX's lowpass effect.
+
+    :param frequency: center of the filter
+    :param resonance: width of the filter as a q-factor. Only applies when n_poles = 2.
+    :param n_poles: either 1 or 2. Number of poles in the filter.
+    :param sr: sample rate, int
+    :return: (b, a), normalized so that a[0] == 1
+    """
+    _check_frequency(frequency, sr)
+    w0 = 2 * np.pi * frequency / sr
+
+    if n_poles == 1:
+        a1 = -np.exp(-w0)
+        return _normalize([1 + a1, 0, 0], [1, a1, 0])
+
+    alpha = np.sin(w0) / (2 * resonance)
+    b = [(1 - np.cos(w0)) / 2, 1 - np.cos(w0), (1 - np.cos(w0)) / 2]
+    a = [1 + alpha, -2 * np.cos(w0), 1 - alpha]
+    return _normalize(b, a)
+
+
+def highpass(frequency: float, resonance: float, n_poles: int, sr: int):
+    """
+    Coefficients of a high pass filter, computed the same way as SoX's highpass effect.
+
+    :param frequency: center of the filter
+    :param resonance: width of the filter as a q-factor. Only applies when n_poles = 2.
+    :param n_poles: either 1 or 2. Number of poles in the filter.
+    :param sr: sample rate, int
+    :return: (b, a), normalized so that a[0] == 1
+    """
+    _check_frequency(frequency, sr)
+    w0 = 2 * np.pi * frequency / sr
+
+    if n_poles == 1:
+        a1 = -np.exp(-w0)
+        b0 = (1 - a1) / 2
+        return _normalize([b0, -b0, 0], [1, a1, 0])
+
+    alpha = np.sin(w0) / (2 * resonance)
+    b = [(1 + np.cos(w0)) / 2, -(1 + np.cos(w0)), (1 + np.cos(w0)) / 2]
+    a = [1 + alpha, -2 * np.cos(w0), 1 - alpha]
+    return _normalize(b, a)
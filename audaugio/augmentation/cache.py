@@ -0,0 +1,258 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .augmentation_base import AugmentationBase
+
+
+class AugmentationCache:
+    """
+    Stores the results of augmentations, keyed by a hash of the input signal, the sample rate, and the augmentation's class and parameters.
+
+    Results are kept in memory up to max_bytes, evicting the least recently used ones first. With a directory, results are also written to disk as
+    .npy files, up to max_disk_bytes, and read back as read-only memory maps; the directory can be shared between processes and between runs.
+    Cached signals are read-only, since the same arrays are handed out every time.
+
+    :param max_bytes: size of the in-memory tier in bytes. 0 disables it.
+    :param directory: directory of the on-disk tier. By default, there is no on-disk tier.
+    :param max_disk_bytes: size of the on-disk tier in bytes. By default, it is unbounded.
+    """
+
+    def __init__(self, max_bytes: int = 2 ** 30, directory: str = None, max_disk_bytes: int = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return 'AugmentationCache(max_bytes={0!r}, directory={1!r}, max_disk_bytes={2!r})'.format(self.max_bytes, self.directory, self.max_disk_bytes)
+
+    def __getstate__(self):
+        # worker processes get their own, empty in-memory tier and share the on-disk one
+        state = self.__dict__.copy()
+        state.update(_memory=OrderedDict(), _memory_bytes=0, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Return the signals stored under key, or None.
+        """
+        with self._lock:
+            signals = self._memory.get(key)
+            if signals is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return signals
+
+        signals = self._load(key)
+        with self._lock:
+            if signals is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._remember(key, signals)
+        return signals
+
+    def put(self, key: str, signals):
+        """
+        Store signals under key, and return read-only views of them as they are stored.
+        """
+        # views, since augmentations can return their input as it is and the caller's arrays shouldn't become read-only
+        signals = [np.asarray(signal).view() for signal in signals]
+        for signal in signals:
+            signal.setflags(write=False)
+        with self._lock:
+            self._remember(key, signals)
+        if self.directory is not None:
+            self._store(key, signals)
+        return signals
+
+    def clear(self):
+        """
+        Empty both tiers of the cache.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.directory is not None:
+            for entry in os.listdir(self.directory):
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def _remember(self, key, signals):
+        size = sum(signal.nbytes for signal in signals)
+        if size > self.max_bytes or key in self._memory:
+            return
+        self._memory[key] = signals
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sum(signal.nbytes for signal in evicted)
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        path = os.path.join(self.directory, key)
+        try:
+            n_signals = len(os.listdir(path))
+            signals = [_load_array(os.path.join(path, '{0}.npy'.format(i))) for i in range(n_signals)]
+            os.utime(path)  # the modification time of an entry is when it was last used
+        except (FileNotFoundError, ValueError):
+            return None
+        return signals
+
+    def _store(self, key, signals):
+        path = os.path.join(self.directory, key)
+        if os.path.exists(path):
+            return
+        # entries are written next to the cache and renamed into place, so that other processes never see half of one
+        staging = tempfile.mkdtemp(prefix='.', dir=self.directory)
+        for i, signal in enumerate(signals):
+            np.save(os.path.join(staging, '{0}.npy'.format(i)), signal)
+        try:
+            os.rename(staging, path)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+        if self.max_disk_bytes is not None:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for entry in os.listdir(self.directory):
+            if entry.startswith('.'):
+                continue
+            path = os.path.join(self.directory, entry)
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except FileNotFoundError:
+                continue
+            total += size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class CachedAugmentation(AugmentationBase):
+    """
+    Wrap an augmentation so that its results are looked up in a cache before it is run. Augmentations that aren't deterministic (see
+    AugmentationBase.deterministic) are always run. Only whole signals are cached, so the wrapped augmentation is never run in spectral mode.
+
+    :param augmentation: the augmentation to cache
+    :param cache: an AugmentationCache, which can be shared between augmentations and chains. By default, a new in-memory one.
+    """
+
+    def __init__(self, augmentation: AugmentationBase, cache: AugmentationCache = None):
+        super().__init__(augmentation.replaces)
+        self.augmentation = augmentation
+        self.cache = AugmentationCache() if cache is None else cache
+
+    @property
+    def accepts_stacked(self):
+        return self.augmentation.accepts_stacked
+
+    @property
+    def commutes(self):
+        return self.augmentation.commutes
+
+    @property
+    def multichannel(self):
+        return self.augmentation.multichannel
+
+    @property
+    def cost_per_sample(self):
+        return self.augmentation.cost_per_sample
+
+    @property
+    def deterministic(self):
+        return self.augmentation.deterministic
+
+    def output_shape(self, n_samples, sr):
+        return self.augmentation.output_shape(n_samples, sr)
+
+    def augment(self, signal, sr):
+        return self.augment_batch([signal], sr)[0]
+
+    def streamer(self, sr):
+        # streams are never cached, since no block is a whole signal
+        return self.augmentation.streamer(sr)
+
+    def augment_batch(self, signals, sr):
+        if not self.augmentation.deterministic:
+            return self.augmentation.augment_batch(signals, sr)
+
+        keys = [cache_key(self.augmentation, signal, sr) for signal in signals]
+        augmented = [self.cache.get(key) for key in keys]
+        misses = [i for i, cached in enumerate(augmented) if cached is None]
+        if misses:
+            computed = self.augmentation.augment_batch([signals[i] for i in misses], sr)
+            for i, outputs in zip(misses, computed):
+                augmented[i] = self.cache.put(keys[i], outputs)
+        return augmented
+
+
+def cache_key(augmentation: AugmentationBase, signal, sr):
+    """
+    Return the key the results of applying an augmentation to a signal are cached under.
+
+    :param augmentation: the augmentation
+    :param signal: the unaugmented signal, ndarray
+    :param sr: sample rate, int
+    """
+    signal = np.ascontiguousarray(signal)
+    digest = hashlib.blake2b(digest_size=20)
+    _hash_value(digest, augmentation)
+    digest.update('|{0}|{1}|{2}|'.format(sr, signal.dtype.str, signal.shape).encode())
+    digest.update(signal.data)
+    return digest.hexdigest()
+
+
+def _hash_value(digest, value):
+    # parameters are hashed by their repr, apart from arrays, whose repr numpy abbreviates once they're large, and whatever holds them
+    if isinstance(value, AugmentationBase):
+        digest.update('{0}.{1}('.format(type(value).__module__, type(value).__qualname__).encode())
+        _hash_value(digest, value.params())
+        digest.update(b')')
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        value = np.ascontiguousarray(value)
+        digest.update('array({0}, {1}, '.format(value.dtype.str, value.shape).encode())
+        digest.update(value.data)
+        digest.update(b')')
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        digest.update('{0}({1}, '.format(type(value).__name__, len(value)).encode())
+        for item in value:
+            _hash_value(digest, item)
+        digest.update(b')')
+    elif isinstance(value, dict):
+        digest.update('dict({0}, '.format(len(value)).encode())
+        for name, item in sorted(value.items()):
+            _hash_value(digest, name)
+            _hash_value(digest, item)
+        digest.update(b')')
+    else:
+        digest.update('{0!r}, '.format(value).encode())
+
+
+def _load_array(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:  # arrays without any samples can't be memory mapped
+        return np.load(path)
@@ -0,0 +1,30 @@
+"""
+The type of augmented signals.
+
+Augmentations return signals of the same floating point type as the signals they augment, so a float32 signal stays float32 all the way through a
+chain instead of being upcast to float64 by the first augmentation that computes in it. Signals that aren't floating point, like 16-bit integer
+samples, are augmented as the smallest floating point type that holds them, which is what float_dtype() returns. Chains can also convert every signal
+to a fixed type up front (see ChainBase).
+"""
+import numpy as np
+
+
+def float_dtype(dtype):
+    """
+    Return the type augmentations return for signals of a given type: the type itself for float32 and float64 signals, and the smallest floating
+    point type that holds every value of it otherwise.
+
+    :param dtype: type of the unaugmented signal
+    """
+    return np.result_type(dtype, np.float32)
+
+
+def as_float(signal, dtype=None):
+    """
+    Return a signal as an ndarray of a floating point type, without copying it if it already is one.
+
+    :param signal: the signal
+    :param dtype: the type to convert to, float_dtype() of the signal's type by default
+    """
+    signal = np.asarray(signal)
+    return signal.astype(float_dtype(signal.dtype) if dtype is None else dtype, copy=False)
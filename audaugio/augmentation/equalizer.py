@@ -1,45 +1,127 @@
-from .augmentation_base import SoxAugmentationBase
+import numpy as np
 
+from . import biquad
+from .augmentation_base import AugmentationBase, FilterAugmentationBase
+from .dtypes import float_dtype
+from .streaming import FilterStreamer
 
-class EqualizerAugmentation(SoxAugmentationBase):
+
+class EqualizerAugmentation(FilterAugmentationBase):
     """
     Add an arbitrarily tall and wide frequency filter at an arbitrary frequency.
 
     :param frequency: center of the filter
     :param resonance: width of the filter as a q-factor
     :param gain: height of the filter in dB
+    :param backend: one of 'native', 'sox' or 'sox-file'. The SoX backends require SoX to be installed.
+    """
+
+    def __init__(self, frequency: float, resonance: float, gain: float, backend: str = 'native'):
+        super().__init__(replaces=False, backend=backend)
+        self.frequency = frequency
+        self.resonance = resonance
+        self.gain = gain
+        if self.transformer is not None:
+            self.transformer.equalizer(frequency, resonance, gain)
+
+    def coefficients(self, sr):
+        return biquad.equalizer(self.frequency, self.resonance, self.gain, sr)
+
+
+class EqualizerSweepAugmentation(AugmentationBase):
     """
+    Apply several equalizers that only differ in gain, returning one signal per gain. The coefficients of every equalizer are computed together and
+    cached per sample rate, and the signal is filtered in memory like EqualizerAugmentation's native backend does.
 
-    def __init__(self, frequency: float, resonance: float, gain: float):
+    :param frequency: center of the filters
+    :param resonance: width of the filters as a q-factor
+    :param gain: heights of the filters in dB, one per augmented signal
+    """
+
+    accepts_stacked = True
+    commutes = True
+    multichannel = True
+
+    def __init__(self, frequency: float, resonance: float, gain):
         super().__init__(replaces=False)
-        self.transformer.equalizer(frequency, resonance, gain)
+        self.frequency = frequency
+        self.resonance = resonance
+        self.gain = list(gain)
+        self._coefficients = {}
+
+    @property
+    def cost_per_sample(self):
+        return 2. * len(self.gain)
+
+    def coefficients(self, sr):
+        """
+        Return the (b, a) coefficients of every equalizer at a given sample rate, as two arrays with one row per gain.
 
+        :param sr: sample rate, int
+        """
+        b, a = biquad.equalizer(self.frequency, self.resonance, np.array(self.gain, dtype=np.float64), sr)
+        return b.T, a.T
 
-class LowPassAugmentation(SoxAugmentationBase):
+    def augment(self, signal, sr):
+        import scipy.signal
+
+        # lfilter takes a single filter per call, so the sweep shares everything but the filtering itself
+        return [scipy.signal.lfilter(b, a, signal) for b, a in zip(*self._cached_coefficients(sr, float_dtype(signal.dtype)))]
+
+    def streamer(self, sr):
+        return FilterStreamer(list(zip(*self._cached_coefficients(sr))))
+
+    def output_shape(self, n_samples, sr):
+        return len(self.gain), n_samples
+
+    def _cached_coefficients(self, sr, dtype=np.float64):
+        key = sr, np.dtype(dtype)
+        if key not in self._coefficients:
+            self._coefficients[key] = tuple(np.asarray(c, dtype=dtype) for c in self.coefficients(sr))
+        return self._coefficients[key]
+
+
+class LowPassAugmentation(FilterAugmentationBase):
     """
     Filter out high frequencies.
 
     :param frequency: center of the filter
     :param resonance: width of the filter as a q-factor. Only applies when n_poles = 2.
     :param n_poles: either 1 or 2. Number of poles in the filter.
+    :param backend: one of 'native', 'sox' or 'sox-file'. The SoX backends require SoX to be installed.
     """
-    def __init__(self, frequency: float, resonance: float, n_poles: int = 1):
-        super().__init__(replaces=False)
+    def __init__(self, frequency: float, resonance: float, n_poles: int = 1, backend: str = 'native'):
+        super().__init__(replaces=False, backend=backend)
         if n_poles not in [1, 2]:
             raise ValueError("n_poles must be 1 or 2, not {0}".format(n_poles))
-        self.transformer.lowpass(frequency, resonance, n_poles)
+        self.frequency = frequency
+        self.resonance = resonance
+        self.n_poles = n_poles
+        if self.transformer is not None:
+            self.transformer.lowpass(frequency, resonance, n_poles)
+
+    def coefficients(self, sr):
+        return biquad.lowpass(self.frequency, self.resonance, self.n_poles, sr)
 
 
-class HighPassAugmentation(SoxAugmentationBase):
+class HighPassAugmentation(FilterAugmentationBase):
     """
     Filter out low frequencies.
 
     :param frequency: center of the filter
     :param resonance: width of the filter as a q-factor. Only applies when n_poles = 2.
     :param n_poles: either 1 or 2. Number of poles in the filter.
+    :param backend: one of 'native', 'sox' or 'sox-file'. The SoX backends require SoX to be installed.
     """
-    def __init__(self, frequency: float, resonance: float, n_poles: int = 1):
-        super().__init__(replaces=False)
+    def __init__(self, frequency: float, resonance: float, n_poles: int = 1, backend: str = 'native'):
+        super().__init__(replaces=False, backend=backend)
         if n_poles not in [1, 2]:
             raise ValueError("n_poles must be 1 or 2, not {0}".format(n_poles))
-        self.transformer.highpass(frequency, resonance, n_poles)
+        self.frequency = frequency
+        self.resonance = resonance
+        self.n_poles = n_poles
+        if self.transformer is not None:
+            self.transformer.highpass(frequency, resonance, n_poles)
+
+    def coefficients(self, sr):
+        return biquad.highpass(self.frequency, self.resonance, self.n_poles, sr)
@@ -0,0 +1,124 @@
+import copy
+import threading
+
+import numpy as np
+
+COLORS = ('white', 'pink', 'brown')
+
+# added to the spawn key of worker streams, so that they never coincide with the streams of threads, which are numbered from 0
+_WORKER_KEY = 2 ** 31
+
+
+class RandomStreams:
+    """
+    Independent streams of random numbers for an augmentation, built on numpy's Generator and SeedSequence. Every thread that draws from the streams
+    gets a Generator of its own, so threads neither wait on each other nor share state, and for_worker() gives every worker process streams of its
+    own as well.
+
+    With a seed, a single thread draws the same numbers every time. Without one, the streams are seeded from the operating system, and so is every
+    copy of them sent to another process, so that copies don't repeat each other's numbers.
+
+    :param seed: int, or None to seed from the operating system
+    """
+
+    def __init__(self, seed: int = None):
+        self.seed = seed
+        self._sequence = np.random.SeedSequence(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'RandomStreams(seed={0!r})'.format(self.seed)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_local=None, _lock=None)
+        if self.seed is None:
+            state['_sequence'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._sequence is None:
+            self._sequence = np.random.SeedSequence()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def generator(self):
+        """
+        Return the Generator of the calling thread.
+        """
+        generator = getattr(self._local, 'generator', None)
+        if generator is None:
+            with self._lock:
+                sequence = self._sequence.spawn(1)[0]
+            generator = self._local.generator = np.random.Generator(np.random.PCG64(sequence))
+        return generator
+
+    def for_worker(self, worker: int):
+        """
+        Return streams for the given worker process, independent of the streams of every other worker and of these ones.
+
+        :param worker: number of the worker
+        """
+        streams = copy.copy(self)
+        streams._sequence = np.random.SeedSequence(self._sequence.entropy, spawn_key=self._sequence.spawn_key + (_WORKER_KEY, worker))
+        streams._local = threading.local()
+        streams._lock = threading.Lock()
+        return streams
+
+
+def colored_noise(generator, shape, color: str = 'white', dtype=np.float64):
+    """
+    Draw noise with a standard deviation of 1 along the last axis. Pink noise has a power spectral density proportional to 1/f and brown noise to
+    1/f^2; both are shaped from white noise in the frequency domain.
+
+    :param generator: the numpy Generator to draw from
+    :param shape: shape of the noise
+    :param color: 'white', 'pink' or 'brown'
+    :param dtype: float32 or float64
+    """
+    if color == 'white':
+        return generator.standard_normal(shape, dtype=dtype)
+    if color not in COLORS:
+        raise ValueError("color must be one of {0}, not {1}".format(COLORS, color))
+
+    n_samples = shape[-1] if len(shape) else 1
+    spectrum = np.fft.rfft(generator.standard_normal(shape, dtype=dtype), axis=-1)
+    frequencies = np.arange(spectrum.shape[-1], dtype=np.float64)
+    frequencies[0] = np.inf  # no DC offset
+    spectrum *= (frequencies ** -.5 if color == 'pink' else 1 / frequencies).astype(dtype)
+    noise = np.fft.irfft(spectrum, n_samples, axis=-1).astype(dtype, copy=False)
+    noise /= np.maximum(noise.std(axis=-1, keepdims=True), np.finfo(dtype).tiny)
+    return noise
+
+
+def fill_segments(source, offsets, gains, out):
+    """
+    Fill out with segments of a source, scaled by a gain each, without allocating anything else. Segments that run past the end of the source wrap
+    around to its start.
+
+    :param source: 1-D array to take the segments from, like a bank of noise or a memory mapped recording
+    :param offsets: index in source each row of out starts at
+    :param gains: factor to scale each row's segment by
+    :param out: array to fill, with the segments along its last axis
+    """
+    if out.size == 0:
+        return
+    for row, offset, gain in zip(out.reshape(-1, out.shape[-1]), offsets, gains):
+        position = 0
+        while position < len(row):
+            n_samples = min(len(row) - position, len(source) - offset)
+            np.multiply(source[offset:offset + n_samples], gain, out=row[position:position + n_samples])
+            position += n_samples
+            offset = 0
+
+
+def draw_gains(generator, gain, n_rows):
+    """
+    Return a gain per row: gain itself, or drawn uniformly from a (low, high) range.
+    """
+    if np.ndim(gain) == 0:
+        return np.full(n_rows, gain, dtype=np.float64)
+    low, high = gain
+    return generator.uniform(low, high, n_rows)
@@ -1,16 +1,77 @@
-import librosa
-
+from . import wsola
 from .augmentation_base import AugmentationBase
+from .dtypes import float_dtype
+from .spectral import SpectralSignal
+from .time_stretch import ENGINES
 
 
 class PitchShiftAugmentation(AugmentationBase):
     """
     Pitch shift a signal by half-steps without changing the duration.
+
+    Either engine stretches the signal and resamples it back to its original length: the 'librosa' engine with librosa's phase vocoder and
+    resampler, and the 'wsola' engine in the time domain and with a polyphase filter (see audaugio.augmentation.wsola), which is several times
+    faster. Only the 'librosa' engine runs in spectral mode, and only the 'wsola' engine augments signals of several channels in one call, which
+    keeps them aligned.
+
+    :param steps: half-steps to shift by
+    :param engine: either 'librosa' or 'wsola'
     """
 
-    def __init__(self, steps):
+    def __init__(self, steps, engine: str = 'librosa'):
         super().__init__(replaces=False)
+        if engine not in ENGINES:
+            raise ValueError("engine must be one of {0}, not {1}".format(ENGINES, engine))
         self.steps = steps
+        self.engine = engine
+
+    @property
+    def spectral(self):
+        return self.engine == 'librosa'
+
+    @property
+    def multichannel(self):
+        return self.engine == 'wsola'
+
+    @property
+    def cost_per_sample(self):
+        return 60. if self.engine == 'librosa' else 15.
 
     def augment(self, signal, sr):
-        return [librosa.effects.pitch_shift(signal, sr, self.steps)]
+        if self.engine == 'wsola':
+            return [wsola.pitch_shift(signal, sr, self.steps)]
+        import librosa
+
+        return [librosa.effects.pitch_shift(signal, sr, self.steps).astype(float_dtype(signal.dtype), copy=False)]
+
+    def augment_spectral(self, signal):
+        return [signal.pitch_shift(self.steps)]
+
+
+class PitchShiftSweepAugmentation(AugmentationBase):
+    """
+    Pitch shift a signal by several amounts of half-steps, returning one signal per amount. The signal is only analyzed once for all of them (see
+    SpectralSignal), but every amount still takes a phase vocoder, an inverse STFT and resampling of its own, so a sweep costs about as much as a
+    PitchShiftAugmentation per amount.
+
+    :param steps: amounts of half-steps to shift by, one per augmented signal
+    """
+
+    spectral = True
+
+    def __init__(self, steps):
+        super().__init__(replaces=False)
+        self.steps = list(steps)
+
+    @property
+    def cost_per_sample(self):
+        return 60. * len(self.steps)
+
+    def augment(self, signal, sr):
+        return [augmented.materialize() for augmented in self.augment_spectral(SpectralSignal(signal, sr))]
+
+    def augment_spectral(self, signal):
+        return [signal.pitch_shift(steps) for steps in self.steps]
+
+    def output_shape(self, n_samples, sr):
+        return len(self.steps), n_samples
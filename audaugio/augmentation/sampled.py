@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+
+from .augmentation_base import AugmentationBase, stack_channels
+from .noise import RandomStreams
+
+
+class SampledAugmentation(AugmentationBase):
+    """
+    An augmentation whose parameters are drawn at random for every signal, like pitch shifting by a random number of steps. Every signal is
+    augmented by an augmentation of the given class, built with parameters drawn from the given distributions. Every channel of a signal of several
+    channels is augmented with the same parameters, even by augmentations that only take one channel at a time.
+
+    Distributions are given per parameter: a (low, high) tuple is drawn from uniformly, as an int between low and high inclusive if both are ints and
+    as a float otherwise, a list is drawn from with equal probability, and anything else is passed on as it is.
+
+    :param augmentation: the augmentation class, like PitchShiftAugmentation
+    :param distributions: dict of keyword arguments of the class and the distribution of each
+    :param seed: seed of the random streams, to draw the same parameters every time
+    """
+
+    deterministic = False
+    multichannel = True
+
+    def __init__(self, augmentation: type, distributions: dict, seed: int = None):
+        self.augmentation = augmentation
+        self.distributions = dict(distributions)
+        self.seed = seed
+        self._streams = RandomStreams(seed)
+        # whether the augmentation replaces its input, and what it costs, doesn't depend on its parameters
+        self._probe = self.draw(np.random.default_rng(0))
+        super().__init__(replaces=self._probe.replaces)
+
+    @property
+    def cost_per_sample(self):
+        return self._probe.cost_per_sample
+
+    def draw(self, generator):
+        """
+        Return an augmentation with parameters drawn from the distributions.
+
+        :param generator: the numpy Generator to draw from
+        """
+        return self.augmentation(**{name: _draw(generator, distribution) for name, distribution in self.distributions.items()})
+
+    def augment(self, signal, sr):
+        augmentation = self.draw(self._streams.generator())
+        if np.ndim(signal) < 2 or augmentation.multichannel:
+            return augmentation.augment(signal, sr)
+        return stack_channels([augmentation.augment(channel, sr) for channel in signal])
+
+    def output_shape(self, n_samples, sr):
+        return self._probe.output_shape(n_samples, sr)
+
+    def for_worker(self, worker):
+        augmentation = copy.copy(self)
+        augmentation._streams = self._streams.for_worker(worker)
+        return augmentation
+
+
+def _draw(generator, distribution):
+    if isinstance(distribution, tuple):
+        low, high = distribution
+        if isinstance(low, (int, np.integer)) and isinstance(high, (int, np.integer)):
+            return int(generator.integers(low, high, endpoint=True))
+        return float(generator.uniform(low, high))
+    if isinstance(distribution, list):
+        return distribution[generator.integers(len(distribution))]
+    return distribution
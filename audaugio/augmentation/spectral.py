@@ -0,0 +1,146 @@
+import numpy as np
+
+from .dtypes import float_dtype
+
+
+class SpectralSignal:
+    """
+    A signal on its way through a run of spectral augmentations, like pitch shifting and time stretching, held as its short-time Fourier transform
+    (STFT) so that consecutive spectral augmentations don't each go back and forth between the time domain and the frequency domain.
+
+    The STFT is only computed when an augmentation first needs it, and is shared by every augmentation applied to the same SpectralSignal, along with
+    the magnitudes and phase advances the phase vocoder reads from it. That only saves the analysis, which is the cheap part: every pitch shift or
+    time stretch still runs a phase vocoder of its own, and every result an inverse STFT and resampling of its own, so stretching one signal by
+    several rates costs about as much as stretching it by each rate separately. The resampling pitch shifting needs is postponed, and done once,
+    along with the inverse STFT, by materialize(), so that consecutive pitch shifts of a signal resample it once. Results are close to, but not
+    exactly the same as, applying the augmentations one at a time.
+
+    STFTs use librosa's default parameters, which are the ones librosa.effects uses.
+
+    :param signal: unaugmented signal, 1-D ndarray
+    :param sr: sample rate, int
+    """
+
+    def __init__(self, signal: np.ndarray, sr: int):
+        self.sr = sr
+        self.dtype = float_dtype(signal.dtype)
+        #: length in samples of the signal materialize() returns
+        self.length = len(signal)
+        #: factor the signal still has to be resampled by, as in the ratio of its new length to its current one
+        self.resample_ratio = 1.
+        self._signal = signal
+        self._stft = None
+        self._magnitude = None
+        self._phase_advance = None
+
+    @property
+    def stft(self):
+        """
+        The STFT of the signal, before any pending resampling.
+        """
+        if self._stft is None:
+            import librosa
+
+            self._stft = librosa.stft(self._signal)
+        return self._stft
+
+    @property
+    def size(self):
+        return self.length
+
+    @property
+    def nbytes(self):
+        return 0 if self._stft is None else self._stft.nbytes
+
+    def time_stretch(self, rate: float):
+        """
+        Return a new SpectralSignal, stretched in time by rate like librosa.effects.time_stretch() does.
+        """
+        return self._derive(self._phase_vocoder(rate), int(round(self.length / rate)), self.resample_ratio)
+
+    def pitch_shift(self, n_steps: float, bins_per_octave: int = 12):
+        """
+        Return a new SpectralSignal, pitch shifted by n_steps like librosa.effects.pitch_shift() does.
+        """
+        rate = 2.0 ** (-float(n_steps) / bins_per_octave)
+        # the signal is stretched now, and brought back to its length by resampling once it's materialized
+        return self._derive(self._phase_vocoder(rate), self.length, self.resample_ratio * rate)
+
+    def materialize(self):
+        """
+        Return the signal as an ndarray, running the inverse STFT and any pending resampling. The result is kept, so this only does the work once.
+        """
+        if self._signal is None:
+            import librosa
+
+            # inverted to the length the signal has before resampling, as librosa does, so that resampling sees the same edges
+            signal = librosa.istft(self._stft, dtype=self.dtype, length=int(round(self.length / self.resample_ratio)))
+            if self.resample_ratio != 1:
+                signal = librosa.resample(signal, orig_sr=float(self.sr) / self.resample_ratio, target_sr=self.sr)
+                signal = librosa.util.fix_length(signal, size=self.length).astype(self.dtype, copy=False)
+            self._signal = signal
+        return self._signal
+
+    def _phase_vocoder(self, rate):
+        # librosa.phase_vocoder(), vectorized over frames, with everything that doesn't depend on rate computed once per signal. Phases are
+        # accumulated in the precision of the STFT, as librosa does, so that float32 signals get the same result as with librosa.
+        stft = self.stft
+        if self._magnitude is None:
+            n_bins = stft.shape[0]
+            hop_length = (n_bins - 1) // 2
+            # two frames of silence at the end, like librosa, so that interpolating past the last frame reads zeros
+            padded = np.pad(stft, [(0, 0), (0, 2)], mode='constant')
+            phase = np.angle(padded)
+            expected = np.linspace(0, np.pi * hop_length, n_bins)[:, np.newaxis]
+            deviation = phase[:, 1:] - phase[:, :-1] - expected
+            deviation -= 2.0 * np.pi * np.round(deviation / (2.0 * np.pi))
+            self._magnitude = np.abs(padded)
+            # the phase advance from each frame to the next
+            self._phase_advance = expected + deviation
+
+        time_steps = np.arange(0, stft.shape[1], rate, dtype=np.float64)
+        frames = time_steps.astype(int)
+        alpha = np.mod(time_steps, 1.0)
+        magnitude = (1.0 - alpha) * self._magnitude[:, frames] + alpha * self._magnitude[:, frames + 1]
+        # the phase of each output frame is the phase of the first input frame advanced by every frame read before it
+        phase = np.empty((stft.shape[0], len(frames)), dtype=self._magnitude.dtype)
+        phase[:, 0] = np.angle(stft[:, 0])
+        advance = self._phase_advance[:, frames[:-1]]
+        if phase.dtype == np.float64:
+            np.cumsum(advance, axis=1, out=phase[:, 1:])
+            phase[:, 1:] += phase[:, :1]
+        else:
+            # rounded to the STFT's precision after every frame, like librosa's accumulator, which a cumulative sum can't do
+            for i in range(1, len(frames)):
+                np.add(phase[:, i - 1], advance[:, i - 1], out=phase[:, i])
+        augmented = np.cos(phase) + 1j * np.sin(phase)
+        augmented *= magnitude
+        return augmented.astype(stft.dtype, copy=False)
+
+    def _derive(self, stft, length, resample_ratio):
+        derived = SpectralSignal.__new__(SpectralSignal)
+        derived.sr = self.sr
+        derived.dtype = self.dtype
+        derived.length = length
+        derived.resample_ratio = resample_ratio
+        derived._signal = None
+        derived._stft = stft
+        derived._magnitude = None
+        derived._phase_advance = None
+        return derived
+
+
+def as_spectral(signal, sr: int):
+    """
+    Wrap a 1-D signal in a SpectralSignal, unless it already is one. Blocks of signals are returned as they are.
+    """
+    if isinstance(signal, SpectralSignal) or np.ndim(signal) != 1:
+        return signal
+    return SpectralSignal(signal, sr)
+
+
+def as_signal(signal):
+    """
+    Return a signal as an ndarray, materializing it if it's a SpectralSignal.
+    """
+    return signal.materialize() if isinstance(signal, SpectralSignal) else signal
@@ -0,0 +1,145 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from .dtypes import float_dtype
+
+
+class Streamer:
+    """
+    Applies an augmentation to one signal that arrives in consecutive blocks, keeping whatever state the augmentation needs from one block to the
+    next. Returned by AugmentationBase.streamer(); every stream gets its own.
+    """
+
+    #: whether push() returns whole signals, like windows, rather than the next block of each augmented stream. Chains only stream augmentations up
+    #: to the first streamer that does, and apply the rest of the chain to the signals it returns.
+    emits_signals = False
+
+    def push(self, block):
+        """
+        Augment the next block of the stream. Unless emits_signals is set, this returns exactly one block per augmented stream every time, as long as
+        the block it was given.
+
+        :param block: next block of the unaugmented signal, 1-D ndarray, or 2-D with one row per channel
+        :return: list of augmented blocks, or of whole signals if emits_signals is set
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Return whatever the streamer still holds at the end of the stream, as a list of whole signals. Only streamers with emits_signals return any.
+        """
+        return []
+
+
+class BlockStreamer(Streamer):
+    """
+    Streams an augmentation that doesn't depend on any samples outside of the block it augments, by augmenting every block on its own.
+
+    :param augmentation: the augmentation to stream
+    :param sr: sample rate, int
+    """
+
+    def __init__(self, augmentation, sr: int):
+        self.augmentation = augmentation
+        self.sr = sr
+
+    def push(self, block):
+        return self.augmentation.augment(block, self.sr)
+
+
+class FilterStreamer(Streamer):
+    """
+    Streams one or more filters, carrying their state across blocks so that the result is the same as filtering the whole signal at once.
+
+    :param coefficients: list of (b, a) coefficients, one per augmented stream
+    """
+
+    def __init__(self, coefficients):
+        self.coefficients = coefficients
+        self._state = None
+
+    def push(self, block):
+        import scipy.signal
+
+        if self._state is None:
+            # like FilterAugmentationBase.augment(), the filters run in the type of the stream
+            dtype = float_dtype(block.dtype)
+            self.coefficients = [(np.asarray(b, dtype=dtype), np.asarray(a, dtype=dtype)) for b, a in self.coefficients]
+            # every channel of the stream has a state of its own
+            self._state = [np.zeros(block.shape[:-1] + (max(len(a), len(b)) - 1,), dtype=dtype) for b, a in self.coefficients]
+        augmented = []
+        for i, (b, a) in enumerate(self.coefficients):
+            filtered, self._state[i] = scipy.signal.lfilter(b, a, block, zi=self._state[i])
+            augmented.append(filtered)
+        return augmented
+
+
+class WindowStreamer(Streamer):
+    """
+    Streams windowing, returning each window as soon as its last sample has arrived. Only the samples that later windows still need are kept, so
+    windows can span any number of blocks. Produces the same windows as WindowingAugmentation.augment() on the whole signal.
+
+    :param window_samples: length of a window in samples
+    :param hop_samples: distance between the start of each window in samples
+    :param drop_last: whether to drop the last segment of audio when it is shorter than a window
+    :param stacked: whether to return the windows of each block as a 2-D array rather than one array per window
+    """
+
+    emits_signals = True
+
+    def __init__(self, window_samples: int, hop_samples: int, drop_last=False, stacked=False):
+        self.window_samples = window_samples
+        self.hop_samples = hop_samples
+        self.drop_last = drop_last
+        self.stacked = stacked
+        self._buffer = None
+        self._offset = 0  # position in the stream of the first buffered sample
+        self._n_windows = 0
+
+    def push(self, block):
+        # a new array every time, so the windows handed out as views of it are never overwritten, even if the caller reuses its blocks
+        self._buffer = np.array(block) if self._buffer is None else np.concatenate([self._buffer, block], axis=-1)
+        start = self._n_windows * self.hop_samples - self._offset
+        n_windows = max(0, (self._buffer.shape[-1] - start - self.window_samples) // self.hop_samples + 1)
+
+        windows = frames(self._buffer[..., start:], n_windows, self.window_samples, self.hop_samples)
+        self._n_windows += n_windows
+
+        # only keep the samples from the start of the next window on
+        dropped = min(self._n_windows * self.hop_samples - self._offset, self._buffer.shape[-1])
+        self._buffer = self._buffer[..., dropped:]
+        self._offset += dropped
+
+        if self.stacked:
+            return [windows] if n_windows else []
+        return list(windows)
+
+    def finish(self):
+        if self._buffer is None:
+            return []
+        n_samples = self._offset + self._buffer.shape[-1]
+        if self._n_windows == 0:
+            # a signal no longer than a window is returned as it is, like WindowingAugmentation does
+            return [self._buffer]
+
+        start = self._n_windows * self.hop_samples
+        if start < n_samples and start - self.hop_samples + self.window_samples < n_samples and not self.drop_last:
+            last_segment = np.zeros(self._buffer.shape[:-1] + (self.window_samples,), dtype=self._buffer.dtype)
+            last_segment[..., :n_samples - start] = self._buffer[..., start - self._offset:]
+            return [last_segment[np.newaxis] if self.stacked else last_segment]
+        return []
+
+
+def frames(signal, n_windows, window_samples, hop_samples):
+    """
+    Return read-only views of consecutive windows along the last axis of a signal, stacked along a new first axis, so that the windows of a
+    signal of shape (channels, samples) have shape (n_windows, channels, window_samples).
+
+    :param signal: ndarray, with samples along its last axis
+    :param n_windows: number of windows, which have to fit in the signal
+    :param window_samples: length of a window in samples
+    :param hop_samples: distance between the start of each window in samples
+    """
+    stride = signal.strides[-1]
+    return as_strided(signal, shape=(n_windows,) + signal.shape[:-1] + (window_samples,),
+                      strides=(stride * hop_samples,) + signal.strides[:-1] + (stride,), writeable=False)
@@ -1,18 +1,82 @@
-import librosa
+import numpy as np
 
+from . import wsola
 from .augmentation_base import AugmentationBase
+from .dtypes import float_dtype
+from .spectral import SpectralSignal
+
+ENGINES = ('librosa', 'wsola')
 
 
 class TimeStretchAugmentation(AugmentationBase):
     """
     Change the duration of a signal without changing its pitch.
 
+    The 'librosa' engine uses librosa's phase vocoder. The 'wsola' engine stretches the signal in the time domain instead (see
+    audaugio.augmentation.wsola), which is several times faster and doesn't need librosa, but leaves more artifacts on polyphonic signals. Only the
+    'librosa' engine runs in spectral mode, and only the 'wsola' engine augments signals of several channels in one call, which keeps them aligned.
+
     :param rate: factor by which to speed up or slow down the signal. When rate is 1, the signal is not modified.
+    :param engine: either 'librosa' or 'wsola'
     """
 
-    def __init__(self, rate):
+    def __init__(self, rate, engine: str = 'librosa'):
         super().__init__(replaces=False)
+        if engine not in ENGINES:
+            raise ValueError("engine must be one of {0}, not {1}".format(ENGINES, engine))
         self.rate = rate
+        self.engine = engine
+
+    @property
+    def spectral(self):
+        return self.engine == 'librosa'
+
+    @property
+    def multichannel(self):
+        return self.engine == 'wsola'
+
+    @property
+    def cost_per_sample(self):
+        return 40. if self.engine == 'librosa' else 8.
 
     def augment(self, signal, sr):
-        return [librosa.effects.time_stretch(signal, self.rate)]
+        if self.engine == 'wsola':
+            return [wsola.time_stretch(signal, self.rate, sr)]
+        import librosa
+
+        return [librosa.effects.time_stretch(signal, self.rate).astype(float_dtype(signal.dtype), copy=False)]
+
+    def augment_spectral(self, signal):
+        return [signal.time_stretch(self.rate)]
+
+    def output_shape(self, n_samples, sr):
+        return 1, int(round(n_samples / self.rate))
+
+
+class TimeStretchSweepAugmentation(AugmentationBase):
+    """
+    Stretch a signal by several rates, returning one signal per rate. The signal is only analyzed once for all of them (see SpectralSignal), but
+    every rate still takes a phase vocoder and an inverse STFT of its own, so a sweep costs about as much as a TimeStretchAugmentation per rate.
+
+    :param rate: factors by which to speed up or slow down the signal, one per augmented signal
+    """
+
+    spectral = True
+
+    def __init__(self, rate):
+        super().__init__(replaces=False)
+        self.rate = list(rate)
+
+    @property
+    def cost_per_sample(self):
+        return 40. * len(self.rate)
+
+    def augment(self, signal, sr):
+        return [augmented.materialize() for augmented in self.augment_spectral(SpectralSignal(signal, sr))]
+
+    def augment_spectral(self, signal):
+        return [signal.time_stretch(rate) for rate in self.rate]
+
+    def output_shape(self, n_samples, sr):
+        # the augmented signals have different lengths, so this is their average
+        return len(self.rate), int(round(n_samples * np.mean(1 / np.array(self.rate, dtype=np.float64))))
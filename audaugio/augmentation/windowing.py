@@ -1,40 +1,69 @@
 import numpy as np
 
 from .augmentation_base import AugmentationBase
+from .streaming import WindowStreamer, frames
 
 
 class WindowingAugmentation(AugmentationBase):
     """
     Window a signal into many segments of equal length. If hop_size is less than window_length, these windows will overlap.
 
+    Windows are read-only views into the original signal, so windowing does not copy any audio except for the zero-padded last segment. With
+    stacked=True, the windows are returned as a single 2-D array of shape (n_windows, window_samples) instead of one array per window, followed by
+    the padded last segment as a second 2-D array of one row if there is one. Chains pass these blocks on to later augmentations as they are.
+
+    Signals of several channels are windowed along their last axis, so every window keeps all of the channels, and stacked windows have shape
+    (n_windows, channels, window_samples).
+
     :param window_length: the length in seconds of a window
     :param hop_size: the distance in seconds between the start of each window
-    :param drop_last: whether to zero-pad the last segment of audio when it is shorter than window_length. If false, this part of the signal is dropped.
+    :param drop_last: whether to drop the last segment of audio when it is shorter than window_length. If false, this part of the signal is zero-padded.
+    :param stacked: whether to return the windows as 2-D arrays rather than one array per window
     """
 
-    def __init__(self, window_length: float, hop_size: float, drop_last=False):
+    cost_per_sample = 0.
+    multichannel = True
+
+    def __init__(self, window_length: float, hop_size: float, drop_last=False, stacked=False):
         super().__init__(replaces=True)
         self.window_length = window_length
         self.hop_size = hop_size
         self.drop_last = drop_last
+        self.stacked = stacked
 
     def augment(self, signal, sr):
-        window_samples = self.window_length * sr
-        hop_samples = self.hop_size * sr
-        audio_samples = signal.shape[0]
+        window_samples, hop_samples = self._samples(sr)
+        audio_samples = signal.shape[-1]
 
         if window_samples >= audio_samples:
             return [signal]
 
-        segments = []
-        start = 0
-        while start + window_samples <= audio_samples:
-            segments.append(signal[start:start + window_samples])
-            start += hop_samples
+        n_windows = (audio_samples - window_samples) // hop_samples + 1
+        windows = frames(signal, n_windows, window_samples, hop_samples)
+        segments = [windows] if self.stacked else list(windows)
 
-        if start - hop_samples + window_samples < audio_samples and not self.drop_last:
-            pad = np.zeros(window_samples - (audio_samples - start))
-            last_segment = np.append(signal[start:], pad)
-            segments.append(last_segment)
+        start = n_windows * hop_samples
+        if start < audio_samples and start - hop_samples + window_samples < audio_samples and not self.drop_last:
+            last_segment = np.zeros(signal.shape[:-1] + (window_samples,), dtype=signal.dtype)
+            last_segment[..., :audio_samples - start] = signal[..., start:]
+            segments.append(last_segment[np.newaxis] if self.stacked else last_segment)
 
         return segments
+
+    def streamer(self, sr):
+        return WindowStreamer(*self._samples(sr), drop_last=self.drop_last, stacked=self.stacked)
+
+    def output_shape(self, n_samples, sr):
+        window_samples, hop_samples = self._samples(sr)
+        if window_samples >= n_samples:
+            return 1, n_samples
+
+        n_windows = (n_samples - window_samples) // hop_samples + 1
+        start = n_windows * hop_samples
+        padded = start < n_samples and start - hop_samples + window_samples < n_samples and not self.drop_last
+        if self.stacked:
+            return 1 + padded, window_samples
+        return n_windows + padded, window_samples
+
+    def _samples(self, sr):
+        return int(round(self.window_length * sr)), int(round(self.hop_size * sr))
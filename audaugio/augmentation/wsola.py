@@ -0,0 +1,102 @@
+"""
+Time stretching and pitch shifting in the time domain, for the 'wsola' engine of TimeStretchAugmentation and PitchShiftAugmentation.
+
+Time stretching uses WSOLA (waveform similarity overlap-add): the signal is cut into overlapping frames that are added back together at a different
+spacing, with each frame moved by up to a few milliseconds so that it lines up with the waveform of the one before it. Pitch shifting stretches the
+signal and resamples it back to its original length with a polyphase filter, the same way librosa does with its phase vocoder. Both are much faster
+than the phase vocoder, and neither needs librosa, at the cost of some artifacts on polyphonic or very noisy signals.
+
+Signals of several channels are processed along their last axis, with every channel's frames moved by the same amount, which is found on the sum of
+the channels. This keeps the time differences between channels intact.
+"""
+import functools
+from fractions import Fraction
+
+import numpy as np
+
+from .dtypes import float_dtype
+
+# frames are 40 ms long and overlap by half, and move by up to 10 ms to line up with the previous one
+_FRAME_SECONDS = .04
+_TOLERANCE_SECONDS = .01
+_STRIDE = 4
+
+
+def time_stretch(signal, rate, sr):
+    """
+    Change the duration of a signal by a factor without changing its pitch.
+
+    :param signal: 1-D ndarray, or 2-D with one row per channel
+    :param rate: factor to speed the signal up by, like librosa.effects.time_stretch()
+    :param sr: sample rate, int
+    :return: the stretched signal, round(signal.shape[-1] / rate) samples long
+    """
+    signal = np.asarray(signal)
+    dtype = float_dtype(signal.dtype)
+    n_samples = int(round(signal.shape[-1] / rate))
+    hop = max(int(sr * _FRAME_SECONDS) // 2, 1)
+    frame_length = 2 * hop
+    tolerance = int(sr * _TOLERANCE_SECONDS)
+    # a periodic Hann window adds up to exactly 1 wherever two frames overlap by half
+    window = np.hanning(frame_length + 1)[:-1].astype(dtype)
+
+    # output frame i starts at (i - 1) * hop, so the first one ends where the output starts, and is taken from around (i - 1) * hop * rate. The
+    # signal is padded so that frames and the regions searched around them never run past either end.
+    n_frames = n_samples // hop + 2
+    padding = int(np.ceil(hop * rate)) + 2 * frame_length + tolerance
+    padded = np.pad(signal.astype(dtype, copy=False), [(0, 0)] * (signal.ndim - 1) + [(padding, padding)])
+    # every channel moves by the same lag, which is searched for on their sum
+    mixed = padded if padded.ndim == 1 else padded.reshape(-1, padded.shape[-1]).sum(axis=0)
+    augmented = np.zeros(signal.shape[:-1] + ((n_frames + 1) * hop,), dtype=dtype)
+
+    start = padding - int(round(hop * rate))
+    for i in range(n_frames):
+        augmented[..., i * hop:i * hop + frame_length] += padded[..., start:start + frame_length] * window
+        # the next frame is taken from where it best continues the waveform this one would have continued with
+        continuation = mixed[start + hop:start + hop + frame_length]
+        nominal = padding + int(round(i * hop * rate))
+        region = mixed[nominal - tolerance:nominal + tolerance + frame_length]
+        start = nominal - tolerance + _best_lag(region, continuation, 2 * tolerance)
+
+    return augmented[..., hop:hop + n_samples]
+
+
+def pitch_shift(signal, sr, steps):
+    """
+    Pitch shift a signal by half-steps without changing its duration.
+
+    :param signal: 1-D ndarray, or 2-D with one row per channel
+    :param sr: sample rate, int
+    :param steps: half-steps to shift by, like librosa.effects.pitch_shift()
+    :return: the shifted signal, as long as the original
+    """
+    import scipy.signal
+
+    signal = np.asarray(signal)
+    # resampling by a ratio of small integers, within a few hundredths of a cent of the shift, keeps the filter short
+    ratio = Fraction(2 ** (-steps / 12)).limit_denominator(200)
+    stretched = time_stretch(signal, float(ratio), sr)
+    resampled = scipy.signal.resample_poly(stretched, ratio.numerator, ratio.denominator, axis=-1,
+                                           window=_kernel(ratio.numerator, ratio.denominator))
+    n_samples = signal.shape[-1]
+    augmented = np.zeros(signal.shape, dtype=float_dtype(signal.dtype))
+    augmented[..., :min(n_samples, resampled.shape[-1])] = resampled[..., :n_samples]
+    return augmented
+
+
+def _best_lag(region, frame, max_lag):
+    # the offset into region where it correlates best with frame. Lags are first searched on every _STRIDE-th sample, which is several times
+    # faster than correlating at every lag, and then refined around the best one.
+    coarse = _STRIDE * int(np.argmax(np.correlate(region[::_STRIDE], frame[::_STRIDE], mode='valid')))
+    low = max(coarse - _STRIDE, 0)
+    high = min(coarse + _STRIDE, max_lag)
+    return low + int(np.argmax(np.correlate(region[low:high + len(frame)], frame, mode='valid')))
+
+
+@functools.lru_cache(maxsize=64)
+def _kernel(up, down):
+    import scipy.signal
+
+    # the low-pass filter resample_poly() designs for these rates by default, designed once per pair of rates instead of on every call
+    max_rate = max(up, down)
+    return scipy.signal.firwin(20 * max_rate + 1, 1. / max_rate, window=('kaiser', 5.))
@@ -1,6 +1,8 @@
+from .batch import AugmentedBatch
 from .chain_base import ChainBase
 from .combinatoric import CombinatoricChain
 from .linear import LinearChain
 from .flat import FlatChain
+from .sampled import RandomChain
 
-__all__ = ['ChainBase', 'CombinatoricChain', 'LinearChain', 'FlatChain']
+__all__ = ['ChainBase', 'CombinatoricChain', 'LinearChain', 'FlatChain', 'AugmentedBatch', 'RandomChain']
@@ -0,0 +1,124 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class AugmentedBatch:
+    """
+    A list of augmented signals of different lengths, stored back to back in a single buffer. Chains created with return_batch=True return these
+    instead of lists. Augmentations return signals of their own, so a chain copies them into the buffer at the end, which costs one more copy of
+    every signal than returning a list, though the signals are freed one at a time as they're copied.
+
+    A batch can be indexed and iterated over like a list. Indexing returns a view into the buffer, and slicing returns another batch sharing it.
+    Pickling a batch pickles one array rather than one per signal, and to_shared_memory() hands it to another process without pickling the samples
+    at all.
+
+    Each signal has a provenance: the tuple of augmentations the chain applied to make it, in order, each as (step, name, params, output). step is
+    the index of the augmentation in the chain as it runs (see explain()), name and params are its class name and parameters, and output is which
+    of the signals it returned this one came from. The unaugmented signal has an empty provenance.
+
+    :param buffer: 1-D ndarray holding the samples of every signal, one after the other
+    :param offsets: ndarray of the index in buffer each signal starts at, followed by the index the last one ends at
+    :param shapes: shape of each signal, which is a 2-D block of signals for augmentations that return stacked blocks
+    :param provenance: provenance of each signal, or None if it isn't known
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, shapes, provenance=None):
+        self.buffer = buffer
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.provenance = provenance
+
+    @classmethod
+    def from_signals(cls, signals, provenance=None, consume: bool = False):
+        """
+        Copy signals into a new batch.
+
+        :param signals: list of ndarrays
+        :param provenance: provenance of each signal, or None
+        :param consume: whether to replace each signal in the list with None once it's copied, so that signals nothing else refers to are freed
+            one at a time while the batch fills up, rather than all being held until it's full
+        """
+        shapes = [np.shape(signal) for signal in signals]
+        offsets = np.zeros(len(signals) + 1, dtype=np.int64)
+        np.cumsum([int(np.prod(shape)) for shape in shapes], out=offsets[1:])
+        # the buffer's pages are only committed as they're written, so with consume, memory grows by about one signal at a time
+        buffer = np.empty(offsets[-1], dtype=np.result_type(*signals) if signals else np.float64)
+        for i, (shape, start, stop) in enumerate(zip(shapes, offsets[:-1], offsets[1:])):
+            buffer[start:stop].reshape(shape)[...] = signals[i]
+            if consume:
+                signals[i] = None
+        return cls(buffer, offsets, shapes, provenance)
+
+    @classmethod
+    def from_shared_memory(cls, handle, unlink: bool = True):
+        """
+        Copy a batch out of the shared memory block created by to_shared_memory().
+
+        :param handle: the handle to_shared_memory() returned
+        :param unlink: whether to free the block afterwards
+        """
+        name, dtype, offsets, shapes, provenance = handle
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            buffer = np.ndarray(offsets[-1], dtype=dtype, buffer=block.buf).copy()
+        finally:
+            block.close()
+            if unlink:
+                block.unlink()
+        return cls(buffer, offsets, shapes, provenance)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return AugmentedBatch.from_signals([self[j] for j in range(start, stop, step)],
+                                                   None if self.provenance is None else self.provenance[i])
+            stop = max(start, stop)
+            return AugmentedBatch(self.buffer[self.offsets[start]:self.offsets[stop]], self.offsets[start:stop + 1] - self.offsets[start],
+                                  self.shapes[start:stop], None if self.provenance is None else self.provenance[start:stop])
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('batch index out of range')
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].reshape(self.shapes[i])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self):
+        return '<AugmentedBatch of {0} signals, {1} samples of {2}>'.format(len(self), self.buffer.size, self.buffer.dtype)
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes
+
+    def to_list(self):
+        """
+        Return the signals as a list of views into the buffer.
+        """
+        return list(self)
+
+    def paths(self):
+        """
+        Return a short string for the provenance of each signal, which tells it apart from the other signals augmented from the same source: the
+        step and output of every augmentation applied, like '0.0/2.3', or just the position of the signal in the batch if the provenance isn't
+        known.
+        """
+        if self.provenance is None:
+            return [str(i) for i in range(len(self))]
+        return ['/'.join('{0}.{1}'.format(step, output) for step, _, _, output in applied) for applied in self.provenance]
+
+    def to_shared_memory(self):
+        """
+        Copy the batch into a new shared memory block, for another process to read with from_shared_memory() without pickling the samples.
+
+        :return: a handle to pass to from_shared_memory(), small and cheap to pickle
+        """
+        block = shared_memory.SharedMemory(create=True, size=max(self.buffer.nbytes, 1))
+        np.ndarray(self.buffer.shape, dtype=self.buffer.dtype, buffer=block.buf)[...] = self.buffer
+        block.close()
+        return block.name, self.buffer.dtype.str, self.offsets, self.shapes, self.provenance
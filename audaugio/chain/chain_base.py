@@ -1,17 +1,79 @@
+import asyncio
+import copy
+import os
+import threading
+import time
+from itertools import groupby
+
 import numpy as np
 
-from audaugio import AugmentationBase
+from audaugio.augmentation import AugmentationBase, AugmentationCache, CachedAugmentation
+from audaugio.augmentation.augmentation_base import FusedSoxAugmentation, SoxAugmentationBase, stack_channels
+from audaugio.augmentation.dtypes import as_float
+from audaugio.augmentation.spectral import SpectralSignal, as_signal, as_spectral
+from .batch import AugmentedBatch
+from .parallel import ProcessPool
+from .profiling import AugmentationCall, ChainProfile
 
 
 class ChainBase:
     """
     Base class for an augmentation chain. Implement this to define your own augmentation chains.
 
-    :param augmentations:
+    Signals that are augmented at the same step of a chain are independent of each other, so chains can spread them over a pool of worker processes
+    with n_jobs. Signals are passed to the workers through shared memory, and the augmentations are sent to each worker once. A chain that started a
+    pool should be closed when it is no longer needed, either with close() or by using it as a context manager.
+
+    In spectral mode, signals stay in the frequency domain, as SpectralSignals, between consecutive spectral augmentations like pitch shifting and
+    time stretching, and are only transformed back before other augmentations and at the end of the chain. Signals that several augmentations
+    start from, like the unaugmented signal in a combinatoric chain, are only transformed once. Spectral augmentations run in the calling process.
+
+    Chains can also be used from asyncio applications, like a service that augments audio on request, through acall(), aaugment_batch() and
+    aiter_augmented(). These run SoX as asyncio subprocesses and every other augmentation in an executor, so the event loop stays free while signals
+    are augmented.
+
+    In multichannel mode, signals have several channels, as 2-D arrays of shape (channels, samples), and blocks of them, like stacked windows, are
+    3-D. Augmentations that can (see AugmentationBase.multichannel) augment all of a signal's channels in one call; others are applied to each
+    channel, and what they return is stacked back into channels.
+
+    :param augmentations: an arbitrary amount of augmentations
+    :param n_jobs: number of worker processes to augment signals in. By default, everything runs in the calling process.
+    :param executor: an existing concurrent.futures executor to augment signals in, instead of starting a pool. Augmentations are sent along with
+        every task.
+    :param cache: an AugmentationCache to look up the results of deterministic augmentations in before running them. Can't be combined with
+        spectral mode, since signals between spectral augmentations are never whole signals that could be cached.
+    :param spectral: whether to run spectral augmentations in spectral mode
+    :param return_batch: whether to return the augmented signals as an AugmentedBatch, which records how each of them was made, instead of a list.
+        Signals are copied into the batch at the end, which costs one more copy of each of them.
+    :param dtype: the type to augment signals as. By default, signals keep their own type if it's float32 or float64, and are augmented as the
+        smallest floating point type that holds them otherwise (see audaugio.augmentation.dtypes). Augmentations that return another type than
+        they were given are converted back to it.
+    :param max_sox_processes: the most SoX processes the asynchronous methods run at once, across every signal the chain is augmenting. One per
+        CPU by default.
+    :param multichannel: whether signals have several channels. Can't be combined with spectral mode.
     """
 
-    def __init__(self, *augmentations: AugmentationBase):
+    def __init__(self, *augmentations: AugmentationBase, n_jobs: int = None, executor=None, cache: AugmentationCache = None, spectral: bool = False,
+                 return_batch: bool = False, dtype=None, max_sox_processes: int = None, multichannel: bool = False):
+        if spectral and multichannel:
+            raise ValueError("spectral mode only works for signals of a single channel")
+        if spectral and cache is not None:
+            raise ValueError("spectral mode can't be combined with a cache")
         self._augmentations = list(augmentations)
+        self.n_jobs = n_jobs
+        self.executor = executor
+        self.cache = cache
+        self.spectral = spectral
+        self.return_batch = return_batch
+        self.dtype = dtype
+        self.max_sox_processes = max_sox_processes
+        self.multichannel = multichannel
+        self._pool = None
+        self._compiled = None
+        self._hooks = []
+        self._sox_limit = None
+        # the asynchronous methods augment from several threads at once, which must agree on the compiled steps and share one pool
+        self._lock = threading.RLock()
 
     def __add__(self, new_augmentation: AugmentationBase):
         self._augmentations.append(new_augmentation)
@@ -19,5 +81,634 @@ class ChainBase:
     def __call__(self, audio: np.ndarray, sr: int):
         return self._apply_augmentations(audio, sr)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getstate__(self):
+        # worker pools, locks and semaphores belong to the process and event loop that made them
+        state = self.__dict__.copy()
+        state.update(_pool=None, _sox_limit=None, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def close(self):
+        """
+        Shut down the worker processes of the chain, if it started any.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def for_worker(self, worker: int):
+        """
+        Return a copy of the chain for a worker process to use, in which augmentations that draw random numbers draw from random streams of their
+        own (see AugmentationBase.for_worker()). Chains do this for their own worker processes; it's for running copies of a chain elsewhere.
+
+        :param worker: number of the worker process, counting from 0
+        """
+        chain = copy.copy(self)
+        chain._augmentations = [augmentation.for_worker(worker) for augmentation in self._augmentations]
+        chain._pool = None
+        chain._compiled = None
+        chain._hooks = list(self._hooks)
+        chain._sox_limit = None
+        return chain
+
+    def add_hook(self, hook):
+        """
+        Register a function to call every time the chain applies one of its augmentations. The function receives an AugmentationCall describing how
+        many signals were augmented and how long it took. Chains without hooks skip all of the bookkeeping.
+
+        :param hook: callable taking an AugmentationCall
+        :return: the hook, so that it can be removed later
+        """
+        self._hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def profile(self, file=None):
+        """
+        Profile the chain while the returned context manager is open, and print a summary table of every augmentation when it closes.
+
+        :param file: where to print the summary, stderr by default. Pass False to not print it.
+        :return: a ChainProfile, which can also be inspected directly
+        """
+        return ChainProfile(self, file)
+
+    def augment_batch(self, signals, sr: int):
+        """
+        Augment many signals at once. Each step of the chain is applied to every signal in the batch in a single call, which lets augmentations that
+        support it process the whole batch at once.
+
+        :param signals: unaugmented signals, either a list of ndarrays or an ndarray with one signal per row, which is 3-D in multichannel mode
+        :param sr: sample rate, int
+        :return: for each signal, the list of augmented signals calling the chain on it would return
+        """
+        return [self(signal, sr) for signal in signals]
+
+    def iter_augmented(self, audio: np.ndarray, sr: int):
+        """
+        Yield augmented signals one at a time instead of returning them all at once. Chains that can avoid holding every result in memory override
+        this.
+
+        :param audio: unaugmented signal, ndarray
+        :param sr: sample rate, int
+        """
+        yield from self(audio, sr)
+
+    async def acall(self, audio: np.ndarray, sr: int, executor=None):
+        """
+        Like calling the chain, but as a coroutine that leaves the event loop free while the signal is augmented, so that an asyncio application can
+        augment many signals concurrently. SoX runs as asyncio subprocesses, at most max_sox_processes at a time, and every other augmentation runs
+        in an executor, from which chains with worker processes still hand it on to them.
+
+        :param audio: unaugmented signal, ndarray
+        :param sr: sample rate, int
+        :param executor: the concurrent.futures executor to run augmentations other than SoX in, the event loop's default one by default. In spectral
+            mode, signals are also transformed back from the frequency domain in it, which takes a thread pool.
+        """
+        return (await self.aaugment_batch([audio], sr, executor))[0]
+
+    async def aaugment_batch(self, signals, sr: int, executor=None):
+        """
+        Like augment_batch(), but as a coroutine, see acall().
+
+        :param signals: unaugmented signals, either a list of ndarrays or a 2-D ndarray with one signal per row
+        :param sr: sample rate, int
+        :param executor: the concurrent.futures executor to run augmentations other than SoX in, the event loop's default one by default
+        """
+        plan = self._plan_all(signals, sr)
+        if plan is None:
+            return await asyncio.get_running_loop().run_in_executor(executor, self.augment_batch, signals, sr)
+        return self._results(*await self._arun_plan(plan, sr, executor))
+
+    async def aiter_augmented(self, audio: np.ndarray, sr: int, executor=None, **kwargs):
+        """
+        Like iter_augmented(), but as an asynchronous generator, for use with async for; see acall(). Takes the same options as the chain's
+        iter_augmented().
+
+        :param audio: unaugmented signal, ndarray
+        :param sr: sample rate, int
+        :param executor: the concurrent.futures executor to run augmentations other than SoX in, the event loop's default one by default
+        """
+        plan = self._plan_iter(audio, sr, **kwargs)
+        if plan is None:
+            for signal in await self.acall(audio, sr, executor):
+                yield signal
+            return
+
+        async for signal in self._aiter_plan(plan, sr, executor):
+            if isinstance(signal, SpectralSignal):
+                signal = await asyncio.get_running_loop().run_in_executor(executor, as_signal, signal)
+            yield signal
+
+    def stream(self, blocks, sr: int):
+        """
+        Augment a signal that arrives as consecutive blocks, like the blocks of a long recording read with soundfile.blocks(), without ever holding
+        all of it in memory.
+
+        Augmentations are applied to the stream up to the first one that splits it into separate signals, like windowing; filters carry their
+        state from one block to the next, so their output is the same as for the whole signal, and background noise is added block by block.
+        Windows that span several blocks are returned once their last block has arrived, and the rest of the chain is applied to each of them as
+        usual. Augmentations that need the whole signal, like pitch shifting, can only come after windowing; otherwise this raises a ValueError.
+
+        :param blocks: iterable of consecutive blocks of the unaugmented signal, 1-D ndarrays
+        :param sr: sample rate, int
+        :return: generator yielding a list of augmented signals per block, followed by one more list if the stream ends with a padded window. Without
+            windowing, the i-th element of every list is the next block of the i-th augmented signal.
+        """
+        raise NotImplementedError
+
+    def write(self, writer, audio: np.ndarray, sr: int, source: str):
+        """
+        Augment a signal and append the augmented signals to a store instead of returning them, each under the path of augmentations that made it
+        (see ShardWriter.extend()).
+
+        :param writer: a ShardWriter
+        :param audio: unaugmented signal, ndarray
+        :param sr: sample rate, int
+        :param source: what to record the signals as augmented from, like the path of the original file
+        """
+        augmented_audio, provenance = self._augment_all([audio], sr)
+        writer.extend(AugmentedBatch.from_signals(augmented_audio[0], provenance[0], consume=True), sr, source, self.multichannel)
+
     def _apply_augmentations(self, audio, sr):
         raise NotImplementedError
+
+    def _augment_all(self, signals, sr):
+        """
+        Like augment_batch(), but always returning lists of signals, along with the provenance of every signal (see AugmentedBatch), or None for
+        chains that don't keep track of it.
+
+        :return: (augmented signals, provenance), each with one list per signal
+        """
+        plan = self._plan_all(signals, sr)
+        if plan is None:
+            return [list(self(signal, sr)) for signal in signals], [None] * len(signals)
+        return _returned(self._run_plan(plan, sr))
+
+    def _plan_all(self, signals, sr):
+        """
+        Return a plan for _augment_all(), or None for chains that don't have one.
+
+        A plan is a generator that yields _Tasks whenever it needs augmentations applied, is sent back what _augment_each() returns for them, and
+        finally returns its result. Plans leave applying augmentations to whoever runs them, so that the same plan runs both in the calling thread,
+        with _run_plan(), and on an event loop, with _arun_plan().
+        """
+        return None
+
+    def _plan_iter(self, audio, sr, **kwargs):
+        """
+        Return a plan for iter_augmented() (see _plan_all()), which yields augmented signals as well as _Tasks, or None for chains that don't have
+        one.
+        """
+        return None
+
+    def _augment_one(self, index, signal, sr):
+        # a plan yielding what step index returns for a signal
+        outputs = yield _Tasks([(index, self._prepare(index, signal, sr))])
+        yield from outputs[0]
+
+    def _run_plan(self, plan, sr):
+        """
+        Run a plan, applying the augmentations it asks for with _augment_each(). Yields whatever else the plan yields and returns what it returns.
+        """
+        outputs = None
+        while True:
+            try:
+                request = plan.send(outputs)
+            except StopIteration as stop:
+                return stop.value
+            if isinstance(request, _Tasks):
+                outputs = self._augment_each(request, sr)
+            else:
+                outputs = None
+                yield request
+
+    async def _arun_plan(self, plan, sr, executor):
+        # like _run_plan(), but awaiting the augmentations, for plans that only return something
+        outputs = None
+        while True:
+            done, request = await self._aresume(plan, outputs, executor)
+            if done:
+                return request
+            outputs = await self._augment_each_async(request, sr, executor)
+
+    async def _aiter_plan(self, plan, sr, executor):
+        # like _run_plan(), but awaiting the augmentations, for plans that yield signals
+        outputs = None
+        while True:
+            done, request = await self._aresume(plan, outputs, executor)
+            if done:
+                return
+            if isinstance(request, _Tasks):
+                outputs = await self._augment_each_async(request, sr, executor)
+            else:
+                outputs = None
+                yield request
+
+    async def _aresume(self, plan, outputs, executor):
+        # in spectral mode, plans transform signals back from the frequency domain between requests, which is too slow for the event loop
+        if self.spectral:
+            return await asyncio.get_running_loop().run_in_executor(executor, _resume, plan, outputs)
+        return _resume(plan, outputs)
+
+    def _results(self, augmented_audio, provenance):
+        # what augment_batch() returns, given what _augment_all() did
+        if self.return_batch:
+            return [AugmentedBatch.from_signals(batch, applied, consume=True) for batch, applied in zip(augmented_audio, provenance)]
+        return augmented_audio
+
+    def _stream_levels(self, blocks, sr, keep_unaugmented):
+        """
+        Implementation of stream() for chains that apply each augmentation to the output of the previous one, using _plan_levels() for the part
+        of the chain after the stream is split into signals.
+
+        :param keep_unaugmented: whether non-replacing augmentations keep the stream they augment alongside their own output
+        """
+        steps = self._steps()
+        # every streamer is created up front, so that augmentations that can't be streamed fail before any block is read
+        streamed = []
+        for step in steps:
+            streamed.append(step.streamer(sr))
+            if streamed[-1].emits_signals:
+                break
+        splits = bool(streamed) and streamed[-1].emits_signals
+        if splits and keep_unaugmented and not steps[len(streamed) - 1].replaces:
+            raise ValueError("{0} can only be streamed if it replaces the audio it augments".format(steps[len(streamed) - 1]))
+
+        # each augmented stream needs its own state in every later augmentation, so streamers are kept per (step, stream). Streams are told apart
+        # by the outputs of earlier augmentations they came from, which only needs recording where one stream becomes several.
+        streamers = {(index, ()): streamer for index, streamer in enumerate(streamed)}
+        paths = [()]
+        for block in map(self._as_float, blocks):
+            streams = [((), block)]
+            signals = []
+            for index, step in enumerate(steps[:len(streamed)]):
+                keeps = keep_unaugmented and not step.replaces
+                augmented = []
+                paths = []
+                for path, stream in streams:
+                    if (index, path) not in streamers:
+                        streamers[index, path] = step.streamer(sr)
+                    paths.append(path)
+                    outputs = streamers[index, path].push(stream)
+                    if splits and index == len(streamed) - 1:
+                        signals += outputs
+                    elif len(outputs) == 1 and not keeps:
+                        augmented.append((path, outputs[0]))
+                    else:
+                        augmented += [(path + ((index, i),), output) for i, output in enumerate(outputs)]
+                streams = streams + augmented if keeps else augmented
+
+            if splits:
+                yield _returned(self._run_plan(self._plan_levels(len(streamed), [signals], sr), sr))[0][0]
+            else:
+                yield [stream for _, stream in streams]
+
+        if splits:
+            # the streams windowing was applied to in the last block are all the streams there are
+            signals = [signal for path in paths for signal in streamers[len(streamed) - 1, path].finish()]
+            if signals:
+                yield _returned(self._run_plan(self._plan_levels(len(streamed), [signals], sr), sr))[0][0]
+
+    def _plan_levels(self, start, augmented_audio, sr):
+        """
+        Return a plan (see _plan_all()) that applies _steps()[start:] to batches of signals the way the chain applies them.
+
+        :return: the plan, which returns (augmented batches, provenance of each signal in them, counting from step start)
+        """
+        raise NotImplementedError
+
+    def _regroup(self, index, augmented_audio, provenance, augmented, keep_unaugmented):
+        """
+        Regroup what step index returned for every signal of every batch by the batch it came from, recording the step in the provenance of each
+        new signal.
+
+        :param augmented: for every signal of every batch, in order, the list of signals step index returned
+        :param keep_unaugmented: whether to keep the signals the step was applied to, ahead of its outputs
+        :return: (augmented batches, provenance)
+        """
+        step = self._steps()[index]
+        while isinstance(step, (CachedAugmentation, _Channels)):
+            step = step.augmentation
+        name, params = type(step).__name__, step.params()
+        augmented = iter(augmented)
+        regrouped_audio = []
+        regrouped_provenance = []
+        for batch, applied in zip(augmented_audio, provenance):
+            new_batch = list(batch) if keep_unaugmented else []
+            new_applied = list(applied) if keep_unaugmented else []
+            for previous in applied:
+                outputs = next(augmented)
+                new_batch += outputs
+                new_applied += [previous + ((index, name, params, i),) for i in range(len(outputs))]
+            regrouped_audio.append(new_batch)
+            regrouped_provenance.append(new_applied)
+        return regrouped_audio, regrouped_provenance
+
+    def _augment_each(self, tasks, sr):
+        """
+        Apply compiled augmentations to signals, in worker processes if the chain has any.
+
+        :param tasks: list of (index into _steps(), signal) pairs
+        :param sr: sample rate, int
+        :return: for each task, the list of signals the augmentation returned
+        """
+        if not self._hooks:
+            augmented = self._run(tasks, sr)
+        else:
+            augmented = []
+            for index, group in groupby(tasks, key=lambda task: task[0]):
+                augmented += self._run_with_hooks(index, list(group), sr)
+        return [[_like(a, signal) for a in outputs] for (_, signal), outputs in zip(tasks, augmented)]
+
+    async def _augment_each_async(self, tasks, sr, executor):
+        """
+        Like _augment_each(), but as a coroutine. SoX augmentations run as asyncio subprocesses, at most max_sox_processes of them at once, and the
+        other augmentations run in the executor.
+        """
+        loop = asyncio.get_running_loop()
+        runs = []
+        for index, group in groupby(tasks, key=lambda task: task[0]):
+            group = list(group)
+            if _runs_sox(self._steps()[index]):
+                runs.append(self._augment_sox_async(index, group, sr, executor))
+            else:
+                runs.append(loop.run_in_executor(executor, self._augment_each, group, sr))
+        return [outputs for augmented in await asyncio.gather(*runs) for outputs in augmented]
+
+    async def _augment_sox_async(self, index, tasks, sr, executor):
+        augmentation = self._steps()[index]
+        limit = self._sox_semaphore()
+        started = self._start_call(index)
+        augmented = await asyncio.gather(*[self._augment_async(augmentation, signal, sr, executor, limit) for _, signal in tasks])
+        if self._hooks:
+            self._end_call(index, tasks, augmented, started)
+        return [[_like(a, signal) for a in outputs] for (_, signal), outputs in zip(tasks, augmented)]
+
+    def _sox_semaphore(self):
+        # asyncio semaphores belong to the event loop they're used in, so the chain makes a new one whenever it runs in another loop
+        loop = asyncio.get_running_loop()
+        if self._sox_limit is None or self._sox_limit[0] is not loop:
+            self._sox_limit = loop, asyncio.Semaphore(self.max_sox_processes or os.cpu_count() or 1)
+        return self._sox_limit[1]
+
+    def _as_float(self, signal):
+        # the type the chain augments a signal as, see dtype
+        return as_float(signal, self.dtype)
+
+    def _run_with_hooks(self, index, tasks, sr):
+        started = self._start_call(index)
+        augmented = self._run(tasks, sr)
+        self._end_call(index, tasks, augmented, started)
+        return augmented
+
+    def _start_call(self, index):
+        # what _end_call() measures a call of step index from
+        augmentation = self._steps()[index]
+        return getattr(augmentation, '_sox_seconds', 0.), getattr(augmentation, '_io_seconds', 0.), time.perf_counter(), time.process_time()
+
+    def _end_call(self, index, tasks, augmented, started):
+        # reports a call of step index to the hooks
+        augmentation = self._steps()[index]
+        sox_seconds, io_seconds, wall, cpu = started
+        call = AugmentationCall(augmentation,
+                                n_calls=len(tasks),
+                                wall_time=time.perf_counter() - wall,
+                                cpu_time=time.process_time() - cpu,
+                                input_samples=sum(np.size(signal) for _, signal in tasks),
+                                output_samples=sum(np.size(a) for outputs in augmented for a in outputs),
+                                # outputs that are views of their input, like windows, didn't allocate anything
+                                allocated_bytes=sum(a.nbytes for (_, signal), outputs in zip(tasks, augmented) for a in outputs
+                                                    if not np.may_share_memory(a, signal)),
+                                sox_time=getattr(augmentation, '_sox_seconds', 0.) - sox_seconds,
+                                io_time=getattr(augmentation, '_io_seconds', 0.) - io_seconds)
+        for hook in self._hooks:
+            hook(call)
+
+    def _prepare(self, index, signal, sr):
+        """
+        Return a signal in the form step index of the chain takes it: a SpectralSignal for spectral augmentations in spectral mode, an ndarray
+        otherwise.
+        """
+        if not self.spectral:
+            return signal
+        if self._steps()[index].spectral:
+            return as_spectral(signal, sr)
+        return as_signal(signal)
+
+    def _run(self, tasks, sr):
+        steps = self._steps()
+        # SpectralSignals can't be passed through shared memory
+        local = self.spectral and any(isinstance(signal, SpectralSignal) for _, signal in tasks)
+        if (self.n_jobs is None and self.executor is None) or len(tasks) < 2 or local:
+            augmented = []
+            for index, group in groupby(tasks, key=lambda task: task[0]):
+                augmented += self._augment_batch(steps[index], [signal for _, signal in group], sr)
+            return augmented
+
+        with self._lock:
+            if self._pool is None or self._pool.augmentations is not steps:
+                self.close()
+                self._pool = ProcessPool(steps, self.n_jobs, self.executor)
+            pool = self._pool
+        return pool.map(tasks, sr)
+
+    def _steps(self):
+        # compiling is cached so that worker processes and the calling process agree on what each step is
+        with self._lock:
+            key = tuple(id(augmentation) for augmentation in self._augmentations)
+            if self._compiled is None or self._compiled[0] != key:
+                steps = self._compile()
+                if self.cache is not None:
+                    steps = [CachedAugmentation(step, self.cache) if step.deterministic else step for step in steps]
+                if self.multichannel:
+                    steps = [_Channels(step) for step in steps]
+                self._compiled = key, steps
+            return self._compiled[1]
+
+    @staticmethod
+    def _augment(augmentation, signal, sr):
+        """
+        Apply an augmentation to a signal, or to each row of a 2-D block of signals if the augmentation can't take the block as a whole. Rows that
+        still line up afterwards are stacked back into a block.
+        """
+        if np.ndim(signal) < 2 or augmentation.accepts_stacked:
+            return augmentation.augment(signal, sr)
+
+        return _stacked([augmentation.augment(row, sr) for row in signal])
+
+    @staticmethod
+    async def _augment_async(augmentation, signal, sr, executor, sox_limit):
+        # like _augment(), but with augment_async()
+        if np.ndim(signal) < 2 or augmentation.accepts_stacked:
+            return await augmentation.augment_async(signal, sr, executor, sox_limit)
+        return _stacked(await asyncio.gather(*[augmentation.augment_async(row, sr, executor, sox_limit) for row in signal]))
+
+    @classmethod
+    def _augment_batch(cls, augmentation, signals, sr):
+        if any(isinstance(signal, SpectralSignal) for signal in signals):
+            return [augmentation.augment_spectral(signal) if isinstance(signal, SpectralSignal) else cls._augment(augmentation, signal, sr)
+                    for signal in signals]
+        # blocks of signals the augmentation can't take as a whole have to be split into rows, one signal at a time
+        if len(signals) == 1 or not augmentation.accepts_stacked and any(np.ndim(signal) > 1 for signal in signals):
+            return [cls._augment(augmentation, signal, sr) for signal in signals]
+        return augmentation.augment_batch(signals, sr)
+
+    def _compile(self):
+        """
+        Return the augmentations this chain actually runs. Chains override this to merge augmentations that can be run together without changing
+        the result.
+        """
+        return self._augmentations
+
+
+class _Tasks(list):
+    """
+    What plans yield to have augmentations applied (see ChainBase._plan_all()): a list of (index into _steps(), signal) pairs.
+    """
+
+
+def _resume(plan, outputs):
+    # sends a plan what it asked for, returning (whether it's done, its next request or its result)
+    try:
+        return False, plan.send(outputs)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def _returned(generator):
+    # runs a generator that yields nothing to the end, returning what it returns
+    try:
+        while True:
+            next(generator)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _runs_sox(augmentation):
+    if isinstance(augmentation, _Channels) and augmentation.augmentation.multichannel:
+        augmentation = augmentation.augmentation
+    return isinstance(augmentation, SoxAugmentationBase) and augmentation.backend in SoxAugmentationBase.backends
+
+
+def _stacked(rows):
+    # the outputs of an augmentation applied to each row of a block, stacked back into a block if they still line up
+    if all(len(row) == 1 for row in rows) and len({row[0].shape for row in rows}) == 1:
+        return [np.stack([row[0] for row in rows])]
+    return [augmented for row in rows for augmented in row]
+
+
+class _Channels(AugmentationBase):
+    """
+    What a chain in multichannel mode runs in place of each of its augmentations. Signals of shape (channels, samples), and blocks of them of shape
+    (signals, channels, samples), are passed on as they are to augmentations that take them (see AugmentationBase.multichannel), and split for the
+    others: blocks into signals and signals into channels.
+
+    :param augmentation: the augmentation to apply
+    """
+
+    accepts_stacked = True
+    multichannel = True
+
+    def __init__(self, augmentation: AugmentationBase):
+        super().__init__(augmentation.replaces)
+        self.augmentation = augmentation
+
+    def __repr__(self):
+        return repr(self.augmentation)
+
+    @property
+    def commutes(self):
+        return self.augmentation.commutes
+
+    @property
+    def cost_per_sample(self):
+        return self.augmentation.cost_per_sample
+
+    @property
+    def deterministic(self):
+        return self.augmentation.deterministic
+
+    def params(self):
+        return self.augmentation.params()
+
+    def output_shape(self, n_samples, sr):
+        return self.augmentation.output_shape(n_samples, sr)
+
+    def augment(self, signal, sr):
+        augmentation = self.augmentation
+        if np.ndim(signal) < 2 or self._whole(signal):
+            return augmentation.augment(signal, sr)
+        if np.ndim(signal) > 2:
+            return _stacked([self.augment(one, sr) for one in signal])
+        # augmentations that take stacked blocks augment the channels as rows of one
+        if augmentation.accepts_stacked:
+            return augmentation.augment(signal, sr)
+        return stack_channels([augmentation.augment(channel, sr) for channel in signal])
+
+    async def augment_async(self, signal, sr, executor=None, sox_limit=None):
+        if np.ndim(signal) == 2 and self._whole(signal):
+            return await self.augmentation.augment_async(signal, sr, executor, sox_limit)
+        if np.ndim(signal) > 2 and not self._whole(signal):
+            return _stacked(await asyncio.gather(*[self.augment_async(one, sr, executor, sox_limit) for one in signal]))
+        return await super().augment_async(signal, sr, executor)
+
+    def streamer(self, sr):
+        if not self.augmentation.multichannel:
+            raise ValueError("{0} can't be applied to a stream of several channels".format(type(self.augmentation).__name__))
+        return self.augmentation.streamer(sr)
+
+    def for_worker(self, worker):
+        return _Channels(self.augmentation.for_worker(worker))
+
+    def _whole(self, signal):
+        # whether the augmentation takes a signal, or a block of them, as it is
+        return self.augmentation.multichannel and (np.ndim(signal) == 2 or self.augmentation.accepts_stacked)
+
+
+def _like(augmented, signal):
+    # augmented, converted to the type of the signal it was augmented from if it's another one
+    if isinstance(augmented, np.ndarray) and isinstance(signal, np.ndarray) and augmented.dtype != signal.dtype:
+        return augmented.astype(signal.dtype)
+    return augmented
+
+
+def fuse_sox(augmentations, replacing_only=False):
+    """
+    Merge runs of adjacent SoX augmentations into single augmentations that run all of their effects in one SoX process.
+
+    :param augmentations: list of augmentations
+    :param replacing_only: only merge augmentations that replace the audio they augment
+    """
+    def fusable(augmentation):
+        return (isinstance(augmentation, SoxAugmentationBase) and augmentation.backend in SoxAugmentationBase.backends and
+                (augmentation.replaces or not replacing_only))
+
+    fused = []
+    run = []
+    for augmentation in augmentations + [None]:
+        if augmentation is not None and fusable(augmentation):
+            run.append(augmentation)
+            continue
+
+        if len(run) == 1:
+            fused.append(run[0])
+        elif len(run) > 1:
+            fused.append(FusedSoxAugmentation(*run))
+        run = []
+
+        if augmentation is not None:
+            fused.append(augmentation)
+
+    return fused
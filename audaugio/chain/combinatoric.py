@@ -1,5 +1,11 @@
-from audaugio import AugmentationBase
-from .chain_base import ChainBase
+import time
+
+import numpy as np
+
+from audaugio.augmentation import AugmentationBase
+from audaugio.augmentation.cache import CachedAugmentation
+from audaugio.augmentation.spectral import as_signal
+from .chain_base import ChainBase, _Channels, _Tasks, fuse_sox
 
 
 class CombinatoricChain(ChainBase):
@@ -8,23 +14,210 @@ class CombinatoricChain(ChainBase):
     augmentation is performed, both the resulting augmented signal and the original signal are kept and augmented further). Note that some augmentations,
     like the windowing augmentation, always replace the audio they augment.
 
+    The i-th non-replacing augmentation runs on 2^i signals, so the order of the augmentations decides how much work the chain does. With
+    reorder=True, runs of adjacent commuting augmentations (see AugmentationBase.commutes) are reordered so that the most expensive ones run first,
+    on the fewest signals. This produces the same set of augmented signals, in a different order. Other augmentations, including every replacing
+    one, stay where they are and act as barriers. The order is planned for the sample rate and length of the signals the chain is called on, and
+    only changes when they change it. explain() shows the resulting plan.
+
     :param augmentations: an arbitrary amount of augmentations
+    :param reorder: whether to reorder commuting augmentations to do less work
+    :param kwargs: execution options, see ChainBase
     """
 
-    def __init__(self, *augmentations: AugmentationBase):
-        super().__init__(*augmentations)
+    def __init__(self, *augmentations: AugmentationBase, reorder: bool = False, **kwargs):
+        super().__init__(*augmentations, **kwargs)
+        self.reorder = reorder
+        self._measured_costs = {}
+        # (n_samples, sr) of the signals the order is planned for, one second at 22050 Hz until the chain sees any
+        self._plan_shape = (22050, 22050)
 
     def _apply_augmentations(self, signal: [], sr: int):
+        return self.augment_batch([signal], sr)[0]
+
+    def augment_batch(self, signals, sr: int):
+        return self._results(*self._augment_all(signals, sr))
+
+    def stream(self, blocks, sr: int):
+        return self._stream_levels(blocks, sr, keep_unaugmented=True)
+
+    def _plan_all(self, signals, sr):
+        if len(signals):
+            self._plan_for(int(np.mean([np.shape(signal)[-1] for signal in signals])), sr)
         # start with just the original audio and then apply all augmentations
-        augmented_audio = [signal]
+        return self._plan_levels(0, [[self._as_float(signal)] for signal in signals], sr)
+
+    def _plan_levels(self, start, augmented_audio, sr):
+        provenance = [[()] * len(batch) for batch in augmented_audio]
+        for index, augmentation in enumerate(self._steps()[start:], start):
+            augmented_audio = [[self._prepare(index, signal, sr) for signal in batch] for batch in augmented_audio]
+            # every signal of every batch is augmented in one go, then the results are regrouped by the batch they came from. Replacing
+            # augmentations, like windowing, replace the original audio with their output; others, like time stretching, keep it as well.
+            augmented = yield _Tasks((index, signal) for batch in augmented_audio for signal in batch)
+            augmented_audio, provenance = self._regroup(index, augmented_audio, provenance, augmented, keep_unaugmented=not augmentation.replaces)
+
+        return [[as_signal(signal) for signal in batch] for batch in augmented_audio], provenance
+
+    def iter_augmented(self, signal, sr: int, order: str = 'depth'):
+        """
+        Yield augmented signals one at a time as they are produced.
+
+        With order='depth', the combinations are walked depth first, so only one signal per augmentation in the chain is held in memory at a time
+        instead of all of them. With order='breadth', signals come out in the same order as calling the chain; memory stays just as low, but
+        non-replacing augmentations are re-run for every later augmentation that needs their output, which costs roughly n / 2 times as many
+        augmentation calls for a chain of n augmentations.
+
+        :param signal: unaugmented signal, ndarray
+        :param sr: sample rate, int
+        :param order: either 'depth' or 'breadth'
+        """
+        return map(as_signal, self._run_plan(self._plan_iter(signal, sr, order), sr))
+
+    def _plan_iter(self, signal, sr, order='depth'):
+        self._plan_for(np.shape(signal)[-1], sr)
+        augmentations = self._steps()
+        signal = self._as_float(signal)
+        if order == 'depth':
+            return self._iter_depth_first(augmentations, 0, signal, sr)
+        elif order == 'breadth':
+            return self._iter_breadth_first(augmentations, len(augmentations), signal, sr)
+        raise ValueError("order must be 'depth' or 'breadth', not {0}".format(order))
+
+    def _iter_depth_first(self, augmentations, start, signal, sr):
+        # yields every combination of augmentations[start:] applied to signal
+        if start == len(augmentations):
+            yield signal
+            return
+
+        signal = self._prepare(start, signal, sr)
+        if not augmentations[start].replaces:
+            yield from self._iter_depth_first(augmentations, start + 1, signal, sr)
+        for augmented in (yield _Tasks([(start, signal)]))[0]:
+            yield from self._iter_depth_first(augmentations, start + 1, augmented, sr)
+
+    def _iter_breadth_first(self, augmentations, stop, signal, sr):
+        # yields every combination of augmentations[:stop] applied to signal, in the order _apply_augmentations returns them
+        if stop == 0:
+            yield signal
+            return
+
+        if not augmentations[stop - 1].replaces:
+            yield from self._iter_breadth_first(augmentations, stop - 1, signal, sr)
+        previous = self._iter_breadth_first(augmentations, stop - 1, signal, sr)
+        yield from _flat_map(previous, lambda signal: self._augment_one(stop - 1, signal, sr))
+
+    def measure_costs(self, sr: int = 22050, seconds: float = 1.):
+        """
+        Time each augmentation on a probe signal of white noise, and plan with the measured costs instead of the declared cost_per_sample.
+
+        :param sr: sample rate of the probe, int
+        :param seconds: length of the probe in seconds
+        """
+        probe = np.random.normal(0, .1, int(sr * seconds))
         for augmentation in self._augmentations:
-            augmented_audio_batch = []
-            for signal in augmented_audio:
-                augmented_audio_batch += augmentation.augment(signal, sr)
+            start = time.perf_counter()
+            augmentation.augment(probe, sr)
+            self._measured_costs[id(augmentation)] = (time.perf_counter() - start) / len(probe)
+        self._compiled = None
+
+    def explain(self, n_samples: int = None, sr: int = 22050):
+        """
+        Describe the order the chain applies its augmentations in, and predict how many times each one is called for a single input signal.
+
+        :param n_samples: length of the input signal in samples, one second by default. Only matters for augmentations whose output depends on it,
+            like windowing.
+        :param sr: sample rate, int
+        :return: a table, as a string
+        """
+        n_samples = sr if n_samples is None else n_samples
+        self._plan_for(n_samples, sr)
+        # signals are tracked as {length: count}, since augmentations like time stretching change the length of what later ones work on
+        signals = {n_samples: 1}
+        lines = ['{0:>4}  {1:<60}  {2:>8}  {3:>14}'.format('step', 'augmentation', 'calls', 'cost')]
+        total_calls = 0
+        total_cost = 0.
+        for index, augmentation in enumerate(self._steps()):
+            calls = sum(signals.values())
+            cost = sum(count * length for length, count in signals.items()) * self._cost(augmentation)
+            total_calls += calls
+            total_cost += cost
+            lines.append('{0:>4}  {1:<60}  {2:>8}  {3:>14.6g}'.format(index, repr(augmentation)[:60], calls, cost))
+
+            augmented = {}
+            for length, count in signals.items():
+                n_outputs, output_length = augmentation.output_shape(length, sr)
+                augmented[output_length] = augmented.get(output_length, 0) + count * n_outputs
+            if not augmentation.replaces:
+                for length, count in signals.items():
+                    augmented[length] = augmented.get(length, 0) + count
+            signals = augmented
+
+        lines.append('{0} augmentation calls, {1:.6g} total cost, {2} augmented signals'.format(total_calls, total_cost, sum(signals.values())))
+        return '\n'.join(lines)
+
+    def _compile(self):
+        # the unaugmented signal has to be kept around between non-replacing augmentations, so only replacing ones can be merged
+        return fuse_sox(self._plan(), replacing_only=True)
+
+    def _plan_for(self, n_samples, sr):
+        # recompiles the chain if signals of this shape call for another order, which also restarts its worker processes, so it's only done then
+        if not self.reorder:
+            return
+        with self._lock:
+            if self._plan(n_samples, sr) != self._plan(*self._plan_shape):
+                self._compiled = None
+            self._plan_shape = n_samples, sr
+
+    def _plan(self, n_samples=None, sr=None):
+        if not self.reorder:
+            return list(self._augmentations)
+        if n_samples is None:
+            n_samples, sr = self._plan_shape
 
-            if augmentation.replaces:  # e.g. windowing augmentation, which replaces the original audio with windowed versions
-                augmented_audio = augmented_audio_batch
-            else:  # e.g. time stretching augmentation
-                augmented_audio += augmented_audio_batch
+        planned = []
+        run = []
+        for augmentation in self._augmentations + [None]:
+            if augmentation is not None and augmentation.commutes and not augmentation.replaces:
+                run.append(augmentation)
+                continue
 
-        return augmented_audio
+            # an augmentation that returns n signals of r times the length multiplies the work of everything after it by n * r + 1, so cost is
+            # weighed against that
+            planned += sorted(run, key=lambda a: self._cost(a) / _growth(a, n_samples, sr), reverse=True)
+            run = []
+            if augmentation is not None:
+                planned.append(augmentation)
+
+        return planned
+
+    def _cost(self, augmentation):
+        # steps are the augmentations themselves, or wrap them to cache their results or augment every channel
+        while isinstance(augmentation, (CachedAugmentation, _Channels)):
+            augmentation = augmentation.augmentation
+        if self._measured_costs:
+            return self._measured_costs.get(id(augmentation), augmentation.cost_per_sample)
+        return augmentation.cost_per_sample
+
+
+def _growth(augmentation, n_samples, sr):
+    # the number of samples an augmentation returns per sample it's given
+    n_outputs, output_length = augmentation.output_shape(n_samples, sr)
+    return n_outputs * output_length / n_samples
+
+
+def _flat_map(plan, function):
+    """
+    Return a plan (see ChainBase._plan_all()) that runs function(signal), itself a plan, for every signal the given plan yields, and yields what it
+    yields. Requests of both plans are passed on to whoever runs the returned one.
+    """
+    outputs = None
+    while True:
+        try:
+            request = plan.send(outputs)
+        except StopIteration:
+            return
+        if isinstance(request, _Tasks):
+            outputs = yield request
+        else:
+            outputs = None
+            yield from function(request)
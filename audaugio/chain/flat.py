@@ -1,5 +1,6 @@
-from audaugio import AugmentationBase
-from .chain_base import ChainBase
+from audaugio.augmentation import AugmentationBase
+from audaugio.augmentation.spectral import as_signal, as_spectral
+from .chain_base import ChainBase, _Tasks
 
 
 class FlatChain(ChainBase):
@@ -8,14 +9,51 @@ class FlatChain(ChainBase):
     augmentations.
 
     :param augmentations: an arbitrary amount of augmentations
+    :param kwargs: execution options, see ChainBase
     """
 
-    def __init__(self, *augmentations: AugmentationBase):
-        super().__init__(*augmentations)
+    def __init__(self, *augmentations: AugmentationBase, **kwargs):
+        super().__init__(*augmentations, **kwargs)
 
     def _apply_augmentations(self, signal: [], sr: int):
-        augmented_audio = []
-        for augmentation in self._augmentations:
-            augmented_audio += augmentation.augment(signal, sr)
+        return self.augment_batch([signal], sr)[0]
 
-        return augmented_audio
+    def augment_batch(self, signals, sr: int):
+        return self._results(*self._augment_all(signals, sr))
+
+    def _plan_all(self, signals, sr):
+        signals = [self._as_float(signal) for signal in signals]
+        if self.spectral:
+            # every spectral augmentation starts from the same STFT of each signal
+            signals = [as_spectral(signal, sr) for signal in signals]
+        augmented_audio = [[] for _ in signals]
+        provenance = [[] for _ in signals]
+        tasks = [(index, self._prepare(index, signal, sr)) for index in range(len(self._steps())) for signal in signals]
+        augmented = yield _Tasks(tasks)
+        for index in range(len(self._steps())):
+            outputs = augmented[index * len(signals):(index + 1) * len(signals)]
+            step_audio, step_provenance = self._regroup(index, [[signal] for signal in signals], [[()] for _ in signals], outputs, False)
+            for batch, applied, step_batch, step_applied in zip(augmented_audio, provenance, step_audio, step_provenance):
+                batch += map(as_signal, step_batch)
+                applied += step_applied
+
+        return augmented_audio, provenance
+
+    def iter_augmented(self, signal, sr: int):
+        return map(as_signal, self._run_plan(self._plan_iter(signal, sr), sr))
+
+    def _plan_iter(self, signal, sr):
+        signal = self._as_float(signal)
+        if self.spectral:
+            signal = as_spectral(signal, sr)
+        for index in range(len(self._steps())):
+            yield from self._augment_one(index, signal, sr)
+
+    def stream(self, blocks, sr: int):
+        streamers = [step.streamer(sr) for step in self._steps()]
+        for block in map(self._as_float, blocks):
+            yield [augmented for streamer in streamers for augmented in streamer.push(block)]
+
+        signals = [signal for streamer in streamers for signal in streamer.finish()]
+        if signals:
+            yield signals
@@ -1,5 +1,6 @@
-from audaugio import AugmentationBase
-from .chain_base import ChainBase
+from audaugio.augmentation import AugmentationBase
+from audaugio.augmentation.spectral import as_signal
+from .chain_base import ChainBase, _Tasks, fuse_sox
 
 
 class LinearChain(ChainBase):
@@ -7,18 +8,48 @@ class LinearChain(ChainBase):
     Apply augmentations linearly. The signal is modified by each augmentation in the order that they are passed into the constructor.
 
     :param augmentations: an arbitrary amount of augmentations
+    :param kwargs: execution options, see ChainBase
     """
 
-    def __init__(self, *augmentations: AugmentationBase):
-        super().__init__(*augmentations)
+    def __init__(self, *augmentations: AugmentationBase, **kwargs):
+        super().__init__(*augmentations, **kwargs)
 
     def _apply_augmentations(self, signal: [], sr: int):
-        augmented_audio = [signal]
-        for augmentation in self._augmentations:
-            augmented_audio_batch = []
-            for signal in augmented_audio:
-                augmented_audio_batch += augmentation.augment(signal, sr)
+        return self.augment_batch([signal], sr)[0]
 
-            augmented_audio = augmented_audio_batch
+    def augment_batch(self, signals, sr: int):
+        return self._results(*self._augment_all(signals, sr))
 
-        return augmented_audio
+    def stream(self, blocks, sr: int):
+        return self._stream_levels(blocks, sr, keep_unaugmented=False)
+
+    def _plan_all(self, signals, sr):
+        return self._plan_levels(0, [[self._as_float(signal)] for signal in signals], sr)
+
+    def _plan_levels(self, start, augmented_audio, sr):
+        provenance = [[()] * len(batch) for batch in augmented_audio]
+        for index in range(start, len(self._steps())):
+            augmented_audio = [[self._prepare(index, signal, sr) for signal in batch] for batch in augmented_audio]
+            # every signal of every batch is augmented in one go, then the results are regrouped by the batch they came from
+            augmented = yield _Tasks((index, signal) for batch in augmented_audio for signal in batch)
+            augmented_audio, provenance = self._regroup(index, augmented_audio, provenance, augmented, keep_unaugmented=False)
+
+        return [[as_signal(signal) for signal in batch] for batch in augmented_audio], provenance
+
+    def iter_augmented(self, signal, sr: int):
+        return map(as_signal, self._run_plan(self._plan_iter(signal, sr), sr))
+
+    def _plan_iter(self, signal, sr):
+        return self._iter_augmented(self._steps(), 0, self._as_float(signal), sr)
+
+    def _iter_augmented(self, augmentations, start, signal, sr):
+        if start == len(augmentations):
+            yield signal
+            return
+
+        for augmented in (yield _Tasks([(start, self._prepare(start, signal, sr))]))[0]:
+            yield from self._iter_augmented(augmentations, start + 1, augmented, sr)
+
+    def _compile(self):
+        # every step consumes the previous one's output, so any adjacent SoX augmentations can share a SoX process
+        return fuse_sox(self._augmentations)
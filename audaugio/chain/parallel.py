@@ -0,0 +1,134 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# augmentations of the chain a worker process belongs to, set once when the worker starts
+_worker_augmentations = None
+
+
+class ProcessPool:
+    """
+    A pool of worker processes that apply a chain's augmentations. The augmentations are sent to each worker once, when it starts. Signals are passed
+    to and from the workers through shared memory rather than being pickled.
+
+    :param augmentations: the augmentations tasks refer to by index
+    :param n_jobs: number of worker processes
+    :param executor: an existing executor to run tasks on instead of starting a pool. Augmentations are then sent along with every task, each as
+        the copy for_worker() returns for the number of the task, so that augmentations that draw random numbers draw different ones for every task.
+    """
+
+    def __init__(self, augmentations, n_jobs: int = None, executor=None):
+        self.augmentations = augmentations
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ProcessPoolExecutor(n_jobs, initializer=_initialize_worker, initargs=(augmentations, multiprocessing.Value('i', 0)))
+        self._executor = executor
+        self._n_tasks = 0
+
+    def map(self, tasks, sr):
+        """
+        Apply augmentations to signals in the worker processes.
+
+        :param tasks: list of (augmentation index, signal) pairs
+        :param sr: sample rate, int
+        :return: for each task, the list of signals the augmentation returned
+        """
+        block, layout = _share([signal for _, signal in tasks])
+        futures = []
+        augmented = []
+        errors = []
+        try:
+            for (index, _), (offset, shape, dtype) in zip(tasks, layout):
+                augmentation = None
+                if not self._owns_executor:
+                    augmentation = self.augmentations[index].for_worker(self._n_tasks)
+                    self._n_tasks += 1
+                futures.append(self._executor.submit(_run_task, index, augmentation, block.name, offset, shape, dtype, sr))
+        finally:
+            # the input block is only freed once every task is done with it, and the output blocks of tasks that succeeded are freed even if
+            # another task failed
+            wait(futures)
+            block.close()
+            block.unlink()
+            for future in futures:
+                if future.cancelled() or future.exception() is not None:
+                    errors.append(future)
+                else:
+                    augmented.append(_collect(*future.result()))
+        if errors:
+            errors[0].result()
+        return augmented
+
+    def shutdown(self):
+        if self._owns_executor:
+            self._executor.shutdown()
+
+
+def _share(signals):
+    # copy signals next to each other into one shared memory block
+    layout = []
+    offset = 0
+    for signal in signals:
+        signal = np.asarray(signal)
+        layout.append((offset, signal.shape, signal.dtype.str))
+        offset += signal.nbytes
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for signal, (offset, shape, dtype) in zip(signals, layout):
+            np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)[...] = signal
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    return block, layout
+
+
+def _collect(name, layout):
+    # copy signals out of a block created by a worker, then free it
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return [np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset).copy() for offset, shape, dtype in layout]
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _initialize_worker(augmentations, n_workers):
+    global _worker_augmentations
+    worker = next_worker(n_workers)
+    _worker_augmentations = [augmentation.for_worker(worker) for augmentation in augmentations]
+
+
+def next_worker(n_workers):
+    """
+    Number the calling worker process, given a multiprocessing.Value shared by every worker of the pool that counts the workers numbered so far.
+    """
+    with n_workers.get_lock():
+        worker = n_workers.value
+        n_workers.value += 1
+    return worker
+
+
+def _run_task(index, augmentation, name, offset, shape, dtype, sr):
+    from .chain_base import ChainBase
+
+    if augmentation is None:
+        augmentation = _worker_augmentations[index]
+
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        augmented = ChainBase._augment(augmentation, np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset), sr)
+        # augmentations may return views of their input, so everything is copied out before the input block is closed
+        output, layout = _share(augmented)
+        del augmented
+    finally:
+        try:
+            block.close()
+        except BufferError:
+            # the traceback of an augmentation that failed still holds views of the signal; the mapping goes when they are collected
+            pass
+    output.close()
+    return output.name, layout
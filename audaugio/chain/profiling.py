@@ -0,0 +1,80 @@
+import sys
+
+
+class AugmentationCall:
+    """
+    What happened when a chain applied one of its augmentations to one or more signals. Chains pass these to their hooks.
+
+    CPU time only counts the calling process, so it misses work done in a chain's worker processes. SoX and I/O times are only measured for SoX
+    augmentations running in the calling process; I/O time covers converting samples for SoX and, with the 'sox-file' backend, reading and
+    writing the temporary files.
+
+    :param augmentation: the augmentation that was applied
+    :param n_calls: number of signals it was applied to
+    :param wall_time: elapsed time in seconds
+    :param cpu_time: CPU time of the calling process in seconds
+    :param input_samples: number of samples in the signals it was applied to
+    :param output_samples: number of samples in the signals it returned
+    :param allocated_bytes: size of the returned signals that aren't views of their input
+    :param sox_time: time in seconds spent waiting on SoX processes
+    :param io_time: time in seconds spent passing samples to and from SoX
+    """
+
+    def __init__(self, augmentation, n_calls, wall_time, cpu_time, input_samples, output_samples, allocated_bytes, sox_time=0., io_time=0.):
+        self.augmentation = augmentation
+        self.n_calls = n_calls
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.input_samples = input_samples
+        self.output_samples = output_samples
+        self.allocated_bytes = allocated_bytes
+        self.sox_time = sox_time
+        self.io_time = io_time
+
+
+class ChainProfile:
+    """
+    Totals of every AugmentationCall of a chain, per augmentation. Use through ChainBase.profile(), which hooks it into the chain:
+
+    ::
+
+        with chain.profile() as profile:
+            chain(y, sr)
+
+    :param chain: the chain to profile
+    :param file: where to print the summary when the profile is closed, stderr by default. False to not print it.
+    """
+
+    fields = ('n_calls', 'wall_time', 'cpu_time', 'input_samples', 'output_samples', 'allocated_bytes', 'sox_time', 'io_time')
+
+    def __init__(self, chain, file=None):
+        self.chain = chain
+        self.file = file
+        self.totals = {}
+
+    def __enter__(self):
+        self.chain.add_hook(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.chain.remove_hook(self)
+        if self.file is not False:
+            print(self.summary(), file=self.file or sys.stderr)
+
+    def __call__(self, call: AugmentationCall):
+        # keyed by identity, since augmentations with the same parameters are still separate steps
+        totals = self.totals.setdefault(id(call.augmentation), dict({field: 0 for field in self.fields}, augmentation=call.augmentation))
+        for field in self.fields:
+            totals[field] += getattr(call, field)
+
+    def summary(self):
+        """
+        Return a table of the totals of every augmentation, as a string.
+        """
+        lines = ['{0:<50}  {1:>7}  {2:>9}  {3:>9}  {4:>12}  {5:>12}  {6:>10}  {7:>9}  {8:>9}'.format(
+            'augmentation', 'calls', 'wall (s)', 'cpu (s)', 'in samples', 'out samples', 'alloc (MB)', 'sox (s)', 'i/o (s)')]
+        for totals in self.totals.values():
+            lines.append('{0:<50}  {1:>7}  {2:>9.3f}  {3:>9.3f}  {4:>12}  {5:>12}  {6:>10.1f}  {7:>9.3f}  {8:>9.3f}'.format(
+                repr(totals['augmentation'])[:50], totals['n_calls'], totals['wall_time'], totals['cpu_time'], totals['input_samples'],
+                totals['output_samples'], totals['allocated_bytes'] / 2 ** 20, totals['sox_time'], totals['io_time']))
+        return '\n'.join(lines)
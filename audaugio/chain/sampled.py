@@ -0,0 +1,171 @@
+import numpy as np
+
+from audaugio.augmentation import AugmentationBase
+from audaugio.augmentation.noise import RandomStreams
+from audaugio.augmentation.spectral import as_signal
+from .chain_base import ChainBase, _Tasks, _returned
+
+
+class RandomChain(ChainBase):
+    """
+    Apply random combinations of augmentations, for augmenting on the fly while training. Instead of every combination CombinatoricChain returns,
+    n_paths combinations are drawn for every signal: each augmentation is applied with its own probability, in the order they are passed in, so the
+    cost per signal doesn't grow with the number of augmentations. By default, replacing augmentations are always applied and others with a
+    probability of 0.5, which draws uniformly from the combinations CombinatoricChain would return. To draw parameters at random as well, use
+    SampledAugmentation.
+
+    The combinations drawn for a signal often start the same way, so they are merged into a tree and shared prefixes are only augmented once.
+    Combinations that share a prefix share its result too, including whatever random augmentations in it drew, and a combination drawn more than
+    once returns the same signals each time.
+
+    stream() draws n_paths combinations for the whole stream, and streams each one like LinearChain does. Streamed combinations that share a
+    prefix share its state as well. The lists it yields hold the next block of every combination that isn't split into separate signals, followed
+    by the signals of every combination that is and that were completed by the block.
+
+    :param augmentations: an arbitrary amount of augmentations
+    :param probabilities: probability of applying each augmentation, in the same order
+    :param n_paths: number of combinations to draw for every signal
+    :param seed: seed of the random streams the combinations are drawn from (see RandomStreams), to draw the same ones every time
+    :param kwargs: execution options, see ChainBase
+    """
+
+    def __init__(self, *augmentations: AugmentationBase, probabilities=None, n_paths: int = 1, seed: int = None, **kwargs):
+        super().__init__(*augmentations, **kwargs)
+        if probabilities is None:
+            probabilities = [1. if augmentation.replaces else .5 for augmentation in augmentations]
+        if len(probabilities) != len(augmentations):
+            raise ValueError("need a probability for each of the {0} augmentations, not {1}".format(len(augmentations), len(probabilities)))
+        if not all(0 <= probability <= 1 for probability in probabilities):
+            raise ValueError("probabilities must be between 0 and 1, not {0}".format(probabilities))
+        self.probabilities = list(probabilities)
+        self.n_paths = n_paths
+        self.seed = seed
+        self._streams = RandomStreams(seed)
+
+    def __add__(self, new_augmentation: AugmentationBase):
+        super().__add__(new_augmentation)
+        self.probabilities.append(1. if new_augmentation.replaces else .5)
+
+    def _apply_augmentations(self, signal: [], sr: int):
+        return self.augment_batch([signal], sr)[0]
+
+    def augment_batch(self, signals, sr: int):
+        return self._results(*self._augment_all(signals, sr))
+
+    def stream(self, blocks, sr: int):
+        steps = self._steps()
+        paths = self.draw_paths()[0]
+        # each combination is streamed up to the first augmentation that splits it into separate signals, if any, and the rest of it is applied to
+        # each of those signals as usual. Streamers are kept per (prefix of a combination, stream), so that combinations that share a prefix share
+        # its state, and the first one of every prefix is created up front, so that augmentations that can't be streamed fail before any block is
+        # read. Streams are told apart by the outputs of each augmentation of the prefix they came from.
+        streamers = {}
+
+        def streamer(prefix, key):
+            if (prefix, key) not in streamers:
+                streamers[prefix, key] = steps[prefix[-1]].streamer(sr)
+            return streamers[prefix, key]
+
+        n_streamed = {}
+        for path in paths:
+            n_streamed[path] = 0
+            for index in path:
+                n_streamed[path] += 1
+                if streamer(path[:n_streamed[path]], ()).emits_signals:
+                    break
+        splits = {path: n > 0 and streamer(path[:n], ()).emits_signals for path, n in n_streamed.items()}
+
+        def split(path, signals):
+            # applies the rest of a split combination to the signals it was split into
+            if not signals:
+                return []
+            augmented_audio, _ = _returned(self._run_plan(self._plan_paths(signals, [[path[n_streamed[path]:]]] * len(signals), sr), sr))
+            return [signal for batch in augmented_audio for signal in batch]
+
+        streams = {(): [((), None)]}
+        for block in map(self._as_float, blocks):
+            streams = {(): [((), block)]}
+            for path, n in n_streamed.items():
+                for k in range(n):
+                    prefix = path[:k + 1]
+                    if prefix not in streams:
+                        streams[prefix] = [(key + (i,), output) for key, stream in streams[path[:k]]
+                                           for i, output in enumerate(streamer(prefix, key).push(stream))]
+            completed = {path: split(path, [signal for _, signal in streams[path[:n]]]) for path, n in n_streamed.items() if splits[path]}
+            # the next block of every stream of every combination that isn't split, followed by the signals the split ones completed
+            yield ([block for path in paths if not splits[path] for _, block in streams[path]] +
+                   [signal for path in paths if splits[path] for signal in completed[path]])
+
+        # the streams that reached the splitting augmentation of a combination in the last block are all the streams there are
+        completed = {path: split(path, [signal for key, _ in streams.get(path[:n - 1], []) for signal in streamer(path[:n], key).finish()])
+                     for path, n in n_streamed.items() if splits[path]}
+        signals = [signal for path in paths if splits[path] for signal in completed[path]]
+        if signals:
+            yield signals
+
+    def for_worker(self, worker: int):
+        chain = super().for_worker(worker)
+        chain._streams = self._streams.for_worker(worker)
+        return chain
+
+    def draw_paths(self, n_signals: int = 1):
+        """
+        Draw the combinations of augmentations to apply to each of a number of signals.
+
+        :param n_signals: number of signals
+        :return: for each signal, a list of n_paths tuples of the indices of the augmentations to apply
+        """
+        applied = self._streams.generator().random((n_signals, self.n_paths, len(self._augmentations))) < self.probabilities
+        return [[tuple(int(index) for index in np.flatnonzero(path)) for path in paths] for paths in applied]
+
+    def _plan_all(self, signals, sr):
+        return self._plan_paths([self._as_float(signal) for signal in signals], self.draw_paths(len(signals)), sr)
+
+    def _plan_paths(self, signals, paths, sr):
+        # the tree of every signal is walked one level at a time, so that every signal at a level is augmented in one go
+        roots = [_Node([signal], [()]) for signal in signals]
+        leaves = []
+        for root, signal_paths in zip(roots, paths):
+            leaves.append([root.insert(path) for path in signal_paths])
+
+        level = roots
+        while True:
+            edges = [(node, index, child) for node in level for index, child in node.children.items()]
+            if not edges:
+                break
+            # grouped by augmentation, so that each one is applied to all of its signals in one call
+            edges.sort(key=lambda edge: edge[1])
+            augmented = yield _Tasks((index, self._prepare(index, signal, sr)) for node, index, _ in edges for signal in node.signals)
+            position = 0
+            for node, index, child in edges:
+                outputs = augmented[position:position + len(node.signals)]
+                position += len(node.signals)
+                (child.signals,), (child.provenance,) = self._regroup(index, [node.signals], [node.provenance], outputs, keep_unaugmented=False)
+            for node in level:
+                # only the signals at the end of a path are returned
+                if not node.leaf:
+                    node.signals = node.provenance = None
+            level = [child for _, _, child in edges]
+
+        augmented_audio = [[as_signal(signal) for leaf in signal_leaves for signal in leaf.signals] for signal_leaves in leaves]
+        provenance = [[applied for leaf in signal_leaves for applied in leaf.provenance] for signal_leaves in leaves]
+        return augmented_audio, provenance
+
+
+class _Node:
+    # a prefix of the paths drawn for a signal, with the signals augmenting it gives
+    __slots__ = ('signals', 'provenance', 'children', 'leaf')
+
+    def __init__(self, signals=None, provenance=None):
+        self.signals = signals
+        self.provenance = provenance
+        self.children = {}
+        self.leaf = False
+
+    def insert(self, path):
+        # adds a path below this node, returning the node it ends at
+        node = self
+        for index in path:
+            node = node.children.setdefault(index, _Node())
+        node.leaf = True
+        return node
@@ -0,0 +1,307 @@
+"""
+Augment a whole dataset from the command line.
+
+::
+
+    audaugio data/ augmented/ --chain "CombinatoricChain(PitchShiftAugmentation(1), BackgroundNoiseAugmentation(.005))"
+
+Files are decoded by reader threads, augmented by a pool of worker processes and written by writer threads, all at the same time, with bounded
+queues in between so that memory use doesn't depend on the size of the dataset. Every augmented signal is written as a 32-bit float WAV file named
+after its input file and its position in what the chain returned, or with --shards, appended to a store of large shard files (see ShardWriter)
+under the augmentations that made it. Finished input files are appended to a progress log in the output directory, and files already in the
+log are skipped, so an interrupted run picks up where it left off.
+"""
+import argparse
+import ast
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import librosa
+import numpy as np
+import scipy.io.wavfile
+
+from audaugio import augmentation, chain
+from audaugio.chain.parallel import next_worker
+from audaugio.store import ShardWriter
+
+EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3', '.aiff', '.aif')
+PROGRESS_LOG = '.audaugio-progress'
+
+_CALLABLES = {name: getattr(module, name) for module in (augmentation, chain) for name in module.__all__}
+
+# the chain of each worker process, sent once when the process starts
+_worker_chain = None
+
+
+def parse_chain(spec: str):
+    """
+    Build a chain from a Python expression like "LinearChain(LowPassAugmentation(4000, .7), WindowingAugmentation(1, .5))". Only AudAugio's chains,
+    augmentations and caches can be called, optionally as attributes of audaugio, and every other argument has to be a literal, so a spec can't run
+    arbitrary code.
+
+    :param spec: the expression
+    :return: the chain
+    """
+    try:
+        node = ast.parse(spec.strip(), mode='eval').body
+    except SyntaxError as e:
+        raise ValueError("invalid chain spec: {0}".format(e))
+    built = _build(node)
+    if not isinstance(built, chain.ChainBase):
+        raise ValueError("a chain spec has to build a chain, not {0}".format(type(built).__name__))
+    return built
+
+
+def _build(node):
+    if not isinstance(node, ast.Call):
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            raise ValueError("chain specs can only contain calls to AudAugio classes and literals, not {0}".format(ast.dump(node)))
+
+    if isinstance(node.func, ast.Name):
+        name = node.func.id
+    elif isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name) and node.func.value.id == 'audaugio':
+        name = node.func.attr
+    else:
+        name = None
+    if name not in _CALLABLES:
+        raise ValueError("{0} is not an AudAugio chain or augmentation".format(name or ast.dump(node.func)))
+    if any(keyword.arg is None for keyword in node.keywords):
+        raise ValueError("chain specs can't unpack keyword arguments")
+    return _CALLABLES[name](*[_build(arg) for arg in node.args], **{keyword.arg: _build(keyword.value) for keyword in node.keywords})
+
+
+def find_inputs(source: str, extensions=EXTENSIONS):
+    """
+    List the audio files to augment, either every file with one of the given extensions under a directory, or the paths listed in a manifest file,
+    one per line, relative to the manifest.
+
+    :param source: a directory or a manifest file
+    :param extensions: file extensions to look for in a directory
+    :return: (paths, root), where root is the directory output paths are made relative to
+    """
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(directory, name) for directory, _, names in os.walk(source) for name in names
+                       if name.lower().endswith(extensions))
+        return paths, source
+
+    root = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        paths = [os.path.join(root, line.strip()) for line in f if line.strip()]
+    return paths, os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else root
+
+
+class Pipeline:
+    """
+    Decodes, augments and encodes files concurrently. Reader threads put decoded signals on a bounded queue, augmentation threads hand them to
+    worker processes (or augment them themselves without any) and put the results on another bounded queue, and writer threads encode them.
+
+    :param chain: the chain to apply to every file
+    :param output: directory to write augmented files to
+    :param root: directory input paths are made relative to when naming their output
+    :param sr: sample rate to resample to when decoding, or None to keep each file's own
+    :param readers: number of decoding threads
+    :param workers: number of worker processes, one per CPU by default. 0 augments in the calling process instead.
+    :param writers: number of encoding threads
+    :param queue_size: number of signals each queue holds before the stage feeding it waits
+    :param report_interval: seconds between progress reports on stderr. 0 disables them.
+    :param store: a ShardWriter to append augmented signals to instead of writing WAV files
+    """
+
+    def __init__(self, chain, output, root, sr=None, readers=2, workers=None, writers=2, queue_size=16, report_interval=10., store=None):
+        self.chain = chain
+        self.output = output
+        self.root = root
+        self.sr = sr
+        self.readers = readers
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.writers = writers
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.store = store
+        self.done = 0
+        self.failed = 0
+        self.total = 0
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def run(self, paths):
+        """
+        Augment every file in paths that isn't in the progress log yet.
+
+        :return: (number of files augmented, number of files that failed)
+        """
+        os.makedirs(self.output, exist_ok=True)
+        log_path = os.path.join(self.output, PROGRESS_LOG)
+        finished = set()
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                finished = {line.rstrip('\n') for line in f}
+        pending = queue.Queue()
+        for path in paths:
+            if path not in finished:
+                pending.put(path)
+        self.total = pending.qsize()
+
+        decoded = queue.Queue(self.queue_size)
+        augmented = queue.Queue(self.queue_size)
+        executor = None
+        if self.workers:
+            executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_initialize_worker,
+                                                              initargs=(self.chain, multiprocessing.Value('i', 0)))
+        start = time.perf_counter()
+        reporter = threading.Thread(target=self._report, args=(start,), daemon=True)
+        reporter.start()
+
+        with open(log_path, 'a') as log:
+            readers = _start_threads(self.readers, self._read, pending, decoded)
+            # one thread per worker process, each waiting on the signal its process is augmenting
+            augmenters = _start_threads(max(self.workers, 1), self._augment, decoded, augmented, executor)
+            writers = _start_threads(self.writers, self._write, augmented, log)
+            # each stage is shut down once the one before it is done, by sending it one None per thread
+            _stop_threads(readers, pending)
+            _stop_threads(augmenters, decoded, after=readers)
+            _stop_threads(writers, augmented, after=augmenters)
+            for thread in writers:
+                thread.join()
+
+        if executor is not None:
+            executor.shutdown()
+        self._finished.set()
+        reporter.join()
+        if self.report_interval:
+            self._print_progress(start)
+        return self.done, self.failed
+
+    def _read(self, pending, decoded):
+        for path in iter(pending.get, None):
+            try:
+                signal, sr = librosa.load(path, sr=self.sr, mono=True)
+            except Exception as e:
+                self._fail(path, e)
+                continue
+            decoded.put((path, signal, sr))
+
+    def _augment(self, decoded, augmented, executor):
+        for path, signal, sr in iter(decoded.get, None):
+            try:
+                if executor is None:
+                    signals = self.chain(signal, sr)
+                else:
+                    signals = executor.submit(_augment_in_worker, signal, sr).result()
+            except Exception as e:
+                self._fail(path, e)
+                continue
+            augmented.put((path, signals, sr))
+
+    def _write(self, augmented, log):
+        for path, signals, sr in iter(augmented.get, None):
+            try:
+                if self.store is None:
+                    self._write_wavs(path, signals, sr)
+                else:
+                    self.store.extend(signals, sr, os.path.relpath(path, self.root), self.chain.multichannel)
+                    # the file only counts as done once its signals are on disk
+                    self.store.flush()
+            except Exception as e:
+                self._fail(path, e)
+                continue
+            self._log(path, log)
+
+    def _write_wavs(self, path, signals, sr):
+        stem = os.path.splitext(os.path.relpath(path, self.root))[0]
+        os.makedirs(os.path.dirname(os.path.join(self.output, stem)), exist_ok=True)
+        for i, signal in enumerate(signals):
+            for j, row in enumerate(np.atleast_2d(signal)):
+                # stacked blocks of signals are written one row per file
+                suffix = '_{0}'.format(i) if np.ndim(signal) < 2 else '_{0}_{1}'.format(i, j)
+                scipy.io.wavfile.write(os.path.join(self.output, stem + suffix + '.wav'), sr, row.astype(np.float32))
+
+    def _log(self, path, log):
+        with self._lock:
+            log.write(path + '\n')
+            log.flush()
+            self.done += 1
+
+    def _fail(self, path, error):
+        with self._lock:
+            self.failed += 1
+            print('audaugio: {0}: {1}'.format(path, str(error) or type(error).__name__), file=sys.stderr, flush=True)
+
+    def _report(self, start):
+        while self.report_interval and not self._finished.wait(self.report_interval):
+            self._print_progress(start)
+
+    def _print_progress(self, start):
+        elapsed = time.perf_counter() - start
+        print('audaugio: {0}/{1} files done, {2} failed, {3:.1f} files/s'.format(self.done, self.total, self.failed, self.done / max(elapsed, 1e-9)),
+              file=sys.stderr, flush=True)
+
+
+def _start_threads(n_threads, target, *args):
+    threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _stop_threads(threads, inputs, after=()):
+    for thread in after:
+        thread.join()
+    for _ in threads:
+        inputs.put(None)
+
+
+def _initialize_worker(chain, n_workers):
+    global _worker_chain
+    _worker_chain = chain.for_worker(next_worker(n_workers))
+
+
+def _augment_in_worker(signal, sr):
+    return _worker_chain(signal, sr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='audaugio', description='Augment every audio file in a directory or manifest with an AudAugio chain.')
+    parser.add_argument('input', help='directory of audio files, or a manifest listing one path per line')
+    parser.add_argument('output', help='directory to write augmented files and the progress log to')
+    parser.add_argument('--chain', required=True, help='the chain, as a Python expression like "LinearChain(LowPassAugmentation(4000, .7))"')
+    parser.add_argument('--sr', type=int, help='sample rate to resample every file to (default: keep their own)')
+    parser.add_argument('--readers', type=int, default=2, help='decoding threads (default 2)')
+    parser.add_argument('--workers', type=int, help='augmentation processes; 0 augments in this process instead (default: one per CPU)')
+    parser.add_argument('--writers', type=int, default=2, help='encoding threads (default 2)')
+    parser.add_argument('--queue-size', type=int, default=16, help='signals held between stages (default 16)')
+    parser.add_argument('--report-interval', type=float, default=10., help='seconds between progress reports; 0 for none (default 10)')
+    parser.add_argument('--shards', choices=('float32', 'int16'), help='append to a store of shard files of this type instead of writing WAV files')
+    parser.add_argument('--restart', action='store_true', help='ignore the progress log and augment every file again')
+    args = parser.parse_args(argv)
+
+    try:
+        augmentation_chain = parse_chain(args.chain)
+    except (ValueError, TypeError) as e:
+        parser.error(str(e))
+    # results come back from the worker processes as one buffer per file rather than one array per signal, along with their provenance
+    augmentation_chain.return_batch = True
+    paths, root = find_inputs(args.input)
+    if args.restart and os.path.exists(os.path.join(args.output, PROGRESS_LOG)):
+        os.remove(os.path.join(args.output, PROGRESS_LOG))
+
+    store = ShardWriter(args.output, dtype=args.shards) if args.shards else None
+    pipeline = Pipeline(augmentation_chain, args.output, root, sr=args.sr, readers=args.readers, workers=args.workers, writers=args.writers,
+                        queue_size=args.queue_size, report_interval=args.report_interval, store=store)
+    try:
+        _, failed = pipeline.run(paths)
+    finally:
+        if store is not None:
+            store.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
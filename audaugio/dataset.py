@@ -0,0 +1,212 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class AugmentedDataset:
+    """
+    An iterable of augmented signals for training loops, which augments clips in background threads while the loop consumes what was augmented
+    before. It doesn't depend on any framework: iterating over it yields (clip index, augmented signal) pairs, where the index into clips is there to
+    look up labels with.
+
+    Clips are sharded deterministically: a dataset for worker i of n only augments clips[i::n], so that the data loader workers of a training
+    framework can each iterate over their own copy. Every pass, the chain draws from random streams of that worker and epoch's own (see
+    ChainBase.for_worker()), so that neither workers nor epochs repeat each other's noise or random paths, while a seeded chain draws the same
+    numbers for the same worker and epoch every time.
+
+    Up to prefetch augmented clips are kept ahead of the loop. Augmentation happens in n_threads threads, each calling the chain on one clip at a
+    time, which runs in parallel where the chain's augmentations release the GIL, like numpy, scipy and SoX do. To augment in processes instead,
+    give the chain n_jobs; a single thread then keeps them all busy.
+
+    With shuffle_buffer, signals are shuffled within a buffer of that many, like tf.data does: every signal is yielded from a random position of the
+    buffer once it's full. The shuffle is seeded by seed, worker and epoch.
+
+    Every pass over the dataset moves on to the next epoch. Data loaders that give their workers a fresh copy of the dataset every epoch should pass
+    the epoch with set_epoch() or epoch, like samplers of training frameworks take it; otherwise every epoch would be augmented and shuffled the same
+    way.
+
+    metrics tells whether augmentation keeps up with the loop: a loop that is often stalled, with an empty queue, is waiting on augmentation.
+
+    :param chain: the chain to augment clips with
+    :param clips: clips to augment, either signals or anything load() turns into one, like paths of audio files
+    :param sr: sample rate of the clips, int
+    :param load: function returning the signal of a clip, called in the background threads. By default, clips are signals.
+    :param worker: number of the worker this dataset is for, counting from 0
+    :param n_workers: number of workers the clips are sharded across
+    :param prefetch: number of augmented clips to keep ahead of the loop
+    :param n_threads: number of threads to augment clips in. With more than one, clips come out in the order they are done.
+    :param shuffle_buffer: number of signals to shuffle within, or 0 to yield them in the order they come
+    :param seed: seed of the shuffle
+    :param epoch: number of the epoch the next pass over the dataset is, counting from 0
+    """
+
+    def __init__(self, chain, clips, sr: int, load=None, worker: int = 0, n_workers: int = 1, prefetch: int = 8, n_threads: int = 1,
+                 shuffle_buffer: int = 0, seed: int = None, epoch: int = 0):
+        if not 0 <= worker < n_workers:
+            raise ValueError("worker must be between 0 and n_workers - 1 ({0}), not {1}".format(n_workers - 1, worker))
+        if prefetch < 1 or n_threads < 1:
+            raise ValueError("prefetch and n_threads must be at least 1, not {0} and {1}".format(prefetch, n_threads))
+        self.chain = chain
+        self.clips = clips
+        self.sr = sr
+        self.load = load
+        self.worker = worker
+        self.n_workers = n_workers
+        self.prefetch = prefetch
+        self.n_threads = n_threads
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = epoch
+        self.metrics = DatasetMetrics()
+
+    def __iter__(self):
+        epoch = self.epoch
+        self.epoch += 1
+        generator = np.random.default_rng(None if self.seed is None else [self.seed, self.worker, epoch])
+        buffer = []
+        for item in self._prefetched(epoch):
+            if not self.shuffle_buffer:
+                yield item
+                continue
+            buffer.append(item)
+            if len(buffer) >= self.shuffle_buffer:
+                # the yielded signal's place is taken by the last one, so nothing has to be moved
+                i = generator.integers(len(buffer))
+                buffer[i], buffer[-1] = buffer[-1], buffer[i]
+                yield buffer.pop()
+        for i in generator.permutation(len(buffer)):
+            yield buffer[i]
+
+    def set_epoch(self, epoch: int):
+        """
+        Set the number of the epoch the next pass over the dataset is, which the chain's random streams and the shuffle are seeded by.
+
+        :param epoch: number of the epoch, counting from 0
+        """
+        self.epoch = epoch
+
+    def indices(self):
+        """
+        Return the indices into clips of the clips this dataset augments, in the order they are augmented.
+        """
+        return range(self.worker, len(self.clips), self.n_workers)
+
+    def _prefetched(self, epoch):
+        # yields (clip index, augmented signal) as the threads finish clips, re-raising whatever they raise
+        chain = self.chain.for_worker(self.worker).for_worker(epoch)
+        indices = iter(self.indices())
+        lock = threading.Lock()
+        done = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def augment():
+            while not stop.is_set():
+                with lock:
+                    index = next(indices, None)
+                if index is None:
+                    break
+                started = time.perf_counter()
+                try:
+                    clip = self.clips[index] if self.load is None else self.load(self.clips[index])
+                    result = index, list(chain(clip, self.sr)), None
+                except Exception as error:
+                    result = index, [], error
+                self.metrics._augmented(time.perf_counter() - started)
+                _put(done, result, stop)
+                if result[2] is not None:
+                    break
+            _put(done, None, stop)
+
+        threads = [threading.Thread(target=augment, daemon=True) for _ in range(self.n_threads)]
+        for thread in threads:
+            thread.start()
+        try:
+            running = len(threads)
+            while running:
+                depth = done.qsize()
+                started = time.perf_counter()
+                result = done.get()
+                if result is None:
+                    running -= 1
+                    continue
+                self.metrics._waited(depth, time.perf_counter() - started)
+                index, signals, error = result
+                if error is not None:
+                    raise error
+                self.metrics.signals += len(signals)
+                for signal in signals:
+                    yield index, signal
+        finally:
+            # also stops the threads when the loop breaks off early
+            stop.set()
+            for thread in threads:
+                thread.join()
+            chain.close()
+
+
+class DatasetMetrics:
+    """
+    Running totals of an AugmentedDataset, across every pass over it.
+    """
+
+    def __init__(self):
+        #: number of clips augmented
+        self.clips = 0
+        #: number of augmented signals yielded
+        self.signals = 0
+        #: time in seconds the threads spent loading and augmenting clips, summed over threads
+        self.augment_time = 0.
+        #: time in seconds the loop spent waiting for a clip to be augmented
+        self.stall_time = 0.
+        #: number of augmented clips that were ready when the loop last asked for one
+        self.queue_depth = 0
+        #: the most augmented clips that were ever ready when the loop asked for one
+        self.max_queue_depth = 0
+        self._total_depth = 0
+        self._n_waits = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # datasets are pickled to send them to data loader workers, which get a lock of their own
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ('DatasetMetrics(clips={0}, signals={1}, augment_time={2:.3f}, stall_time={3:.3f}, mean_queue_depth={4:.2f}, max_queue_depth={5})'
+                .format(self.clips, self.signals, self.augment_time, self.stall_time, self.mean_queue_depth, self.max_queue_depth))
+
+    @property
+    def mean_queue_depth(self):
+        """
+        Average number of augmented clips that were ready when the loop asked for one. Close to 0 means the loop is waiting on augmentation.
+        """
+        return self._total_depth / self._n_waits if self._n_waits else 0.
+
+    def _augmented(self, seconds):
+        with self._lock:
+            self.clips += 1
+            self.augment_time += seconds
+
+    def _waited(self, depth, seconds):
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self._total_depth += depth
+        self._n_waits += 1
+        self.stall_time += seconds
+
+
+def _put(done, item, stop):
+    # waits for room in the queue, unless the dataset stopped being iterated over
+    while not stop.is_set():
+        try:
+            done.put(item, timeout=.1)
+            return
+        except queue.Full:
+            pass
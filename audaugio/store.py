@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from .chain.batch import AugmentedBatch
+
+#: one record of a store's index: where an augmented signal is, and what it was made from
+ENTRY = np.dtype([('shard', '<u4'), ('offset', '<u8'), ('length', '<u8'), ('sr', '<u4'), ('source', '<u4'), ('path', '<u4')])
+
+DTYPES = ('float32', 'int16')
+
+
+class ShardWriter:
+    """
+    Appends augmented signals to a store of large shard files instead of writing one file per signal.
+
+    A store is a directory of shards, which hold the raw samples of many signals back to back, and an index with the shard, offset, length and
+    sample rate of every signal along with its provenance: the source it was augmented from and its augmentation path, which tells it apart from
+    the other signals of the same source. Everything is only ever appended to, and flush() writes samples before the index entries that point at
+    them, so an interrupted writer leaves a readable store behind. Opening an existing store appends to it, starting a new shard.
+
+    int16 stores hold samples scaled by 32767 and clipped to [-1, 1].
+
+    :param directory: directory of the store, created if it doesn't exist
+    :param dtype: 'float32' or 'int16', the type samples are stored as. An existing store keeps its own.
+    :param shard_bytes: size a shard grows to before the next one is started
+    """
+
+    def __init__(self, directory: str, dtype: str = 'float32', shard_bytes: int = 2 ** 30):
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        metadata_path = os.path.join(directory, 'store.json')
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                dtype = json.load(f)['dtype']
+        elif dtype not in DTYPES:
+            raise ValueError("dtype must be one of {0}, not {1}".format(DTYPES, dtype))
+        else:
+            with open(metadata_path, 'w') as f:
+                json.dump({'dtype': dtype}, f)
+        self.dtype = np.dtype(dtype)
+
+        for name in ('sources', 'paths'):
+            _truncate_partial_line(os.path.join(directory, name + '.txt'))
+        self._strings = {name: _read_strings(os.path.join(directory, name + '.txt')) for name in ('sources', 'paths')}
+        self._string_files = {name: open(os.path.join(directory, name + '.txt'), 'a') for name in self._strings}
+        self._index = open(os.path.join(directory, 'index.bin'), 'ab')
+        self._index.truncate(self._index.tell() - self._index.tell() % ENTRY.itemsize)  # drops a record an interrupted writer left half written
+        self._n_entries = self._index.tell() // ENTRY.itemsize
+        self._shard = len([name for name in os.listdir(directory) if name.startswith('shard-')])
+        self._shard_file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self._n_entries
+
+    def append(self, signal: np.ndarray, sr: int, source: str, path: str = ''):
+        """
+        Append a signal to the store. Safe to call from several threads.
+
+        :param signal: augmented signal, 1-D ndarray
+        :param sr: sample rate, int
+        :param source: what the signal was augmented from, like the path of the original file
+        :param path: the augmentation path of the signal, which tells it apart from other signals of the same source
+        :return: the index of the signal in the store
+        """
+        if np.ndim(signal) != 1:
+            raise ValueError("only 1-D signals can be stored, not {0}-D ones".format(np.ndim(signal)))
+        samples = _encode(signal, self.dtype)
+        with self._lock:
+            if self._shard_file is None or self._shard_file.tell() + samples.nbytes > self.shard_bytes and self._shard_file.tell() > 0:
+                self._next_shard()
+            entry = np.array([(self._shard - 1, self._shard_file.tell() // self.dtype.itemsize, len(samples), sr,
+                               self._string('sources', source), self._string('paths', path))], dtype=ENTRY)
+            samples.tofile(self._shard_file)
+            entry.tofile(self._index)
+            self._n_entries += 1
+            return self._n_entries - 1
+
+    def extend(self, signals, sr: int, source: str, multichannel: bool = False):
+        """
+        Append everything a chain returned for one source. Signals in an AugmentedBatch are stored under the path of augmentations that made them
+        (see AugmentedBatch.paths()), and signals in a list under their position in it. Rows of 2-D blocks of signals are appended one by one, as
+        "path[row]".
+
+        Like append(), stores only hold signals of a single channel. With multichannel, 2-D signals are taken to be the channels of one signal, as
+        chains created with multichannel=True return them, rather than a block of signals, and are refused before anything is appended.
+
+        :param signals: AugmentedBatch or list of augmented signals
+        :param sr: sample rate, int
+        :param source: what the signals were augmented from
+        :param multichannel: whether the signals were augmented by a chain created with multichannel=True
+        """
+        if multichannel and any(np.ndim(signal) > 1 for signal in signals):
+            raise ValueError("only signals of a single channel can be stored, not ones of {0} channels"
+                             .format(next(np.shape(signal)[-2] for signal in signals if np.ndim(signal) > 1)))
+        paths = signals.paths() if isinstance(signals, AugmentedBatch) else [str(i) for i in range(len(signals))]
+        for signal, path in zip(signals, paths):
+            if np.ndim(signal) > 1:
+                for j, row in enumerate(signal):
+                    self.append(row, sr, source, '{0}[{1}]'.format(path, j))
+            else:
+                self.append(signal, sr, source, path)
+
+    def flush(self):
+        """
+        Flush everything appended so far to disk, shards first, so that readers opened afterwards see all of it.
+        """
+        with self._lock:
+            if self._shard_file is not None:
+                self._shard_file.flush()
+            for f in self._string_files.values():
+                f.flush()
+            self._index.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for f in [self._shard_file, self._index] + list(self._string_files.values()):
+                if f is not None:
+                    f.close()
+
+    def _next_shard(self):
+        if self._shard_file is not None:
+            self._shard_file.close()
+        self._shard_file = open(os.path.join(self.directory, _shard_name(self._shard)), 'ab')
+        self._shard += 1
+
+    def _string(self, name, value):
+        strings = self._strings[name]
+        if value not in strings:
+            if '\n' in value:
+                raise ValueError("{0} can't contain line breaks: {1!r}".format(name, value))
+            strings[value] = len(strings)
+            self._string_files[name].write(value + '\n')
+        return strings[value]
+
+
+class ShardReader:
+    """
+    Reads a store written by ShardWriter. Shards are memory mapped, so indexing the reader returns a read-only view into a shard without copying
+    or reading any more of it than what is used.
+
+    :param directory: directory of the store
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, 'store.json')) as f:
+            self.dtype = np.dtype(json.load(f)['dtype'])
+        index_path = os.path.join(directory, 'index.bin')
+        entries = np.fromfile(index_path, dtype=ENTRY, count=os.path.getsize(index_path) // ENTRY.itemsize)
+        self._source_ids = _read_strings(os.path.join(directory, 'sources.txt'))
+        self._path_ids = _read_strings(os.path.join(directory, 'paths.txt'))
+        self.sources = list(self._source_ids)
+        self.paths = list(self._path_ids)
+
+        # a writer that was interrupted can leave entries behind whose samples or names never made it to disk
+        shard_samples = np.zeros(entries['shard'].max() + 1 if len(entries) else 0, dtype=np.uint64)
+        for shard in np.unique(entries['shard']):
+            shard_path = os.path.join(directory, _shard_name(int(shard)))
+            shard_samples[shard] = os.path.getsize(shard_path) // self.dtype.itemsize if os.path.exists(shard_path) else 0
+        complete = ((entries['offset'] + entries['length'] <= shard_samples[entries['shard']]) & (entries['source'] < len(self.sources)) &
+                    (entries['path'] < len(self.paths)))
+        self.entries = entries[complete]
+        self._shards = {}
+        self._lookup = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        entry = self.entries[i]
+        if entry['length'] == 0:  # empty files can't be memory mapped
+            return np.zeros(0, dtype=self.dtype)
+        return self._memmap(int(entry['shard']))[entry['offset']:entry['offset'] + entry['length']]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def info(self, i):
+        """
+        Return the sample rate, source and augmentation path of the i-th signal as a dict.
+        """
+        entry = self.entries[i]
+        return {'sr': int(entry['sr']), 'source': self.sources[entry['source']], 'path': self.paths[entry['path']]}
+
+    def get(self, source: str, path: str = ''):
+        """
+        Return the signal augmented from source along an augmentation path. If the same signal was stored more than once, the last one is returned.
+        """
+        if self._lookup is None:
+            self._lookup = {(int(entry['source']), int(entry['path'])): i for i, entry in enumerate(self.entries)}
+        try:
+            return self[self._lookup[self._source_ids[source], self._path_ids[path]]]
+        except KeyError:
+            raise KeyError((source, path))
+
+    def _memmap(self, shard):
+        if shard not in self._shards:
+            self._shards[shard] = np.memmap(os.path.join(self.directory, _shard_name(shard)), dtype=self.dtype, mode='r')
+        return self._shards[shard]
+
+
+def _shard_name(shard):
+    return 'shard-{0:05d}.bin'.format(shard)
+
+
+def _read_strings(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {line[:-1]: i for i, line in enumerate(f) if line.endswith('\n')}
+
+
+def _truncate_partial_line(path):
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        content = f.read()
+        f.truncate(content.rfind(b'\n') + 1)
+
+
+def _encode(signal, dtype):
+    if dtype == np.int16:
+        return np.round(np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    return np.asarray(signal, dtype=np.float32)
@@ -0,0 +1,190 @@
+"""
+Throughput benchmarks for AudAugio's augmentations and chains.
+
+Every case augments a synthetic clip and reports samples per second (of input audio) and the peak resident memory of the process that ran it. Each
+case runs in a forked child process where the platform allows it, so that peak memory is measured per case.
+
+::
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --quick --compare results.json
+
+Cases that need SoX are skipped when the sox binary can't be found, or when --no-sox is passed. Nothing is downloaded.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audaugio  # noqa: E402
+
+SAMPLE_RATES = (16000, 22050, 44100)
+LENGTHS = (1, 10, 60)
+FULL_LENGTHS = (1, 10, 60, 600)
+DTYPES = ('float32', 'float64')
+DEPTHS = (1, 2, 4, 6)
+
+
+def augmentations(sox):
+    """
+    Return the built-in augmentations to benchmark, by name.
+    """
+    cases = {
+        'BackgroundNoiseAugmentation': lambda: audaugio.BackgroundNoiseAugmentation(.005),
+        'BackgroundNoiseAugmentation[pink]': lambda: audaugio.BackgroundNoiseAugmentation(.005, color='pink'),
+        'BackgroundNoiseAugmentation[pink bank]': lambda: audaugio.BackgroundNoiseAugmentation(.005, color='pink', bank_size=2 ** 22),
+        'EqualizerAugmentation': lambda: audaugio.EqualizerAugmentation(800, .15, -15),
+        'LowPassAugmentation': lambda: audaugio.LowPassAugmentation(4000, .7, 2),
+        'HighPassAugmentation': lambda: audaugio.HighPassAugmentation(200, .7, 2),
+        'PitchShiftAugmentation': lambda: audaugio.PitchShiftAugmentation(2),
+        'PitchShiftAugmentation[wsola]': lambda: audaugio.PitchShiftAugmentation(2, engine='wsola'),
+        'TimeStretchAugmentation': lambda: audaugio.TimeStretchAugmentation(1.1),
+        'TimeStretchAugmentation[wsola]': lambda: audaugio.TimeStretchAugmentation(1.1, engine='wsola'),
+        'WindowingAugmentation': lambda: audaugio.WindowingAugmentation(1, .5),
+        'PitchShiftSweepAugmentation': lambda: audaugio.PitchShiftSweepAugmentation([-2, -1, 1, 2]),
+        'TimeStretchSweepAugmentation': lambda: audaugio.TimeStretchSweepAugmentation([.9, .95, 1.05]),
+        'EqualizerSweepAugmentation': lambda: audaugio.EqualizerSweepAugmentation(800, .15, [-15, -5, 5, 15]),
+    }
+    if sox:
+        cases['EqualizerAugmentation[sox]'] = lambda: audaugio.EqualizerAugmentation(800, .15, -15, backend='sox')
+        cases['LowPassAugmentation[sox]'] = lambda: audaugio.LowPassAugmentation(4000, .7, 2, backend='sox')
+    return cases
+
+
+def chain_steps(depth, sox):
+    # cycle through cheap augmentations so that deep combinatoric chains stay affordable
+    steps = [lambda: audaugio.BackgroundNoiseAugmentation(.005),
+             lambda: audaugio.EqualizerAugmentation(800, .15, -15, backend='sox' if sox else 'native'),
+             lambda: audaugio.LowPassAugmentation(4000, .7, 2),
+             lambda: audaugio.HighPassAugmentation(200, .7, 2)]
+    return [steps[i % len(steps)]() for i in range(depth)]
+
+
+def build_cases(args):
+    sox = not args.no_sox and shutil.which('sox') is not None
+    lengths = (1,) if args.quick else FULL_LENGTHS if args.full else LENGTHS
+    sample_rates = (22050,) if args.quick else SAMPLE_RATES
+    dtypes = ('float32',) if args.quick else DTYPES
+    depths = (1, 4) if args.quick else DEPTHS
+
+    cases = []
+    for name, factory in augmentations(sox).items():
+        for sr in sample_rates:
+            for seconds in lengths:
+                for dtype in dtypes:
+                    cases.append(('augmentation/{0}/sr={1}/len={2}s/{3}'.format(name, sr, seconds, dtype),
+                                  lambda factory=factory: factory().augment, sr, seconds, dtype))
+
+    chains = {'LinearChain': audaugio.LinearChain, 'CombinatoricChain': audaugio.CombinatoricChain, 'FlatChain': audaugio.FlatChain}
+    for name, chain in chains.items():
+        for depth in depths:
+            for sox_steps in ((False, True) if sox else (False,)):
+                for seconds in lengths:
+                    cases.append(('chain/{0}{1}/depth={2}/sr=22050/len={3}s/float32'.format(name, '[sox]' if sox_steps else '', depth, seconds),
+                                  lambda chain=chain, depth=depth, sox_steps=sox_steps: chain(*chain_steps(depth, sox_steps)), 22050, seconds,
+                                  'float32'))
+
+    if args.filter:
+        cases = [case for case in cases if args.filter in case[0]]
+    return cases
+
+
+def run_case(make, sr, seconds, dtype, repeat):
+    """
+    Time a case and return (best time in seconds, peak RSS in bytes).
+    """
+    signal = np.random.RandomState(0).uniform(-.5, .5, int(sr * seconds)).astype(dtype)
+    augment = make()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        augment(signal, sr)
+        best = min(best, time.perf_counter() - start)
+    return best, peak_rss()
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def run_isolated(make, sr, seconds, dtype, repeat):
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return run_case(make, sr, seconds, dtype, repeat)
+
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+
+    def child():
+        try:
+            sender.send(run_case(make, sr, seconds, dtype, repeat))
+        except Exception as e:
+            sender.send(e)
+
+    process = context.Process(target=child)
+    process.start()
+    result = receiver.recv()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the names of cases that got slower than the baseline by more than threshold, as a fraction.
+    """
+    baseline = {case['name']: case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        previous = baseline.get(case['name'])
+        if previous is not None and case['samples_per_second'] < previous['samples_per_second'] * (1 - threshold):
+            regressions.append((case['name'], previous['samples_per_second'], case['samples_per_second']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='flag cases that are slower than in this JSON file of earlier results')
+    parser.add_argument('--threshold', type=float, default=.1, help='slowdown, as a fraction, that counts as a regression (default .1)')
+    parser.add_argument('--quick', action='store_true', help='one short clip, sample rate and dtype per case')
+    parser.add_argument('--full', action='store_true', help='include 10 minute clips')
+    parser.add_argument('--no-sox', action='store_true', help='skip cases that need SoX')
+    parser.add_argument('--filter', help='only run cases whose name contains this')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest counts (default 3)')
+    args = parser.parse_args(argv)
+
+    results = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'cases': []}
+    for name, make, sr, seconds, dtype in build_cases(args):
+        elapsed, rss = run_isolated(make, sr, seconds, dtype, args.repeat)
+        samples_per_second = sr * seconds / elapsed
+        results['cases'].append({'name': name, 'seconds': elapsed, 'samples_per_second': samples_per_second, 'peak_rss': rss})
+        print('{0:<75} {1:>14.0f} samples/s {2:>9.1f} MB'.format(name, samples_per_second, rss / 2 ** 20), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, before, after in regressions:
+            print('REGRESSION {0}: {1:.0f} -> {2:.0f} samples/s'.format(name, before, after))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Compare the engines of TimeStretchAugmentation and PitchShiftAugmentation in speed and in how far their output is from the librosa engine's.
+
+Every case augments a synthetic clip of harmonic tones with a little noise, and reports how long each engine took and the log-spectral distance, in
+dB, between the output of the 'wsola' engine and that of the 'librosa' engine. The distance between two runs of the librosa engine on clips with
+different noise is printed as well, as a reference for how much of it is noise.
+
+::
+
+    python benchmarks/engines.py
+    python benchmarks/engines.py --seconds 60 --sr 44100
+"""
+import argparse
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audaugio  # noqa: E402
+
+RATES = (.8, .9, 1.1, 1.25)
+STEPS = (-4, -1, 1, 3)
+
+
+def clip(sr, seconds, noise_seed=0):
+    """
+    Return a clip of harmonic tones that change every half second, with a little white noise. The tones are the same every time.
+    """
+    t = np.arange(int(sr * seconds)) / sr
+    fundamentals = np.repeat(np.random.RandomState(0).uniform(110, 440, int(np.ceil(seconds * 2))), sr // 2)[:len(t)]
+    phase = 2 * np.pi * np.cumsum(fundamentals) / sr
+    signal = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 6)) * .2
+    return (signal + np.random.RandomState(noise_seed).normal(0, .005, len(t))).astype(np.float32)
+
+
+def log_spectral_distance(a, b):
+    # root mean square difference of the dB magnitude spectra, ignoring everything 80 dB below the loudest bin
+    a, b = (np.abs(librosa.stft(signal, n_fft=2048)) for signal in (a, b))
+    n_frames = min(a.shape[1], b.shape[1])
+    floor = 1e-4 * max(a.max(), b.max())
+    a, b = (np.maximum(spectrum[:, :n_frames], floor) for spectrum in (a, b))
+    return float(np.sqrt(np.mean((20 * np.log10(a / b)) ** 2)))
+
+
+def timed(augmentation, signal, sr, repeat):
+    # the fastest of a few runs, and the output
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        augmented = augmentation.augment(signal, sr)[0]
+        best = min(best, time.perf_counter() - start)
+    return best, augmented
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sr', type=int, default=22050, help='sample rate of the clip (default 22050)')
+    parser.add_argument('--seconds', type=float, default=10., help='length of the clip in seconds (default 10)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest counts (default 3)')
+    args = parser.parse_args(argv)
+
+    signal = clip(args.sr, args.seconds)
+    cases = [('TimeStretchAugmentation({0})'.format(rate), lambda engine, rate=rate: audaugio.TimeStretchAugmentation(rate, engine=engine))
+             for rate in RATES]
+    cases += [('PitchShiftAugmentation({0})'.format(steps), lambda engine, steps=steps: audaugio.PitchShiftAugmentation(steps, engine=engine))
+              for steps in STEPS]
+
+    # the first call to librosa compiles its numba functions, which shouldn't count against it
+    audaugio.TimeStretchAugmentation(1.1).augment(signal[:args.sr], args.sr)
+    print('{0:<32} {1:>12} {2:>12} {3:>9} {4:>9}'.format('case', 'librosa (s)', 'wsola (s)', 'speedup', 'LSD (dB)'))
+    for name, make in cases:
+        librosa_time, expected = timed(make('librosa'), signal, args.sr, args.repeat)
+        wsola_time, augmented = timed(make('wsola'), signal, args.sr, args.repeat)
+        print('{0:<32} {1:>12.4f} {2:>12.4f} {3:>8.1f}x {4:>9.2f}'.format(name, librosa_time, wsola_time, librosa_time / wsola_time,
+                                                                       log_spectral_distance(augmented, expected)), flush=True)
+
+    reference = make('librosa').augment(clip(args.sr, args.seconds, noise_seed=1), args.sr)[0]
+    print('reference LSD between librosa outputs of clips with different noise: {0:.2f} dB'.format(log_spectral_distance(reference, expected)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
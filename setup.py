@@ -13,8 +13,11 @@ setuptools.setup(
     long_description_content_type="text/x-rst",
     url="https://github.com/BrianMargolis/AudAugio",
     packages=setuptools.find_packages(),
-    install_requires=['librosa', 'numpy', 'sox'],
-    python_requires='>=3.0',
+    install_requires=['librosa', 'numpy>=1.17', 'scipy', 'sox'],
+    entry_points={
+        'console_scripts': ['audaugio = audaugio.cli:main'],
+    },
+    python_requires='>=3.8',
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Programming Language :: Python :: 3",
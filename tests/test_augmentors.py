@@ -1,6 +1,12 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
 import unittest
 from typing import List
+from unittest import mock
 
+import librosa
 import numpy as np
 
 import audaugio
@@ -67,6 +73,7 @@ class TestWindowing(TestAugmentor):
         augmented = augmentor.augment(audio, sr)
         # print("{0}:\t{1}\t{2}".format(len_sec, int(expected_n_segments), len(augmented)))
         self.assertEqual(expected_n_segments, len(augmented))
+        self.assertEqual(augmentor.output_shape(len(audio), sr)[0], len(augmented))
 
     def test_returns_array(self):
         window_length = 5
@@ -76,6 +83,47 @@ class TestWindowing(TestAugmentor):
         augmented = augmentor.augment(self.audio, self.sr)
         self.assertIsInstance(augmented, List)
 
+    def test_windows_are_views(self):
+        augmentor = audaugio.WindowingAugmentation(1, .5, drop_last=True)
+        augmented = augmentor.augment(self.audio, self.sr)
+        for segment in augmented:
+            self.assertTrue(np.shares_memory(segment, self.audio))
+
+    def test_stacked(self):
+        sr = 100
+        audio = np.arange(1070, dtype=np.float32)
+        augmentor = audaugio.WindowingAugmentation(2, .5, stacked=True)
+        windows, last = augmentor.augment(audio, sr)
+        self.assertEqual(windows.shape, (18, 200))
+        self.assertTrue(np.shares_memory(windows, audio))
+        np.testing.assert_array_equal(windows[3], audio[150:350])
+        self.assertEqual(last.shape, (1, 200))
+        np.testing.assert_array_equal(last[0, :170], audio[900:])
+        np.testing.assert_array_equal(last[0, 170:], 0)
+        self.assertEqual(windows.dtype, np.float32)
+        self.assertEqual(last.dtype, np.float32)
+
+    def test_stacked_matches_list(self):
+        listed = audaugio.WindowingAugmentation(.3, .1).augment(self.audio, self.sr)
+        stacked = audaugio.WindowingAugmentation(.3, .1, stacked=True).augment(self.audio, self.sr)
+        np.testing.assert_array_equal(np.stack(listed), np.concatenate(stacked))
+
+    def test_fractional_lengths(self):
+        augmentor = audaugio.WindowingAugmentation(.25, .125, drop_last=True)
+        augmented = augmentor.augment(np.zeros(1000), 1000)
+        self.assertEqual(len(augmented), 7)
+        self.assertEqual(len(augmented[0]), 250)
+
+    def test_streamer(self):
+        for drop_last in (False, True):
+            augmentor = audaugio.WindowingAugmentation(.3, .2, drop_last=drop_last)
+            streamer = augmentor.streamer(self.sr)
+            streamed = [window for block in np.array_split(self.audio, 17) for window in streamer.push(block)] + streamer.finish()
+            augmented = augmentor.augment(self.audio, self.sr)
+            self.assertEqual(len(streamed), len(augmented))
+            for window, expected in zip(streamed, augmented):
+                np.testing.assert_array_equal(window, expected)
+
 
 class TestBackgroundNoise(TestAugmentor):
     def setUp(self):
@@ -91,6 +139,65 @@ class TestBackgroundNoise(TestAugmentor):
         augmented = self.augmentor.augment(self.audio, self.sr)
         self.assertIsInstance(augmented, List)
 
+    def test_batch(self):
+        signals = [self.audio, self.audio[:100], self.audio[:2000].reshape(2, -1)]
+        augmented = self.augmentor.augment_batch(signals, self.sr)
+        self.assertEqual(len(augmented), len(signals))
+        for signal, outputs in zip(signals, augmented):
+            self.assertEqual(len(outputs), 1)
+            self.assertEqual(outputs[0].shape, signal.shape)
+            self.assertLess(np.max(np.abs(outputs[0] - signal)), self.amplitude * 10)
+
+    def test_padded_batch(self):
+        augmented = self.augmentor.augment_batch(np.zeros((3, 1000)), self.sr)
+        self.assertEqual([outputs[0].shape for outputs in augmented], [(1000,)] * 3)
+
+    def test_seed(self):
+        silence = np.zeros(1000)
+        noise = audaugio.BackgroundNoiseAugmentation(self.amplitude, seed=3).augment(silence, self.sr)[0]
+        np.testing.assert_array_equal(audaugio.BackgroundNoiseAugmentation(self.amplitude, seed=3).augment(silence, self.sr)[0], noise)
+        self.assertFalse(np.allclose(audaugio.BackgroundNoiseAugmentation(self.amplitude, seed=4).augment(silence, self.sr)[0], noise))
+
+        # every worker process draws noise of its own, and the same noise every time with a seed
+        workers = [audaugio.BackgroundNoiseAugmentation(self.amplitude, seed=3).for_worker(i).augment(silence, self.sr)[0] for i in range(2)]
+        self.assertFalse(np.allclose(workers[0], workers[1]))
+        np.testing.assert_array_equal(workers[1], audaugio.BackgroundNoiseAugmentation(self.amplitude, seed=3).for_worker(1).augment(silence, self.sr)[0])
+
+    def test_colors(self):
+        for color in ('white', 'pink', 'brown'):
+            noise = audaugio.BackgroundNoiseAugmentation(self.amplitude, color=color).augment(np.zeros(2 ** 16), self.sr)[0]
+            self.assertAlmostEqual(np.std(noise), self.amplitude, delta=self.amplitude / 10)
+            power = np.abs(np.fft.rfft(noise)) ** 2
+            # power per octave is flat for pink noise, falls for brown noise and rises for white noise
+            octaves = [np.sum(power[2 ** i:2 ** (i + 1)]) for i in (8, 14)]
+            ratio = octaves[1] / octaves[0]
+            self.assertTrue({'white': ratio > 16, 'pink': .25 < ratio < 4, 'brown': ratio < 1 / 16}[color], (color, ratio))
+
+    def test_bank(self):
+        augmentor = audaugio.BackgroundNoiseAugmentation((.1, .2), bank_size=1000, seed=0)
+        noise = augmentor.augment(np.zeros(2500), self.sr)[0]
+        bank = augmentor._bank(np.dtype(np.float64))
+        # a segment of the bank starting anywhere in it and wrapping around, scaled by a gain from the range
+        segments = [bank.take(np.arange(offset, offset + len(noise)), mode='wrap') for offset in range(len(bank))]
+        matches = [noise[0] / segment[0] for segment in segments if np.allclose(noise, noise[0] / segment[0] * segment)]
+        self.assertEqual(len(matches), 1)
+        self.assertTrue(.1 <= matches[0] <= .2)
+
+    def test_recording(self):
+        directory = tempfile.mkdtemp()
+        try:
+            recording = np.random.uniform(-1, 1, 3000).astype(np.float32)
+            np.save(os.path.join(directory, 'crowd.npy'), recording)
+            augmentor = audaugio.BackgroundRecordingAugmentation(os.path.join(directory, 'crowd.npy'), gain=.5)
+            signal = np.random.uniform(-1, 1, (2, 5000))
+            augmented = augmentor.augment_batch(signal, self.sr)
+            for row, outputs in zip(signal, augmented):
+                mixed = (outputs[0] - row) * 2
+                offset = int(np.argmin(np.abs(recording - mixed[0])))
+                np.testing.assert_allclose(mixed, recording.take(np.arange(offset, offset + len(mixed)), mode='wrap'), atol=1e-6)
+        finally:
+            shutil.rmtree(directory)
+
 
 class TestTimeStretch(TestAugmentor):
     def test_speed_up(self):
@@ -132,7 +239,7 @@ class TestPitchShift(TestAugmentor):
 
 class TestEqualizer(TestAugmentor):
     def test_gain_up(self):
-        freq = 16000
+        freq = 7500  # stays below the nyquist frequency of the lowest mocked sample rate
         q = .1
         gain = 1
         augmentor = audaugio.EqualizerAugmentation(freq, q, gain)
@@ -208,5 +315,339 @@ class TestHighPass(TestAugmentor):
         self.assertIsInstance(augmented, List)
 
 
+class TestFilterBackends(TestAugmentor):
+    def setUp(self):
+        super().setUp()
+        # keep the signal well inside [-1, 1] so SoX never clips it
+        self.audio = (self.audio - .5) * .5
+
+    def test_native_filters_skip_sox(self):
+        with mock.patch('sox.Transformer') as transformer:
+            for filter_type in (audaugio.LowPassAugmentation, audaugio.HighPassAugmentation):
+                self.assertIsNone(filter_type(4000, .7, 2).transformer)
+            self.assertIsNone(audaugio.EqualizerAugmentation(800, .15, 3).transformer)
+            transformer.assert_not_called()
+            audaugio.EqualizerAugmentation(800, .15, 3, backend='sox')
+            transformer.assert_called_once_with()
+
+    def test_flat_equalizer_is_identity(self):
+        augmentor = audaugio.EqualizerAugmentation(800, .15, 0)
+        augmented = augmentor.augment(self.audio, self.sr)
+        np.testing.assert_allclose(augmented[0], self.audio)
+
+    def test_frequency_above_nyquist(self):
+        augmentor = audaugio.LowPassAugmentation(self.sr, .7, 2)
+        with self.assertRaises(ValueError):
+            augmentor.augment(self.audio, self.sr)
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            audaugio.EqualizerAugmentation(800, .15, 1, backend='matlab')
+
+    def test_batch_matches_single(self):
+        augmentor = audaugio.EqualizerAugmentation(800, .15, -15)
+        signals = [self.audio, self.audio[:1000], self.audio[500:3000]]
+        for signal, outputs in zip(signals, augmentor.augment_batch(signals, self.sr)):
+            np.testing.assert_allclose(outputs[0], augmentor.augment(signal, self.sr)[0])
+
+        padded = np.stack([self.audio, self.audio[::-1]])
+        for signal, outputs in zip(padded, augmentor.augment_batch(padded, self.sr)):
+            np.testing.assert_allclose(outputs[0], augmentor.augment(signal, self.sr)[0])
+
+    @unittest.skipIf(shutil.which('sox') is None, "SoX is not installed")
+    def test_native_matches_sox(self):
+        parameters = [(audaugio.EqualizerAugmentation, (800, .15, -15)),
+                      (audaugio.EqualizerAugmentation, (4000, 2, 6)),
+                      (audaugio.LowPassAugmentation, (1200, .7, 1)),
+                      (audaugio.LowPassAugmentation, (1200, .7, 2)),
+                      (audaugio.HighPassAugmentation, (300, .5, 1)),
+                      (audaugio.HighPassAugmentation, (300, .5, 2))]
+        for augmentation, args in parameters:
+            native = augmentation(*args).augment(self.audio, self.sr)[0]
+            reference = augmentation(*args, backend='sox').augment(self.audio, self.sr)[0]
+            np.testing.assert_allclose(native, reference, atol=1e-4, err_msg=augmentation.__name__)
+
+    @unittest.skipIf(shutil.which('sox') is None, "SoX is not installed")
+    def test_sox_file_matches_sox_pipe(self):
+        piped = audaugio.EqualizerAugmentation(800, .15, -15, backend='sox').augment(self.audio, self.sr)[0]
+        filed = audaugio.EqualizerAugmentation(800, .15, -15, backend='sox-file').augment(self.audio, self.sr)[0]
+        np.testing.assert_array_equal(piped, filed)
+
+    @unittest.skipIf(shutil.which('sox') is None, "SoX is not installed")
+    def test_sox_concurrent_calls(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        augmentors = [audaugio.EqualizerAugmentation(200 * (i + 1), 1, -6, backend=backend)
+                      for i in range(4) for backend in ('sox', 'sox-file')]
+        with ThreadPoolExecutor(max_workers=len(augmentors)) as executor:
+            concurrent = list(executor.map(lambda a: a.augment(self.audio, self.sr)[0], augmentors))
+        for augmentor, augmented in zip(augmentors, concurrent):
+            np.testing.assert_array_equal(augmented, augmentor.augment(self.audio, self.sr)[0])
+
+
+class TestSweeps(TestAugmentor):
+    def setUp(self):
+        super().setUp()
+        # short, since these compare against librosa for every variant
+        self.audio = self.audio[:2 * self.sr]
+
+    def test_pitch_shift_sweep(self):
+        augmented = audaugio.PitchShiftSweepAugmentation([-2, 1]).augment(self.audio, self.sr)
+        self.assertEqual(len(augmented), 2)
+        for steps, a in zip([-2, 1], augmented):
+            np.testing.assert_allclose(a, librosa.effects.pitch_shift(self.audio, sr=self.sr, n_steps=steps), atol=1e-6)
+
+    def test_time_stretch_sweep(self):
+        augmented = audaugio.TimeStretchSweepAugmentation([.9, 1.05]).augment(self.audio, self.sr)
+        self.assertEqual(len(augmented), 2)
+        for rate, a in zip([.9, 1.05], augmented):
+            np.testing.assert_allclose(a, librosa.effects.time_stretch(self.audio, rate=rate), atol=1e-6)
+
+    def test_equalizer_sweep(self):
+        augmented = audaugio.EqualizerSweepAugmentation(800, .15, [-15, 5]).augment(self.audio, self.sr)
+        self.assertEqual(len(augmented), 2)
+        for gain, a in zip([-15, 5], augmented):
+            np.testing.assert_allclose(a, audaugio.EqualizerAugmentation(800, .15, gain).augment(self.audio, self.sr)[0])
+
+    def test_sweep_in_chain(self):
+        chain = audaugio.CombinatoricChain(audaugio.PitchShiftSweepAugmentation([-1, 1]), audaugio.TimeStretchAugmentation(1.25), spectral=True)
+        augmented = chain(self.audio, self.sr)
+        self.assertEqual(len(augmented), 6)
+        self.assertEqual(chain.explain(len(self.audio), self.sr).splitlines()[-1].split(', ')[-1], '6 augmented signals')
+
+
+class TestCache(TestAugmentor):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_memory_hit(self):
+        augmentor = audaugio.CachedAugmentation(audaugio.LowPassAugmentation(4000, .7, 2))
+        first = augmentor.augment(self.audio, self.sr)
+        second = augmentor.augment(self.audio.copy(), self.sr)
+        self.assertIs(first[0], second[0])
+        self.assertEqual((augmentor.cache.hits, augmentor.cache.misses), (1, 1))
+        self.assertFalse(first[0].flags.writeable)
+        self.assertTrue(self.audio.flags.writeable)
+
+    def test_key_includes_every_element_of_array_parameters(self):
+        gains = np.ones(2000)
+        changed = gains.copy()
+        changed[1000] = 2
+        # numpy abbreviates both arrays to the same repr
+        self.assertEqual(repr(gains), repr(changed))
+        self.assertNotEqual(audaugio.augmentation.cache.cache_key(Gains(gains), self.audio, self.sr),
+                            audaugio.augmentation.cache.cache_key(Gains(changed), self.audio, self.sr))
+        self.assertEqual(audaugio.augmentation.cache.cache_key(Gains(gains), self.audio, self.sr),
+                         audaugio.augmentation.cache.cache_key(Gains(gains.copy()), self.audio, self.sr))
+
+    def test_key_includes_parameters(self):
+        cache = audaugio.AugmentationCache()
+        low = audaugio.CachedAugmentation(audaugio.LowPassAugmentation(4000, .7, 2), cache).augment(self.audio, self.sr)
+        lower = audaugio.CachedAugmentation(audaugio.LowPassAugmentation(2000, .7, 2), cache).augment(self.audio, self.sr)
+        self.assertFalse(np.array_equal(low[0], lower[0]))
+        self.assertEqual(cache.misses, 2)
+
+    def test_stochastic_augmentations_are_not_cached(self):
+        augmentor = audaugio.CachedAugmentation(audaugio.BackgroundNoiseAugmentation(.005))
+        first = augmentor.augment(self.audio, self.sr)
+        second = augmentor.augment(self.audio, self.sr)
+        self.assertFalse(np.array_equal(first[0], second[0]))
+        self.assertEqual(augmentor.cache.hits + augmentor.cache.misses, 0)
+
+    def test_memory_eviction(self):
+        cache = audaugio.AugmentationCache(max_bytes=int(self.audio.nbytes * 1.5))
+        augmentor = audaugio.CachedAugmentation(audaugio.LowPassAugmentation(4000, .7, 2), cache)
+        augmentor.augment(self.audio, self.sr)
+        augmentor.augment(self.audio[::-1], self.sr)
+        augmentor.augment(self.audio, self.sr)
+        self.assertEqual(cache.misses, 3)
+
+    def test_disk_tier(self):
+        augmentation = audaugio.EqualizerAugmentation(800, .15, -15)
+        expected = audaugio.CachedAugmentation(augmentation, audaugio.AugmentationCache(directory=self.directory)).augment(self.audio, self.sr)
+
+        cache = audaugio.AugmentationCache(max_bytes=0, directory=self.directory)
+        augmented = audaugio.CachedAugmentation(augmentation, cache).augment(self.audio, self.sr)
+        self.assertEqual(cache.hits, 1)
+        self.assertIsInstance(augmented[0], np.memmap)
+        np.testing.assert_array_equal(augmented[0], expected[0])
+
+    def test_disk_eviction(self):
+        cache = audaugio.AugmentationCache(max_bytes=0, directory=self.directory, max_disk_bytes=int(self.audio.nbytes * 2.5))
+        augmentor = audaugio.CachedAugmentation(audaugio.LowPassAugmentation(4000, .7, 2), cache)
+        for i in range(4):
+            augmentor.augment(self.audio + i, self.sr)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_chain(self):
+        cache = audaugio.AugmentationCache()
+        chain = audaugio.CombinatoricChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.BackgroundNoiseAugmentation(.005),
+                                           audaugio.HighPassAugmentation(100, .7), cache=cache)
+        chain(self.audio, self.sr)
+        chain(self.audio, self.sr)
+        self.assertEqual(cache.hits, 3)
+
+
+class TestDtypes(TestAugmentor):
+    def augmentations(self):
+        return [audaugio.BackgroundNoiseAugmentation(.005), audaugio.WindowingAugmentation(1, .5), audaugio.WindowingAugmentation(1, .5, stacked=True),
+                audaugio.LowPassAugmentation(4000, .7, 2), audaugio.HighPassAugmentation(100, .7), audaugio.EqualizerAugmentation(800, .15, -15),
+                audaugio.EqualizerSweepAugmentation(800, .15, [-15, 15]), audaugio.PitchShiftSweepAugmentation([-1, 1]),
+                audaugio.TimeStretchSweepAugmentation([.9, 1.1])]
+
+    def test_input_dtype_is_kept(self):
+        for dtype in (np.float32, np.float64):
+            audio = self.audio[:self.sr].astype(dtype)
+            for augmentation in self.augmentations():
+                for augmented in augmentation.augment(audio, self.sr) + augmentation.augment_batch([audio, audio[:self.sr // 2]], self.sr)[1]:
+                    self.assertEqual(augmented.dtype, dtype, augmentation)
+                for augmented in augmentation.augment_batch(np.stack([audio, audio]), self.sr)[0]:
+                    self.assertEqual(augmented.dtype, dtype, augmentation)
+
+    def test_integer_input(self):
+        audio = (self.audio[:self.sr] * 1000).astype(np.int16)
+        self.assertEqual(audaugio.LowPassAugmentation(4000, .7).augment(audio, self.sr)[0].dtype, np.float32)
+        self.assertEqual(audaugio.BackgroundNoiseAugmentation(.005).augment(audio, self.sr)[0].dtype, np.float32)
+
+    def test_no_extra_allocations(self):
+        audio = self.audio.astype(np.float32)
+        for augmentation in (audaugio.LowPassAugmentation(4000, .7, 2), audaugio.EqualizerSweepAugmentation(800, .15, [-15, 15]),
+                             audaugio.WindowingAugmentation(1, .5), audaugio.BackgroundNoiseAugmentation(.005)):
+            augmentation.augment(audio, self.sr)
+            tracemalloc.start()
+            try:
+                augmented = augmentation.augment(audio, self.sr)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            # nothing but the augmented signals themselves, and windows are views
+            self.assertLess(peak, sum(a.nbytes for a in augmented if a.base is None) + audio.nbytes // 20, augmentation)
+
+    def test_chain_dtype(self):
+        chain = audaugio.CombinatoricChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.BackgroundNoiseAugmentation(.005),
+                                           audaugio.WindowingAugmentation(1, .5), Upcast())
+        for augmented in chain(self.audio.astype(np.float32), self.sr):
+            self.assertEqual(augmented.dtype, np.float32)
+        chain.dtype = np.float32
+        for augmented in chain(self.audio, self.sr):
+            self.assertEqual(augmented.dtype, np.float32)
+        stream = audaugio.LinearChain(audaugio.LowPassAugmentation(4000, .7, 2), dtype=np.float32).stream(np.array_split(self.audio, 3), self.sr)
+        for blocks in stream:
+            self.assertEqual(blocks[0].dtype, np.float32)
+
+
+class Gains(audaugio.AugmentationBase):
+    def __init__(self, gains):
+        super().__init__(replaces=False)
+        self.gains = gains
+
+    def augment(self, signal, sr):
+        return [signal * self.gains[0]]
+
+
+class Upcast(audaugio.AugmentationBase):
+    def __init__(self):
+        super().__init__(replaces=False)
+
+    def augment(self, signal, sr):
+        return [signal.astype(np.float64)]
+
+
+class TestWsola(TestAugmentor):
+    def setUp(self):
+        super().setUp()
+        self.sr = 16000
+        self.sine = np.sin(2 * np.pi * 440 * np.arange(self.sr * 2) / self.sr).astype(np.float32)
+
+    def peak_frequency(self, signal):
+        return np.argmax(np.abs(np.fft.rfft(signal[:self.sr] * np.hanning(self.sr))))
+
+    def test_time_stretch(self):
+        for rate in [.8, 1.25]:
+            augmented = audaugio.TimeStretchAugmentation(rate, engine='wsola').augment(self.sine, self.sr)
+            self.assertEqual(len(augmented), 1)
+            self.assertEqual(len(augmented[0]), int(round(len(self.sine) / rate)))
+            self.assertEqual(augmented[0].dtype, np.float32)
+            self.assertEqual(self.peak_frequency(augmented[0]), 440)
+
+    def test_unit_rate_is_identity(self):
+        np.testing.assert_allclose(audaugio.TimeStretchAugmentation(1, engine='wsola').augment(self.sine, self.sr)[0], self.sine, atol=1e-6)
+
+    def test_pitch_shift(self):
+        for steps in [-3, 2]:
+            augmented = audaugio.PitchShiftAugmentation(steps, engine='wsola').augment(self.sine, self.sr)[0]
+            self.assertEqual(len(augmented), len(self.sine))
+            self.assertAlmostEqual(self.peak_frequency(augmented), 440 * 2 ** (steps / 12), delta=1)
+
+    def test_engine(self):
+        self.assertTrue(audaugio.PitchShiftAugmentation(2).spectral)
+        self.assertFalse(audaugio.PitchShiftAugmentation(2, engine='wsola').spectral)
+        with self.assertRaises(ValueError):
+            audaugio.TimeStretchAugmentation(1.1, engine='rubberband')
+
+
+class TestSampled(TestAugmentor):
+    def test_draw(self):
+        augmentation = audaugio.SampledAugmentation(audaugio.EqualizerAugmentation, {'frequency': (200., 400.), 'resonance': [.5, 1], 'gain': (-2, 2)})
+        generator = np.random.default_rng(0)
+        for _ in range(20):
+            equalizer = augmentation.draw(generator)
+            self.assertTrue(200 <= equalizer.frequency <= 400)
+            self.assertIn(equalizer.resonance, [.5, 1])
+            self.assertIn(equalizer.gain, range(-2, 3))
+        self.assertFalse(augmentation.replaces)
+
+    def test_seed(self):
+        distributions = {'frequency': (200., 4000.), 'resonance': 1, 'gain': 3}
+        a = audaugio.SampledAugmentation(audaugio.EqualizerAugmentation, distributions, seed=3).augment(self.audio, self.sr)
+        b = audaugio.SampledAugmentation(audaugio.EqualizerAugmentation, distributions, seed=3).augment(self.audio, self.sr)
+        np.testing.assert_array_equal(a[0], b[0])
+
+
+class TestMultichannel(TestAugmentor):
+    def setUp(self):
+        super().setUp()
+        audio = self.audio - .5
+        self.audio = np.stack([audio, audio[::-1], -audio])
+
+    def test_windows_keep_channels(self):
+        hop = int(round(self.sr * .5))
+        windows = audaugio.WindowingAugmentation(1, .5).augment(self.audio, self.sr)
+        for i, window in enumerate(windows[:-1]):
+            np.testing.assert_array_equal(window, self.audio[:, i * hop:i * hop + self.sr])
+        stacked = audaugio.WindowingAugmentation(1, .5, stacked=True).augment(self.audio, self.sr)
+        np.testing.assert_array_equal(stacked[0], np.stack(windows[:len(stacked[0])]))
+        self.assertEqual(stacked[-1].shape[1:], (3, self.sr))
+
+    def test_filter_matches_each_channel(self):
+        augmentor = audaugio.LowPassAugmentation(2000, .7, 2)
+        augmented = augmentor.augment(self.audio, self.sr)[0]
+        for channel, filtered in zip(self.audio, augmented):
+            np.testing.assert_allclose(filtered, augmentor.augment(channel, self.sr)[0])
+
+    def test_linked_noise(self):
+        silence = np.zeros((4, 2, self.sr))
+        linked = audaugio.BackgroundNoiseAugmentation((.1, 1), link_channels=True).augment(silence, self.sr)[0].std(axis=-1)
+        np.testing.assert_allclose(linked[:, 0], linked[:, 1], rtol=.05)
+        independent = audaugio.BackgroundNoiseAugmentation((.1, 1)).augment(silence, self.sr)[0].std(axis=-1)
+        self.assertFalse(np.allclose(independent[:, 0], independent[:, 1], rtol=.05))
+
+    def test_wsola_keeps_channels_aligned(self):
+        augmented = audaugio.TimeStretchAugmentation(1.25, engine='wsola').augment(self.audio, self.sr)[0]
+        self.assertEqual(augmented.shape, (3, int(round(self.audio.shape[1] / 1.25))))
+        np.testing.assert_allclose(augmented[2], -augmented[0])
+
+    @unittest.skipIf(shutil.which('sox') is None, "SoX is not installed")
+    def test_sox_channels(self):
+        native = audaugio.EqualizerAugmentation(800, .15, -15).augment(self.audio * .5, self.sr)[0]
+        reference = audaugio.EqualizerAugmentation(800, .15, -15, backend='sox').augment(self.audio * .5, self.sr)[0]
+        self.assertEqual(reference.shape, self.audio.shape)
+        np.testing.assert_allclose(native, reference, atol=1e-4)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,17 @@
+import asyncio
+import os
+import pickle
+import shutil
+import time
 import unittest
+from unittest import mock
 
+import librosa
 import numpy as np
 
 import audaugio
+from audaugio.augmentation.augmentation_base import FusedSoxAugmentation, SoxAugmentationBase
+from audaugio.chain.parallel import ProcessPool
 
 
 class TestChain(unittest.TestCase):
@@ -17,6 +26,43 @@ class TestChain(unittest.TestCase):
         return np.random.random(size=sr * len_sec)
 
 
+class Reverse(audaugio.AugmentationBase):
+    def __init__(self):
+        super().__init__(replaces=False)
+
+    def augment(self, signal, sr):
+        assert signal.ndim == 1
+        return [signal[::-1]]
+
+
+class Scale(audaugio.AugmentationBase):
+    commutes = True
+
+    def __init__(self, factor, cost_per_sample=1.):
+        super().__init__(replaces=False)
+        self.factor = factor
+        self.cost_per_sample = cost_per_sample
+
+    def augment(self, signal, sr):
+        return [signal * self.factor]
+
+
+class SlowScale(Scale):
+    def augment(self, signal, sr):
+        time.sleep(.01)
+        return super().augment(signal, sr)
+
+
+class FailOnNegative(audaugio.AugmentationBase):
+    def __init__(self):
+        super().__init__(replaces=False)
+
+    def augment(self, signal, sr):
+        if signal[0] < 0:
+            raise ValueError("negative")
+        return [signal * 2]
+
+
 class TestCombinatoricChain(TestChain):
     def setUp(self):
         super().setUp()
@@ -43,6 +89,258 @@ class TestCombinatoricChain(TestChain):
         augmented = chain(self.signal, self.sr)
         self.assertEqual(len(augmented), 2 ** 5)
 
+    def deterministic_chain(self):
+        return audaugio.CombinatoricChain(Reverse(),
+                                          audaugio.LowPassAugmentation(4000, .7, 2),
+                                          audaugio.WindowingAugmentation(1, .5),
+                                          audaugio.EqualizerAugmentation(300, 1, 2),
+                                          audaugio.HighPassAugmentation(100, .7))
+
+    def test_iter_augmented_depth_first(self):
+        chain = self.deterministic_chain()
+        augmented = chain(self.signal, self.sr)
+        iterated = chain.iter_augmented(self.signal, self.sr)
+        self.assertNotIsInstance(iterated, list)
+        iterated = list(iterated)
+        self.assertEqual(len(iterated), len(augmented))
+        self.assertEqual(sorted(np.sum(a) for a in iterated), sorted(np.sum(a) for a in augmented))
+
+    def test_iter_augmented_breadth_first(self):
+        chain = self.deterministic_chain()
+        augmented = chain(self.signal, self.sr)
+        iterated = list(chain.iter_augmented(self.signal, self.sr, order='breadth'))
+        self.assertEqual(len(iterated), len(augmented))
+        for a, b in zip(augmented, iterated):
+            np.testing.assert_array_equal(a, b)
+
+    def test_iter_augmented_is_lazy(self):
+        chain = audaugio.CombinatoricChain(*[audaugio.BackgroundNoiseAugmentation(.005) for _ in range(12)])
+        first = next(chain.iter_augmented(self.signal, self.sr))
+        np.testing.assert_array_equal(first, self.signal)
+
+    def test_acall(self):
+        chain = self.deterministic_chain()
+        signals = [self.signal, self.signal[:3 * self.sr]]
+
+        async def augment():
+            return await asyncio.gather(*[chain.acall(signal, self.sr) for signal in signals])
+
+        for signal, augmented in zip(signals, asyncio.run(augment())):
+            expected = chain(signal, self.sr)
+            self.assertEqual(len(augmented), len(expected))
+            for a, b in zip(expected, augmented):
+                np.testing.assert_array_equal(a, b)
+
+    def test_concurrent_acall_shares_pool(self):
+        chain = audaugio.CombinatoricChain(*self.deterministic_chain()._augmentations, n_jobs=2)
+        expected = self.deterministic_chain()(self.signal, self.sr)
+
+        async def augment():
+            return await asyncio.gather(*[chain.acall(self.signal, self.sr) for _ in range(8)])
+
+        def slow_pool(*args):
+            # widens the window in which other threads would start pools of their own
+            time.sleep(.1)
+            return ProcessPool(*args)
+
+        with mock.patch('audaugio.chain.chain_base.ProcessPool', side_effect=slow_pool) as pool, chain:
+            results = asyncio.run(augment())
+        self.assertEqual(pool.call_count, 1)
+        for augmented in results:
+            for a, b in zip(expected, augmented):
+                np.testing.assert_array_equal(a, b)
+
+    def test_aiter_augmented(self):
+        chain = self.deterministic_chain()
+
+        async def iterate():
+            return [signal async for signal in chain.aiter_augmented(self.signal, self.sr, order='breadth')]
+
+        iterated = asyncio.run(iterate())
+        self.assertEqual(len(iterated), len(chain(self.signal, self.sr)))
+        for a, b in zip(chain.iter_augmented(self.signal, self.sr, order='breadth'), iterated):
+            np.testing.assert_array_equal(a, b)
+
+    def test_process_pool(self):
+        expected = self.deterministic_chain()(self.signal, self.sr)
+        with audaugio.CombinatoricChain(*self.deterministic_chain()._augmentations, n_jobs=2) as chain:
+            augmented = chain(self.signal, self.sr)
+            self.assertIsNotNone(chain._pool)
+            augmented_again = chain(self.signal, self.sr)
+        self.assertIsNone(chain._pool)
+        self.assertEqual(len(augmented), len(expected))
+        for a, b, c in zip(expected, augmented, augmented_again):
+            np.testing.assert_array_equal(a, b)
+            np.testing.assert_array_equal(a, c)
+
+    @unittest.skipIf(not os.path.isdir('/dev/shm'), "shared memory isn't listed in /dev/shm")
+    def test_failing_task_frees_shared_memory(self):
+        blocks = set(os.listdir('/dev/shm'))
+        signals = [-np.ones(1000)] + [np.ones(1000)] * 7
+        with audaugio.FlatChain(FailOnNegative(), n_jobs=2) as chain:
+            with self.assertRaises(ValueError):
+                chain.augment_batch(signals, self.sr)
+        self.assertEqual(set(os.listdir('/dev/shm')) - blocks, set())
+
+    def test_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        expected = self.deterministic_chain()(self.signal, self.sr)
+        with ThreadPoolExecutor(2) as executor:
+            augmented = audaugio.CombinatoricChain(*self.deterministic_chain()._augmentations, executor=executor)(self.signal, self.sr)
+        for a, b in zip(expected, augmented):
+            np.testing.assert_array_equal(a, b)
+
+    def test_augment_batch(self):
+        chain = self.deterministic_chain()
+        signals = [self.signal, self.signal[:3 * self.sr]]
+        augmented = chain.augment_batch(signals, self.sr)
+        self.assertEqual(len(augmented), 2)
+        for signal, batch in zip(signals, augmented):
+            expected = chain(signal, self.sr)
+            self.assertEqual(len(batch), len(expected))
+            for a, b in zip(expected, batch):
+                np.testing.assert_allclose(a, b)
+
+    def test_reorder(self):
+        cheap, expensive, barrier, after = Scale(2), Scale(3, cost_per_sample=50), Reverse(), Scale(5, cost_per_sample=50)
+        chain = audaugio.CombinatoricChain(cheap, expensive, barrier, Scale(7), after, reorder=True)
+        steps = chain._steps()
+        self.assertEqual(steps[:3], [expensive, cheap, barrier])
+        self.assertIs(steps[3], after)
+
+        unordered = sorted(np.sum(a) for a in audaugio.CombinatoricChain(*chain._augmentations)(self.signal, self.sr))
+        reordered = sorted(np.sum(a) for a in chain(self.signal, self.sr))
+        np.testing.assert_allclose(unordered, reordered)
+
+    def test_reorder_with_measured_costs(self):
+        cheap, slow = Scale(2, cost_per_sample=50), SlowScale(3)
+        chain = audaugio.CombinatoricChain(cheap, slow, reorder=True, cache=audaugio.AugmentationCache())
+        self.assertIs(chain._steps()[0].augmentation, cheap)
+        chain.measure_costs(sr=1000)
+        self.assertIs(chain._steps()[0].augmentation, slow)
+        first = chain.explain(n_samples=1000, sr=1000).splitlines()[1]
+        self.assertIn('SlowScale', first)
+        self.assertLess(float(first.split()[-1]), 1000 * slow.cost_per_sample)
+
+    def test_reorder_for_signal_length(self):
+        # the same augmentation costs more per signal than per sample if the signals it returns are longer than the one it's given
+        class Pad(Scale):
+            def augment(self, signal, sr):
+                return [np.pad(signal, (0, 1000)) * self.factor]
+
+            def output_shape(self, n_samples, sr):
+                return 1, n_samples + 1000
+
+        pad, scale = Pad(2, cost_per_sample=2), Scale(3, cost_per_sample=1.5)
+        chain = audaugio.CombinatoricChain(scale, pad, reorder=True)
+        self.assertIs(chain._steps()[0], pad)
+        augmented = chain(self.signal[:1000], 1000)
+        self.assertIs(chain._steps()[0], scale)
+        self.assertEqual(sorted(len(a) for a in augmented), [1000, 1000, 2000, 2000])
+
+    def test_explain(self):
+        chain = audaugio.CombinatoricChain(Scale(2), Scale(3, cost_per_sample=50), audaugio.WindowingAugmentation(1, .5, drop_last=True), Scale(5),
+                                           reorder=True)
+        explanation = chain.explain(n_samples=5000, sr=1000)
+        self.assertIn('Scale(factor=3, cost_per_sample=50)', explanation.splitlines()[1])
+        self.assertEqual([int(line.split()[-2]) for line in explanation.splitlines()[1:-1]], [1, 2, 4, 36])
+        self.assertTrue(explanation.splitlines()[-1].startswith('43 augmentation calls'))
+        self.assertIn('72 augmented signals', explanation)
+        self.assertEqual(len(chain(self.signal[:5000], 1000)), 72)
+
+    def test_hooks(self):
+        chain = self.deterministic_chain()
+        calls = []
+        hook = chain.add_hook(calls.append)
+        augmented = chain(self.signal, self.sr)
+        self.assertEqual([call.n_calls for call in calls], [1, 2, 4, len(augmented) // 4, len(augmented) // 2])
+        self.assertEqual(calls[0].input_samples, len(self.signal))
+        self.assertEqual(calls[0].allocated_bytes, 0)  # reversing returns a view
+        self.assertEqual(calls[1].allocated_bytes, 2 * self.signal.nbytes)
+        self.assertLessEqual(calls[2].allocated_bytes, 4 * self.signal.itemsize * self.sr)  # windows are views, apart from a padded last one
+        self.assertTrue(all(call.wall_time >= 0 for call in calls))
+
+        chain.remove_hook(hook)
+        chain(self.signal, self.sr)
+        self.assertEqual(len(calls), 5)
+
+    def test_profile(self):
+        chain = self.deterministic_chain()
+        with chain.profile(file=False) as profile:
+            chain(self.signal, self.sr)
+            list(chain.iter_augmented(self.signal, self.sr))
+        self.assertEqual(chain._hooks, [])
+        self.assertEqual(len(profile.totals), 5)
+        self.assertEqual([totals['n_calls'] for totals in profile.totals.values()][:3], [2, 4, 8])
+        self.assertIn('LowPassAugmentation', profile.summary())
+
+    def test_non_replacing_sox_augmentations_are_not_fused(self):
+        chain = audaugio.CombinatoricChain(audaugio.EqualizerAugmentation(300, 1, 2, backend='sox'),
+                                           audaugio.LowPassAugmentation(8000, .7, 2, backend='sox'))
+        self.assertEqual(len(chain._compile()), 2)
+
+    def test_spectral_mode_shares_stft(self):
+        signal = np.random.normal(0, .1, 16000)
+        chain = audaugio.CombinatoricChain(audaugio.TimeStretchAugmentation(1.25), audaugio.PitchShiftAugmentation(2), spectral=True)
+        with mock.patch('librosa.stft', wraps=librosa.stft) as stft, mock.patch('librosa.istft', wraps=librosa.istft) as istft:
+            augmented = chain(signal, 8000)
+        # only the unaugmented signal is transformed, and only the augmented ones are transformed back
+        self.assertEqual(stft.call_count, 1)
+        self.assertEqual(istft.call_count, 3)
+        self.assertIs(augmented[0], signal)
+        self.assertEqual([len(a) for a in augmented], [16000, 12800, 16000, 12800])
+        self.assertEqual([len(a) for a in chain.iter_augmented(signal, 8000)], [16000, 16000, 12800, 12800])
+
+    def test_stream(self):
+        chain = audaugio.CombinatoricChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.EqualizerSweepAugmentation(300, 1, [-6, 6]),
+                                           audaugio.HighPassAugmentation(100, .7))
+        streamed = list(chain.stream(np.array_split(self.signal, 7), self.sr))
+        self.assertEqual(len(streamed), 7)
+        augmented = chain(self.signal, self.sr)
+        for i, signal in enumerate(augmented):
+            np.testing.assert_allclose(np.concatenate([blocks[i] for blocks in streamed]), signal)
+
+    def test_return_batch(self):
+        chain = self.deterministic_chain()
+        expected = chain(self.signal, self.sr)
+        chain.return_batch = True
+        batch = chain(self.signal, self.sr)
+        self.assertIsInstance(batch, audaugio.AugmentedBatch)
+        self.assertEqual(len(batch), len(expected))
+        for a, b in zip(expected, batch):
+            np.testing.assert_allclose(a, b)
+        self.assertTrue(all(np.shares_memory(signal, batch.buffer) for signal in batch))
+
+        # the first window of the reversed signal, not low-passed, then equalized and high-passed
+        applied = batch.provenance[13 * len(expected) // 16]
+        self.assertEqual([(step, name) for step, name, _, _ in applied],
+                         [(0, 'Reverse'), (2, 'WindowingAugmentation'), (3, 'EqualizerAugmentation'), (4, 'HighPassAugmentation')])
+        self.assertEqual(applied[1][2], {'window_length': 1, 'hop_size': .5, 'drop_last': False, 'stacked': False})
+        self.assertEqual(len(set(batch.paths())), len(batch))
+
+    def test_batch_consumes_signals(self):
+        signals = [np.arange(6.).reshape(2, 3)[:, ::2], np.ones(4)]
+        expected = [signal.copy() for signal in signals]
+        batch = audaugio.AugmentedBatch.from_signals(signals, consume=True)
+        self.assertEqual(signals, [None, None])
+        for a, b in zip(batch, expected):
+            np.testing.assert_array_equal(a, b)
+
+    def test_batch_slicing_and_transfer(self):
+        chain = audaugio.CombinatoricChain(Reverse(), audaugio.WindowingAugmentation(1, .5), return_batch=True)
+        batch = chain(self.signal, self.sr)
+        sliced = batch[2:5]
+        self.assertTrue(np.shares_memory(sliced.buffer, batch.buffer))
+        self.assertEqual(sliced.provenance, batch.provenance[2:5])
+        for a, b in zip(batch.to_list()[2:5], sliced):
+            np.testing.assert_array_equal(a, b)
+
+        for transferred in (pickle.loads(pickle.dumps(sliced)), audaugio.AugmentedBatch.from_shared_memory(sliced.to_shared_memory())):
+            self.assertEqual(transferred.paths(), sliced.paths())
+            for a, b in zip(sliced, transferred):
+                np.testing.assert_array_equal(a, b)
+
 
 class TestLinearChain(TestChain):
     def setUp(self):
@@ -70,11 +368,150 @@ class TestLinearChain(TestChain):
         augmented = chain(self.signal, self.sr)
         self.assertEqual(len(augmented), 1)
 
+    def test_stacked_windows(self):
+        chain = audaugio.LinearChain(audaugio.WindowingAugmentation(1, .5, drop_last=True, stacked=True),
+                                     audaugio.BackgroundNoiseAugmentation(.005),
+                                     audaugio.LowPassAugmentation(4000, .7, 2),
+                                     Reverse())
+        augmented = chain(self.signal, self.sr)
+        self.assertEqual(len(augmented), 1)
+        n_windows = (len(self.signal) - self.sr) // int(round(self.sr * .5)) + 1
+        self.assertEqual(augmented[0].shape, (n_windows, self.sr))
+
+    def test_iter_augmented(self):
+        chain = audaugio.LinearChain(audaugio.WindowingAugmentation(1, .5), Reverse(), audaugio.LowPassAugmentation(4000, .7, 2))
+        for a, b in zip(chain(self.signal, self.sr), chain.iter_augmented(self.signal, self.sr)):
+            np.testing.assert_array_equal(a, b)
+
+    def sox_filters(self):
+        return [audaugio.EqualizerAugmentation(300, 1, 2, backend='sox'),
+                audaugio.LowPassAugmentation(8000, .7, 2, backend='sox'),
+                audaugio.HighPassAugmentation(100, .7, 1, backend='sox'),
+                audaugio.EqualizerAugmentation(2000, .5, -4, backend='sox')]
+
+    def test_sox_augmentations_are_fused(self):
+        filters = self.sox_filters()
+        chain = audaugio.LinearChain(*filters, audaugio.BackgroundNoiseAugmentation(.005), audaugio.LowPassAugmentation(4000, .7))
+        steps = chain._compile()
+        self.assertEqual(len(steps), 3)
+        self.assertIsInstance(steps[0], FusedSoxAugmentation)
+        self.assertEqual(steps[0].transformer.effects, sum([f.transformer.effects for f in filters], []))
+
+    @unittest.skipIf(shutil.which('sox') is None, "SoX is not installed")
+    def test_fused_matches_sequential(self):
+        signal = (self.signal - .5) * .5
+        sequential = [signal]
+        for augmentation in self.sox_filters():
+            sequential = augmentation.augment(sequential[0], self.sr)
+        fused = audaugio.LinearChain(*self.sox_filters())(signal, self.sr)
+        np.testing.assert_array_equal(fused[0], sequential[0])
+
+    @unittest.skipIf(shutil.which('sox') is None, "SoX is not installed")
+    def test_fused_matches_sequential_float32(self):
+        signal = ((self.signal - .5) * .5).astype(np.float32)
+        sequential = [signal]
+        for augmentation in self.sox_filters():
+            sequential = augmentation.augment(sequential[0], self.sr)
+        fused = audaugio.LinearChain(*self.sox_filters())(signal, self.sr)
+        self.assertEqual(fused[0].dtype, np.float32)
+        self.assertEqual(sequential[0].dtype, np.float32)
+        np.testing.assert_allclose(fused[0], sequential[0], rtol=0, atol=1e-6)
+
+    def test_sox_processes_are_limited(self):
+        running = []
+
+        async def sox(args, samples):
+            running.append(running[-1] + 1 if running else 1)
+            await asyncio.sleep(.01)
+            running.append(running[-1] - 1)
+            return samples
+
+        chain = audaugio.LinearChain(audaugio.EqualizerAugmentation(300, 1, 2, backend='sox'), Reverse(), max_sox_processes=2)
+        signals = [(self.signal[:self.sr] - .5) * .5 for _ in range(6)]
+
+        async def augment():
+            return await chain.aaugment_batch(signals, self.sr)
+
+        with mock.patch.object(SoxAugmentationBase, '_sox_async', staticmethod(sox)):
+            augmented = asyncio.run(augment())
+        self.assertEqual(max(running), 2)
+        for signal, batch in zip(signals, augmented):
+            np.testing.assert_allclose(batch[0], signal[::-1], atol=1e-9)
+
+    @unittest.skipIf(shutil.which('sox') is None, "SoX is not installed")
+    def test_acall_runs_sox(self):
+        signal = (self.signal - .5) * .5
+        chain = audaugio.LinearChain(*self.sox_filters(), audaugio.WindowingAugmentation(1, .5))
+        expected = chain(signal, self.sr)
+        augmented = asyncio.run(chain.acall(signal, self.sr))
+        self.assertEqual(len(augmented), len(expected))
+        for a, b in zip(expected, augmented):
+            np.testing.assert_array_equal(a, b)
+
+    def test_spectral_mode_matches_librosa(self):
+        # float32, like librosa.load() returns, is where accumulating phases in the wrong precision shows; both match to within float rounding
+        for signal in [np.random.uniform(-.3, .3, 16000).astype(np.float32), np.random.normal(0, .1, 16000)]:
+            stretched = audaugio.LinearChain(audaugio.TimeStretchAugmentation(.8), spectral=True)(signal, 8000)
+            np.testing.assert_allclose(stretched[0], librosa.effects.time_stretch(signal, rate=.8), atol=1e-6)
+            shifted = audaugio.LinearChain(audaugio.PitchShiftAugmentation(-3), spectral=True)(signal, 8000)
+            np.testing.assert_allclose(shifted[0], librosa.effects.pitch_shift(signal, sr=8000, n_steps=-3), atol=1e-6)
+            self.assertEqual(shifted[0].dtype, signal.dtype)
+
+    def test_stream_windows(self):
+        chain = audaugio.LinearChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.WindowingAugmentation(1, .75), Reverse())
+        streamed = [window for windows in chain.stream(np.array_split(self.signal, 13), self.sr) for window in windows]
+        augmented = chain(self.signal, self.sr)
+        self.assertEqual(len(streamed), len(augmented))
+        for window, signal in zip(streamed, augmented):
+            np.testing.assert_allclose(window, signal)
+
+    def test_stream_needs_whole_signal(self):
+        chain = audaugio.LinearChain(audaugio.TimeStretchAugmentation(1.1), audaugio.WindowingAugmentation(1, .5))
+        with self.assertRaises(ValueError):
+            next(chain.stream(iter([self.signal]), self.sr))
+
+    def test_spectral_mode_with_cache(self):
+        with self.assertRaises(ValueError):
+            audaugio.LinearChain(audaugio.TimeStretchAugmentation(.8), audaugio.PitchShiftAugmentation(2), spectral=True,
+                                 cache=audaugio.AugmentationCache())
+
+    def test_spectral_mode_around_other_augmentations(self):
+        chain = audaugio.LinearChain(audaugio.TimeStretchAugmentation(1.25), audaugio.LowPassAugmentation(2000, .7),
+                                     audaugio.PitchShiftAugmentation(2), spectral=True)
+        augmented = chain(np.random.normal(0, .1, 16000), 8000)
+        self.assertEqual(len(augmented), 1)
+        self.assertIsInstance(augmented[0], np.ndarray)
+        self.assertEqual(len(augmented[0]), 12800)
+
 
 class TestFlatChain(TestChain):
     def setUp(self):
         super().setUp()
 
+    def test_augment_batch(self):
+        chain = audaugio.FlatChain(Reverse(), audaugio.WindowingAugmentation(1, .5), audaugio.LowPassAugmentation(4000, .7, 2))
+        signals = [self.signal, self.signal[:3 * self.sr]]
+        for signal, batch in zip(signals, chain.augment_batch(signals, self.sr)):
+            expected = chain(signal, self.sr)
+            self.assertEqual(len(batch), len(expected))
+            for a, b in zip(expected, batch):
+                np.testing.assert_allclose(a, b)
+
+    def test_return_batch(self):
+        chain = audaugio.FlatChain(Reverse(), audaugio.WindowingAugmentation(1, 1), return_batch=True)
+        batch = chain(self.signal, self.sr)
+        self.assertEqual(batch.paths(), ['0.0'] + ['1.{0}'.format(i) for i in range(self.len_sec)])
+
+    def test_executor_draws_for_every_task(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        signals = [np.zeros(1000), np.ones(1000), np.zeros(1000)]
+        with ProcessPoolExecutor(2) as executor:
+            augmented = audaugio.FlatChain(audaugio.BackgroundNoiseAugmentation(.1, seed=0), executor=executor).augment_batch(signals, self.sr)
+        noise = [outputs[0] - signal for outputs, signal in zip(augmented, signals)]
+        self.assertFalse(np.allclose(noise[0], noise[1]))
+        self.assertFalse(np.allclose(noise[0], noise[2]))
+
     def test_empty_chain(self):
         chain = audaugio.FlatChain()
         augmented = chain(self.signal, self.sr)
@@ -97,5 +534,117 @@ class TestFlatChain(TestChain):
         self.assertEqual(len(augmented), 5)
 
 
+class TestRandomChain(TestChain):
+    def test_seed(self):
+        def chain():
+            return audaugio.RandomChain(audaugio.BackgroundNoiseAugmentation(.01, seed=1), Reverse(), audaugio.LowPassAugmentation(4000, .7),
+                                        n_paths=3, seed=2)
+
+        a = chain()(self.signal, self.sr)
+        b = chain()(self.signal, self.sr)
+        self.assertEqual(len(a), 3)
+        for x, y in zip(a, b):
+            np.testing.assert_array_equal(x, y)
+
+    def test_certain_paths(self):
+        augmentations = [Scale(2), Reverse(), audaugio.WindowingAugmentation(1, 1)]
+        augmented = audaugio.RandomChain(*augmentations, probabilities=[1, 1, 1])(self.signal, self.sr)
+        expected = audaugio.LinearChain(*augmentations)(self.signal, self.sr)
+        self.assertEqual(len(augmented), len(expected))
+        for a, b in zip(expected, augmented):
+            np.testing.assert_array_equal(a, b)
+        self.assertEqual(len(audaugio.RandomChain(*augmentations, probabilities=[0, 0, 0], n_paths=4)(self.signal, self.sr)), 4)
+
+    def test_shared_prefixes_are_augmented_once(self):
+        chain = audaugio.RandomChain(Scale(2), Reverse(), Scale(3), probabilities=[1, 1, .5], n_paths=8, seed=0, return_batch=True)
+        calls = []
+        chain.add_hook(calls.append)
+        batch = chain(self.signal, self.sr)
+        self.assertEqual(len(batch), 8)
+        self.assertEqual(set(batch.paths()) | {'0.0/1.0', '0.0/1.0/2.0'}, {'0.0/1.0', '0.0/1.0/2.0'})
+        self.assertEqual([call.n_calls for call in calls], [1, 1, 1])
+
+    def test_invalid_probabilities(self):
+        with self.assertRaises(ValueError):
+            audaugio.RandomChain(Scale(2), Reverse(), probabilities=[.5])
+        with self.assertRaises(ValueError):
+            audaugio.RandomChain(Scale(2), probabilities=[2])
+
+    def test_workers_draw_different_paths(self):
+        chain = audaugio.RandomChain(*[Scale(2) for _ in range(8)], n_paths=4, seed=5)
+        self.assertNotEqual(chain.for_worker(0).draw_paths(), chain.for_worker(1).draw_paths())
+        self.assertEqual(chain.for_worker(0).draw_paths(), chain.for_worker(0).draw_paths())
+
+    def test_stream(self):
+        def chain():
+            return audaugio.RandomChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.EqualizerAugmentation(300, 1, 2),
+                                        audaugio.HighPassAugmentation(100, .7), n_paths=4, seed=3)
+
+        streamed = list(chain().stream(np.array_split(self.signal, 7), self.sr))
+        self.assertEqual(len(streamed), 7)
+        augmented = chain()(self.signal, self.sr)
+        for i, signal in enumerate(augmented):
+            np.testing.assert_allclose(np.concatenate([blocks[i] for blocks in streamed]), signal)
+
+    def test_stream_windows(self):
+        def chain():
+            return audaugio.RandomChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.WindowingAugmentation(1, .75), Reverse(), n_paths=4,
+                                        seed=0)
+
+        streamed = [window for windows in chain().stream(np.array_split(self.signal, 13), self.sr) for window in windows]
+        augmented = chain()(self.signal, self.sr)
+        self.assertEqual(len(streamed), len(augmented))
+        for window, signal in zip(sorted(streamed, key=lambda s: s[0]), sorted(augmented, key=lambda s: s[0])):
+            np.testing.assert_allclose(window, signal)
+        with self.assertRaises(ValueError):
+            next(audaugio.RandomChain(Reverse(), probabilities=[1]).stream(iter([self.signal]), self.sr))
+
+
+class TestMultichannel(TestChain):
+    def setUp(self):
+        super().setUp()
+        self.signal = np.stack([self.signal, self.signal[::-1]])
+
+    def test_channels_stay_together(self):
+        chain = audaugio.LinearChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.WindowingAugmentation(1, .5, stacked=True),
+                                     audaugio.BackgroundNoiseAugmentation(.005, link_channels=True), Reverse(), multichannel=True)
+        augmented = chain(self.signal, self.sr)
+        n_windows = (self.signal.shape[1] - self.sr) // int(round(self.sr * .5)) + 1
+        self.assertEqual(augmented[0].shape, (n_windows, 2, self.sr))
+
+    def test_matches_each_channel(self):
+        augmentations = [audaugio.EqualizerAugmentation(800, .15, -15), audaugio.WindowingAugmentation(1, .5), Reverse()]
+        augmented = audaugio.CombinatoricChain(*augmentations, multichannel=True)(self.signal, self.sr)
+        channels = [audaugio.CombinatoricChain(*augmentations)(channel, self.sr) for channel in self.signal]
+        self.assertEqual(len(augmented), len(channels[0]))
+        for signal, left, right in zip(augmented, *channels):
+            np.testing.assert_allclose(signal, np.stack([left, right]))
+
+    def test_process_pool(self):
+        with audaugio.LinearChain(audaugio.WindowingAugmentation(1, .5), Reverse(), multichannel=True, n_jobs=2) as chain:
+            augmented = chain.augment_batch([self.signal, self.signal[:, :self.sr * 3]], self.sr)
+        self.assertEqual(augmented[0][0].shape, (2, self.sr))
+        np.testing.assert_array_equal(augmented[1][0], self.signal[:, self.sr - 1::-1])
+
+    def test_stream(self):
+        chain = audaugio.LinearChain(audaugio.LowPassAugmentation(4000, .7, 2), audaugio.WindowingAugmentation(1, .75), multichannel=True)
+        streamed = [window for windows in chain.stream(np.array_split(self.signal, 13, axis=1), self.sr) for window in windows]
+        augmented = chain(self.signal, self.sr)
+        self.assertEqual(len(streamed), len(augmented))
+        for window, signal in zip(streamed, augmented):
+            np.testing.assert_allclose(window, signal)
+
+    def test_spectral_mode(self):
+        with self.assertRaises(ValueError):
+            audaugio.LinearChain(audaugio.PitchShiftAugmentation(2), multichannel=True, spectral=True)
+
+    def test_sampled_parameters_are_shared_by_channels(self):
+        sampled = audaugio.SampledAugmentation(Scale, {'factor': (.1, 1.)}, seed=0)
+        augmented = audaugio.LinearChain(sampled, multichannel=True)(self.signal, self.sr)
+        factors = augmented[-1] / self.signal
+        self.assertAlmostEqual(factors[0, 0], factors[1, 0])
+        self.assertNotAlmostEqual(factors[0, 0], 1.)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import scipy.io.wavfile
+
+import audaugio
+from audaugio import cli
+
+
+class TestParseChain(unittest.TestCase):
+    def test_parse(self):
+        chain = cli.parse_chain("CombinatoricChain(LowPassAugmentation(4000, .7, n_poles=2), audaugio.WindowingAugmentation(1, .5), reorder=True)")
+        self.assertIsInstance(chain, audaugio.CombinatoricChain)
+        self.assertTrue(chain.reorder)
+        self.assertEqual(chain._augmentations[0].n_poles, 2)
+        self.assertEqual(cli.parse_chain("LinearChain(EqualizerSweepAugmentation(800, 1, [-6, 6]))")._augmentations[0].gain, [-6, 6])
+
+    def test_rejects_code(self):
+        for spec in ("__import__('os').system('true')", "LinearChain(open('x'))", "LinearChain(*[])", "LowPassAugmentation(4000, .7)", "LinearChain("):
+            with self.assertRaises(ValueError):
+                cli.parse_chain(spec)
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, 'input')
+        self.output = os.path.join(self.directory, 'output')
+        os.makedirs(os.path.join(self.input, 'nested'))
+        for name in ('a.wav', 'b.wav', os.path.join('nested', 'c.wav')):
+            scipy.io.wavfile.write(os.path.join(self.input, name), 8000, np.random.normal(0, .1, 8000).astype(np.float32))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_cli(self, *args):
+        return cli.main([self.input, self.output, '--chain', 'CombinatoricChain(LowPassAugmentation(2000, .7))', '--workers', '0',
+                         '--report-interval', '0'] + list(args))
+
+    def test_augments_every_file(self):
+        self.assertEqual(self.run_cli(), 0)
+        for name in ('a_0.wav', 'a_1.wav', 'b_0.wav', 'b_1.wav', os.path.join('nested', 'c_0.wav'), os.path.join('nested', 'c_1.wav')):
+            sr, signal = scipy.io.wavfile.read(os.path.join(self.output, name))
+            self.assertEqual(sr, 8000)
+            self.assertEqual(len(signal), 8000)
+
+    def test_resume(self):
+        self.run_cli()
+        os.remove(os.path.join(self.output, 'a_0.wav'))
+        self.run_cli()
+        # every file is in the progress log, so nothing is written again
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'a_0.wav')))
+        self.run_cli('--restart')
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'a_0.wav')))
+
+    def test_shards(self):
+        self.assertEqual(self.run_cli('--shards', 'float32'), 0)
+        reader = audaugio.ShardReader(self.output)
+        self.assertEqual(len(reader), 6)
+        self.assertEqual(len(reader.get(os.path.join('nested', 'c.wav'), '0.0')), 8000)
+
+    def test_worker_processes(self):
+        paths, root = cli.find_inputs(self.input)
+        pipeline = cli.Pipeline(audaugio.LinearChain(audaugio.HighPassAugmentation(100, .7)), self.output, root, workers=2, report_interval=0)
+        self.assertEqual(pipeline.run(paths), (3, 0))
@@ -0,0 +1,97 @@
+import pickle
+import threading
+import unittest
+
+import numpy as np
+
+import audaugio
+
+
+class Fail(audaugio.AugmentationBase):
+    def __init__(self):
+        super().__init__(replaces=True)
+
+    def augment(self, signal, sr):
+        raise RuntimeError("failed")
+
+
+class TestAugmentedDataset(unittest.TestCase):
+    def setUp(self):
+        self.sr = 8000
+        self.clips = [np.random.uniform(-1, 1, self.sr * (1 + i % 3)) for i in range(10)]
+        self.chain = audaugio.CombinatoricChain(audaugio.LowPassAugmentation(2000, .7), audaugio.WindowingAugmentation(1, 1))
+
+    def test_matches_chain(self):
+        dataset = audaugio.AugmentedDataset(self.chain, self.clips, self.sr, prefetch=2)
+        expected = [(i, signal) for i, clip in enumerate(self.clips) for signal in self.chain(clip, self.sr)]
+        yielded = list(dataset)
+        self.assertEqual([i for i, _ in yielded], [i for i, _ in expected])
+        for (_, signal), (_, reference) in zip(yielded, expected):
+            np.testing.assert_array_equal(signal, reference)
+        self.assertEqual(dataset.metrics.clips, len(self.clips))
+        self.assertEqual(dataset.metrics.signals, len(expected))
+        self.assertLessEqual(dataset.metrics.max_queue_depth, 2)
+
+    def test_shards(self):
+        shards = [audaugio.AugmentedDataset(self.chain, self.clips, self.sr, worker=i, n_workers=3, n_threads=2) for i in range(3)]
+        indices = [sorted({i for i, _ in shard}) for shard in shards]
+        self.assertEqual(sorted(i for shard in indices for i in shard), list(range(len(self.clips))))
+        self.assertEqual(indices[1], list(shards[1].indices()))
+        with self.assertRaises(ValueError):
+            audaugio.AugmentedDataset(self.chain, self.clips, self.sr, worker=3, n_workers=3)
+
+    def test_shuffle(self):
+        def order(seed):
+            dataset = audaugio.AugmentedDataset(self.chain, self.clips, self.sr, shuffle_buffer=8, seed=seed)
+            return [[float(signal[0]) for _, signal in dataset] for _ in range(2)]
+
+        first, second = order(1)
+        self.assertEqual(order(1), [first, second])
+        self.assertNotEqual(first, second)
+        unshuffled = [float(signal[0]) for _, signal in audaugio.AugmentedDataset(self.chain, self.clips, self.sr)]
+        self.assertNotEqual(first, unshuffled)
+        self.assertEqual(sorted(first), sorted(unshuffled))
+
+    def test_epoch(self):
+        dataset = audaugio.AugmentedDataset(self.chain, self.clips, self.sr, shuffle_buffer=8, seed=1)
+        copies = [pickle.loads(pickle.dumps(dataset)) for _ in range(2)]
+        copies[1].set_epoch(1)
+        first, second = [[float(signal[0]) for _, signal in copy] for copy in copies]
+        self.assertNotEqual(first, second)
+        self.assertEqual(second, [float(signal[0]) for _, signal in audaugio.AugmentedDataset(self.chain, self.clips, self.sr, shuffle_buffer=8,
+                                                                                               seed=1, epoch=1)])
+
+    def test_noise_differs_between_epochs(self):
+        def noise(seed, worker, epoch):
+            chain = audaugio.LinearChain(audaugio.BackgroundNoiseAugmentation(.1, seed=seed))
+            dataset = audaugio.AugmentedDataset(chain, [np.zeros(self.sr)] * 4, self.sr, worker=worker, n_workers=2, epoch=epoch)
+            return [[signal for _, signal in dataset] for _ in range(2)]
+
+        for seed in (None, 1):
+            first, second = noise(seed, 1, 0)
+            self.assertFalse(np.array_equal(first[0], second[0]))
+        np.testing.assert_array_equal(noise(1, 1, 0)[1], noise(1, 1, 1)[0])
+        self.assertFalse(np.array_equal(noise(1, 0, 0)[0][0], noise(1, 1, 0)[0][0]))
+
+    def test_errors_are_raised(self):
+        dataset = audaugio.AugmentedDataset(audaugio.LinearChain(Fail()), self.clips, self.sr, n_threads=2)
+        with self.assertRaises(RuntimeError):
+            list(dataset)
+
+    def test_stopping_early(self):
+        threads = threading.active_count()
+        iterator = iter(audaugio.AugmentedDataset(self.chain, self.clips, self.sr, prefetch=1, n_threads=3))
+        next(iterator)
+        iterator.close()
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_pickle(self):
+        dataset = audaugio.AugmentedDataset(self.chain, self.clips[:2], self.sr, worker=1, n_workers=2)
+        list(dataset)
+        copy = pickle.loads(pickle.dumps(dataset))
+        self.assertEqual(len(list(copy)), len(self.chain(self.clips[1], self.sr)))
+        self.assertEqual(copy.metrics.clips, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+import unittest
+
+# imports numpy first, so that only the time audaugio itself adds is measured
+_PROBE = """
+import json, sys, time
+import numpy
+start = time.perf_counter()
+import audaugio
+seconds = time.perf_counter() - start
+audaugio.BackgroundNoiseAugmentation(.005).augment(numpy.zeros(100), 8000)
+audaugio.LinearChain(audaugio.WindowingAugmentation(1, .5))(numpy.zeros(16000), 8000)
+print(json.dumps({'seconds': seconds, 'modules': sorted(sys.modules)}))
+"""
+
+
+class TestImport(unittest.TestCase):
+    def test_import_is_lazy(self):
+        probe = json.loads(subprocess.run([sys.executable, '-c', _PROBE], stdout=subprocess.PIPE, check=True).stdout.decode())
+        for module in ['librosa', 'sox', 'numba', 'scipy.signal', 'audaugio.augmentation.pitch_shift']:
+            self.assertNotIn(module, probe['modules'])
+        self.assertLess(probe['seconds'], 1.)
+
+    def test_names_resolve(self):
+        import audaugio
+
+        for name in audaugio.augmentation.__all__ + audaugio.chain.__all__:
+            self.assertIs(getattr(audaugio, name), getattr(audaugio.augmentation if name in audaugio.augmentation.__all__ else audaugio.chain, name))
+            self.assertIn(name, dir(audaugio))
+        with self.assertRaises(AttributeError):
+            audaugio.NoSuchAugmentation
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import audaugio
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sr = 8000
+        self.signal = np.random.uniform(-1, 1, 2 * self.sr)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_chain_write(self):
+        chain = audaugio.CombinatoricChain(audaugio.LowPassAugmentation(2000, .7), audaugio.WindowingAugmentation(1, 1, stacked=True))
+        with audaugio.ShardWriter(self.directory) as writer:
+            chain.write(writer, self.signal, self.sr, 'a.wav')
+            chain.write(writer, self.signal[::-1], self.sr, 'b.wav')
+
+        reader = audaugio.ShardReader(self.directory)
+        augmented = chain(self.signal, self.sr)
+        self.assertEqual(len(reader), 2 * sum(len(a) for a in augmented))
+        np.testing.assert_allclose(reader.get('a.wav', '0.0/1.0[1]'), augmented[1][1], rtol=1e-6)
+        self.assertEqual(reader.info(len(reader) - 1), {'sr': self.sr, 'source': 'b.wav', 'path': '0.0/1.0[1]'})
+        self.assertIsInstance(reader[0].base, np.memmap)
+        with self.assertRaises(KeyError):
+            reader.get('c.wav', '1.0[0]')
+
+    def test_multichannel_signals_are_refused(self):
+        chain = audaugio.LinearChain(audaugio.LowPassAugmentation(2000, .7), multichannel=True)
+        with audaugio.ShardWriter(self.directory) as writer:
+            with self.assertRaises(ValueError):
+                chain.write(writer, np.stack([self.signal, self.signal[::-1]]), self.sr, 'a.wav')
+            with self.assertRaises(ValueError):
+                writer.extend([self.signal, np.stack([self.signal] * 2)], self.sr, 'b.wav', multichannel=True)
+            self.assertEqual(len(writer), 0)
+            chain.write(writer, self.signal, self.sr, 'c.wav')
+            self.assertEqual(len(writer), 1)
+
+    def test_int16(self):
+        with audaugio.ShardWriter(self.directory, dtype='int16') as writer:
+            writer.append(self.signal, self.sr, 'a.wav')
+        stored = audaugio.ShardReader(self.directory).get('a.wav')
+        self.assertEqual(stored.dtype, np.int16)
+        np.testing.assert_allclose(stored / 32767, self.signal, atol=1 / 32767)
+
+    def test_shards_and_reopening(self):
+        with audaugio.ShardWriter(self.directory, shard_bytes=self.signal.size * 4 * 2) as writer:
+            for i in range(5):
+                writer.append(self.signal * i / 5, self.sr, 'a.wav', str(i))
+        with audaugio.ShardWriter(self.directory) as writer:
+            self.assertEqual(writer.append(self.signal, self.sr, 'b.wav'), 5)
+
+        reader = audaugio.ShardReader(self.directory)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.startswith('shard-')]), 4)
+        self.assertEqual(len(reader), 6)
+        np.testing.assert_allclose(reader.get('a.wav', '3'), self.signal * 3 / 5, rtol=1e-6)
+
+    def test_interrupted_writer(self):
+        writer = audaugio.ShardWriter(self.directory)
+        writer.append(self.signal, self.sr, 'a.wav')
+        writer.append(self.signal, self.sr, 'b.wav')
+        writer.close()
+        # as if the second signal's samples and half of a third index entry never made it to disk
+        with open(os.path.join(self.directory, 'shard-00000.bin'), 'r+b') as f:
+            f.truncate(self.signal.size * 4 + 10)
+        with open(os.path.join(self.directory, 'index.bin'), 'ab') as f:
+            f.write(b'\0' * 7)
+
+        reader = audaugio.ShardReader(self.directory)
+        self.assertEqual(len(reader), 1)
+        self.assertEqual(reader.info(0)['source'], 'a.wav')